@@ -7,12 +7,15 @@ Base class for all animation types.
 """
 
 from LEDAnimator.ExceptionErrors import *
+from LEDAnimator.Clock import systemClock
 import time
 import LEDAnimator.Panel as Panel
 from LEDAnimator.NumpyImage import *
 from matplotlib.colors import *
 from LEDAnimator.Image import *
+from LEDAnimator.Compositor import ImageLayer
 import random
+import numpy as np
 
 from LEDAnimator.Decorators import *
 
@@ -27,6 +30,10 @@ class AnimBase(object):
     """
 
     # default variables
+    clock=systemClock       # time source, replaced by the Animator's clock (see Clock.py)
+    seed=None               # random number seed, None means unpredictable. Set by the Animator if it has a seed
+    rng=None                # random.Random used by the animation, see setSeed()
+    nprng=None              # numpy RandomState used by the animation, see setSeed()
     startTime=time.time()   # reset by reset()
     curPalEntry=0
 
@@ -57,7 +64,13 @@ class AnimBase(object):
 
     init=True               # used to indicate that an animation should initialise back to it's start point
 
-    layerBuffer=None        # all animations are render to this first then merged with the Panel frameBuffer
+    layerBuffer=None        # animations render to this, unless they are one image, then it is merged with the Panel frameBuffer
+    layerDrawn=False        # set by refreshCanvas(), cleared by AnimInfo each frame. Only drawn layers are merged
+    layerVersion=0          # incremented each time refreshCanvas() rebuilds the layer
+    imageLayer=None         # ImageLayer the layer is made of, set by refreshCanvas() instead of drawing the layerBuffer
+    layerBufferVersion=None # layerVersion the layerBuffer was last drawn for, see getLayerBuffer()
+    layerValid=False        # False makes the next refreshCanvas() rebuild the layerBuffer, see invalidateLayer()
+    layerUnchanged=False    # set when the animation has not moved on this frame, see isNotNextStep()
 
     chain=None              # any animated chain
     startPause=0            # parameters which may be used to delay the start after a reset()
@@ -89,10 +102,10 @@ class AnimBase(object):
             setattr(self, key, value)
 
         self.setSpeed(self.speed)
+        self.setSeed(self.seed)
 
-        # ALL outputs for this layer are sent to this buffer before sending to Panel
-        self.layerBuffer=NumpyImage.NumpyImage(width=Panel.width, height=Panel.height, alpha=0)
-
+        # the layerBuffer is made by drawLayerBuffer() the first time the layer has to be drawn into it,
+        # a layer which is just one image is blended straight into the Panel frameBuffer instead
 
 
     def animationClass(self):
@@ -120,23 +133,66 @@ class AnimBase(object):
         print self.id ," ".join(map(str, args)), "Animation=", self.__class__.__name__
 
 
+    def setSeed(self,seed):
+        """
+        (re)starts the animation's random number streams. Animations must use self.rng and
+        self.nprng, not the random or np.random modules, so that runs with the same seed
+        produce the same frames.
+
+        :param int seed: the seed or None for an unpredictable sequence
+        :return None:
+        """
+        self.seed=seed
+        self.curPalEntry=0
+        self.rng=random.Random(seed)
+        self.nprng=np.random.RandomState(None if seed is None else seed & 0xffffffff)
+
     def loadImage(self,which):
         # anything to do?
         if which is None: return
 
-        # already loaded?
-        if isinstance(which.image,NumpyImage.NumpyImage):
-            self._Debug("AnimBase.loadImage() already loaded")
-            which.reset()   # image may have been fiddled with (TheMatrix and Roll, Dissolve)
-            return
+        with which.lock:
+            # already loaded (possibly by the Prefetcher)?
+            if isinstance(which.image,NumpyImage.NumpyImage):
+                self._Debug("AnimBase.loadImage() already loaded")
+                which.reset()   # image may have been fiddled with (TheMatrix and Roll, Dissolve)
+                return
+
+            self.prepareImage(which)
+
+    def prepareImage(self,which):
+        """
+        loads, transforms, scales and aligns an image which hasn't been loaded yet. The image is
+        only given to which.image when it is ready so another thread never sees a part prepared image.
+
+        :param Image which: bgImage or fgImage
+        :return None:
+        """
+        if which is None: return
+
+        with which.lock:
+            if which.image is not None: return
 
-        which.loadImage()
-        assert which.image is not None, "Image failed to load"
+            image=which.createImage()
+            assert image is not None, "Image failed to load"
 
-        # perform any image transform etc
-        which.image.transform(which.transMatrix)
-        self.scaleImage(which.image,which.scaleMode)
-        which.Xpos,which.Ypos=which.image.alignImage(which.alignMode,(Panel.width,Panel.height))
+            # perform any image transform etc
+            image.transform(which.transMatrix)
+            self.scaleImage(image,which.scaleMode)
+            which.Xpos,which.Ypos=image.alignImage(which.alignMode,(Panel.width,Panel.height))
+
+            which.image=image
+
+    def prepare(self):
+        """
+        loads anything reset() would otherwise have to load. Called by the Prefetcher, on its own
+        thread, whilst the previous animation in the sequence is playing. Images which are already
+        loaded are left alone because they may be on display.
+
+        :return None:
+        """
+        self.prepareImage(self.bgImage)
+        self.prepareImage(self.fgImage)
 
     def endPaused(self):
         """
@@ -164,7 +220,7 @@ class AnimBase(object):
             self._Debug("AnimBase.endPaused() finishedTime is not set")
             return False
 
-        if (time.time()-self.animationFinishedTime)<self.endPause:
+        if (self.clock.time()-self.animationFinishedTime)<self.endPause:
             self._Debug("AnimBase.endPaused() is True")
             self.refreshCanvas()
             return True
@@ -183,7 +239,7 @@ class AnimBase(object):
 
         :return bool: True or False
         """
-        if (time.time()-self.startTime)<self.startPause:
+        if (self.clock.time()-self.startTime)<self.startPause:
             self.refreshCanvas()
             self._Debug("AnimBase.startPaused() is True.")
             return True
@@ -206,7 +262,7 @@ class AnimBase(object):
         if self.animationFinished: return
 
         self.animationFinished=True
-        self.animationFinishedTime=time.time()
+        self.animationFinishedTime=self.clock.time()
 
         if self.endPause is not None:
             self._Debug("AnimBase.animationHasFinished() endPause is active.")
@@ -237,15 +293,16 @@ class AnimBase(object):
         self.loadImage(self.fgImage)
 
         # reset the animation back to it's starting state
-        self.startTime = time.time()
+        self.startTime = self.clock.time()
         self.tick = 0
         self.lastTick = 0
         self.animationFinished=False
         self.animationFinishedTime=None
 
-        if self.durationStart is None: self.durationStart=time.time()
+        if self.durationStart is None: self.durationStart=self.clock.time()
 
         self.init=True  # tells the animation to initialise itself
+        self.invalidateLayer()
 
         if self.startPos is not None and self.fgImage is not None:
             self.fgImage.setPosition(self.startPos)
@@ -263,8 +320,8 @@ class AnimBase(object):
         self._Debug("AnimBase.nextFrame() called.")
 
         # update the current tick value
-        t=time.time()-self.startTime    # interval since start
-        ticks=t*self.fps                #
+        t=self.clock.time()-self.startTime    # interval since start
+        ticks=t*self.fps+1e-6           # 1e-6 stops 2.9999999 ticks rounding down when t is exactly n/fps
         # we report the ticks that have passed based on speed
         # at speed=2.0 this counts from 0,2,4,8...(fps/2)
         # sat speed=1.0 we get 0,1,2,3,..(fps-1)
@@ -279,7 +336,7 @@ class AnimBase(object):
             self.reset()
 
         # time is up, we move on to the next animation in the sequence
-        if (time.time()-self.durationStart)>=self.duration:
+        if (self.clock.time()-self.durationStart)>=self.duration:
             self.durationStart=None
             self._Debug("AnimBase.nextFrame() duration has expired.")
             return True
@@ -295,17 +352,23 @@ class AnimBase(object):
                 print "AnimBase.nextFrame() animation finished & does not loop"
                 return True
 
+        # nothing moves whilst paused so the last layerBuffer can be reused
+        self.layerUnchanged=True
         if self.startPaused():
             self._Debug("Animbase.nextFrame() startPaused() returned True")
             return False
         if self.endPaused():
             self._Debug("Animbase.nextFrame() endPaused() returned True")
             return False
+        self.layerUnchanged=False
 
         self._Debug("AnimBase.nextFrame() calling step()")
 
         # call the animation step() function to move it on
+        # animations may change things after refreshCanvas() whilst initialising
+        initialising=self.init
         self.step()
+        if initialising: self.invalidateLayer()
 
         self._Debug("AnimBase.nextFrame() finishing after calling step() returning False")
         # false indicates the animation duration has not expired
@@ -364,10 +427,21 @@ class AnimBase(object):
         self._Debug("AnimBase.isNotNextStep() lastTick="+str(self.lastTick)+"this tick="+str(self.tick))
 
         if self.lastTick==self.tick:
+            # the next refreshCanvas() can reuse the layerBuffer
+            self.layerUnchanged=True
             return True
         self.lastTick=self.tick
         return False
 
+    def invalidateLayer(self):
+        """
+        makes the next refreshCanvas() rebuild the layerBuffer. Called by reset(). Call it if the
+        animation's images, chain or colours are changed from outside the animation's step().
+
+        :return None:
+        """
+        self.layerValid=False
+
     def getNextPaletteEntry(self):
         """
         selects the next colour from the list of colours in a palette. Cycles back to start.
@@ -394,7 +468,7 @@ class AnimBase(object):
         assert self.palette is not None,"You need to include a Palette for getRandomPaletteEntry(). Use an animation " \
                                         "parameter like palette=Palette.XMAS."
 
-        e=random.randint(0,self.palette.getLength())
+        e=self.rng.randint(0,self.palette.getLength())
         c = self.palette.getEntry(e)
         return c
 
@@ -426,7 +500,93 @@ class AnimBase(object):
 
     def refreshCanvas(self):
         """
-        Builds the output image for this layer of animation. Transparency is used.
+        Builds the output image for this layer of animation, see drawLayer().
+
+        The layerBuffer is merged with the Panel frameBuffer, in layer order, by the Animator
+        once all the layers have been stepped. This allows layers to be rendered in parallel.
+
+        A layer which is just one image (see getImageLayer()) isn't drawn into the layerBuffer,
+        the Compositor blends the image straight into the frameBuffer.
+
+        If the animation has not moved on since the layer was last built (isNotNextStep()
+        returned True or the animation is paused) it is reused as it is. Only the first
+        refreshCanvas() of a frame can reuse it, later ones rebuild it.
+
+        :return: Nothing
+        """
+        reuse=self.layerUnchanged and self.layerValid
+        self.layerUnchanged=False
+
+        if reuse:
+            self._Debug("AnimBase.refreshCanvas() layer unchanged.")
+        else:
+            self.layerVersion+=1
+            self.layerValid=True
+            self.imageLayer=self.getImageLayer()
+            if self.imageLayer is None: self.drawLayerBuffer()
+
+        # tell the Animator this layer has something to show
+        self.layerDrawn=True
+
+    def drawLayerBuffer(self):
+        """
+        draws the layer into the layerBuffer, see drawLayer(), making the layerBuffer the first time
+
+        :return None:
+        """
+        if self.layerBuffer is None:
+            self.layerBuffer=NumpyImage.NumpyImage(width=Panel.width, height=Panel.height, alpha=0)
+
+        self.drawLayer()
+        self.layerBufferVersion=self.layerVersion
+
+    def getLayerBuffer(self):
+        """
+        the layer as a whole image e.g. for a layer process to hand back to the Animator. A layer
+        which refreshCanvas() left as an ImageLayer is drawn into the layerBuffer now.
+
+        :return numpy ndarray: the layerBuffer image
+        """
+        if self.layerBufferVersion!=self.layerVersion: self.drawLayerBuffer()
+        return self.layerBuffer.getImageData()
+
+    def drawsLayerWith(self,cls):
+        """
+        :param class cls: AnimBase or a sub-class
+        :return bool: True if drawLayer() is cls.drawLayer(), not extended by a sub-class to draw more
+        """
+        return type(self).drawLayer.__func__ is cls.drawLayer.__func__
+
+    def drawsBackground(self):
+        """
+        :return bool: True if AnimBase.drawLayer() would draw anything: a background colour, images or a chain
+        """
+        return self.background is not None or self.chain is not None or \
+               (self.bgImage is not None and self.bgImage.image is not None) or \
+               (self.fgImage is not None and self.fgImage.image is not None)
+
+    def getImageLayer(self):
+        """
+        describes the layer as one image on transparency, if that is all drawLayer() would draw, so
+        that refreshCanvas() needn't draw the layerBuffer (see Compositor.py). Sub-classes which
+        extend drawLayer() can override this too.
+
+        :return ImageLayer: the bgImage or fgImage at its position, None if the layerBuffer has to be drawn
+        """
+        if not self.drawsLayerWith(AnimBase) or self.background is not None or self.chain is not None:
+            return None
+
+        bg=self.bgImage is not None and self.bgImage.image is not None
+        fg=self.fgImage is not None and self.fgImage.image is not None
+        if bg==fg: return None      # neither or both
+
+        image=self.bgImage if bg else self.fgImage
+        X,Y=image.getPosition()
+        return ImageLayer(image.getImageData(),X,Y,image.getCoverage())
+
+    def drawLayer(self):
+        """
+        Draws the layerBuffer. Transparency is used. Sub-classes can extend this to draw more.
 
         The output image is built in the following order:-
         1. If a background colour is defined wet the Panel colour first
@@ -439,29 +599,29 @@ class AnimBase(object):
 
         # clear the layer buffer amd make sure it's transparent
         # so that lower layers show through
-        self._Debug("AnimBase.refreshCanvas() begins")
+        self._Debug("AnimBase.drawLayer() begins")
         self.layerBuffer.clear()
 
         # has itr got a simple background color?
         if self.background is not None:
-            self._Debug("AnimBase.refreshCanvas() background fill.")
+            self._Debug("AnimBase.drawLayer() background fill.")
             self.layerBuffer.fill(self.background)
 
         # or has it got a background image?
         if self.bgImage is not None and self.bgImage.image is not None:
-            self._Debug( "AnimBase.refreshCanvas() doing bgImage")
+            self._Debug( "AnimBase.drawLayer() doing bgImage")
             X,Y=self.bgImage.getPosition()
-            pasteWithAlphaAt(self.layerBuffer.getImageData(),X, Y, self.bgImage.getImageData())
+            pasteWithAlphaAt(self.layerBuffer.getImageData(),X, Y, self.bgImage.getImageData(),
+                             coverage=self.bgImage.getCoverage())
 
         if self.fgImage is not None and self.fgImage.image is not None:
-            self._Debug( "AnimBase.refreshCanvas() doing fgImage.")
+            self._Debug( "AnimBase.drawLayer() doing fgImage.")
             X,Y=self.fgImage.getPosition()
-            pasteWithAlphaAt(self.layerBuffer.getImageData(),X, Y, self.fgImage.getImageData())
+            pasteWithAlphaAt(self.layerBuffer.getImageData(),X, Y, self.fgImage.getImageData(),
+                             coverage=self.fgImage.getCoverage())
 
         if self.chain is not None:
-            self._Debug("AnimBase.refreshCanvas() doing chain.")
+            self._Debug("AnimBase.drawLayer() doing chain.")
             self.drawChainOnLayerBuffer()
 
-        Panel.DrawImage(0,0,self.layerBuffer.getImageData())
-
-        self._Debug("AnimBase.refreshCanvas() finished.")
+        self._Debug("AnimBase.drawLayer() finished.")
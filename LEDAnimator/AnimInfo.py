@@ -7,15 +7,38 @@ Used by Animator.
 
 """
 
+from Compositor import LayerDamage
+from Prefetcher import getPrefetcher
+
+
+def deriveSeed(seed,n):
+    """
+    makes a seed for the n'th item from a parent seed. The same seed and n always give
+    the same result.
+
+    :param int seed: the parent seed
+    :param int n: item number e.g. layer or sequence entry
+    :return int: the derived seed
+    """
+    return (seed*1000003+n+1) & 0xffffffff
+
 
 class AnimInfo(object):
     classname = "AnimInfo"
     chain = None  # not used for non-chain based animations
+    clock = None  # the Animator's Clock, passed on to the animations
     animSeq = None
     fps = None
     animFunc = None
     curPalEntry = 0
     palette = None
+    executor = None  # "serial", "thread" or "process" - None uses the Animator default
+    layerAnim = None  # the animation which was stepped on the last frame
+    seed = None  # the layer seed, each animation in the sequence gets a seed derived from it
+    damage = None  # LayerDamage, finds what changed in the layer image
+    dirtyRect = None  # (x0,y0,x1,y1) changed by the last call to nextFrame(), None if nothing changed
+    lastLayer = None  # (animation,layerVersion) seen by the damage check on the previous frame
+    prefetch = True  # prepare the next animation in the sequence in the background, see Prefetcher.py
 
     # debugging
     debug = False
@@ -29,15 +52,51 @@ class AnimInfo(object):
         for key,value in kwargs.iteritems():
             setattr(self,key,value)
 
+        self.damage=LayerDamage()
+        self.seedAnimations()
+
+    def seedAnimations(self):
+        """
+        gives each animation in the sequence its own random number seed so that the
+        layer produces the same frames every time it is reset. Does nothing if the layer
+        has no seed.
+
+        :return None:
+        """
+        if self.seed is None or self.animSeq is None: return
+
+        for n,anim in enumerate(self.animSeq.animList):
+            anim.setSeed(deriveSeed(self.seed,n))
+
 
     def reset(self):
         """
-        Added to enable resetting an animation to it's starting point
+        Added to enable resetting an animation to it's starting point. The sequence is restarted
+        from its first animation and the random number streams are restarted if the layer has a seed.
 
         :return:
         """
-        if self.animFunc is not None:
-            self.animFunc.reset()
+        self.seedAnimations()
+
+        if self.chain is not None:
+            self.chain.reset()
+
+        if self.animSeq is not None:
+            self.animSeq.restart()
+            self.animFunc=None  # nextFrame() gets the first animation which resets itself
+
+    def prefetchNext(self):
+        """
+        asks the Prefetcher to prepare the animation which will follow the current one. Called from
+        nextFrame() so that it runs in the process which steps the layer
+
+        :return None:
+        """
+        if not self.prefetch or self.animSeq is None: return
+
+        anim=self.animSeq.peekNextAnimation()
+        if anim is not self.animFunc:
+            getPrefetcher().submit(anim)
 
     def nextFrame(self,debug=False):
         """
@@ -52,11 +111,43 @@ class AnimInfo(object):
 
         if self.animFunc is None:
             self.animFunc = self.animSeq.getNextAnimation()
+            self.prefetchNext()
 
         # chain is ignored by non-chain based animations
         self.animFunc.chain=self.chain
         self.animFunc.id=self.id
+        if self.clock is not None: self.animFunc.clock=self.clock
+
+        # the layer is only merged with the Panel if the animation draws on it this frame
+        self.layerAnim=self.animFunc
+        self.layerAnim.layerDrawn=False
 
         if self.animFunc.nextFrame(debug=self.debug,id=self.animFunc.id):
             self.animFunc = self.animSeq.getNextAnimation()
+            self.prefetchNext()
+
+        # done here so that it runs on the layer's own thread or process
+        # a layer which wasn't rebuilt (see AnimBase.refreshCanvas()) can't have changed
+        img=self.getLayer(direct=True)
+        layer=(self.layerAnim,self.layerAnim.layerVersion)
+        if img is not None and self.damage.drawn and layer==self.lastLayer:
+            self.dirtyRect=None
+        else:
+            self.dirtyRect=self.damage.update(img)
+        self.lastLayer=layer
+
+    def getLayer(self,direct=False):
+        """
+        returns the image drawn by this layer on the last call to nextFrame()
+
+        :param bool direct: True returns a layer which is just one image as an ImageLayer, for the
+                            Compositor, rather than drawing it into the layerBuffer
+        :return: numpy ndarray layerBuffer image, an ImageLayer or None if nothing was drawn
+        """
+        anim=self.layerAnim
+        if anim is None or not anim.layerDrawn:
+            return None
+        if direct and anim.imageLayer is not None:
+            return anim.imageLayer
+        return anim.getLayerBuffer()
 
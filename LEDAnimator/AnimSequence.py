@@ -23,7 +23,25 @@ class AnimSequence():
 
         assert self.listLen<>0, "Zero length animation list. Check syntax of your animation sequence."
 
+    def restart(self):
+        """
+        goes back to the first animation. Each animation will be reset() when it is next
+        stepped because its duration is restarted, and starts from the first palette entry.
+
+        :return None:
+        """
+        self.curAnim=0
+        for anim in self.animList:
+            anim.durationStart=None
+            anim.curPalEntry=0
+
     def getNextAnimation(self):
         p=self.curAnim
         self.curAnim=(self.curAnim+1) % self.listLen #' wraps to 0
-        return self.animList[p]
\ No newline at end of file
+        return self.animList[p]
+
+    def peekNextAnimation(self):
+        """
+        :return: the animation the next getNextAnimation() call will return, without moving on
+        """
+        return self.animList[self.curAnim]
\ No newline at end of file
@@ -7,9 +7,55 @@ the fps of the animation.
 
 If the Panel exits this code will halt
 
+Overruns
+
+If a frame takes longer than 1/fps the next frame deadline is missed. What happens then is
+controlled by overrunPolicy:-
+
+    "drop"      (default) the missed frames are not rendered or output. Animations always see the
+                wall clock time so they stay time-correct but may appear to jump.
+    "catchup"   the animations are stepped at the time of each missed frame, up to maxCatchUp
+                of them, without merging the layers or updating the display. Animations which
+                move on by a fixed amount per step stay on time.
+    "stretch"   animation time is held back by the overrun so that animations see exactly one
+                frame interval between frames. Everything slows down under load but nothing jumps.
+
+The counters are available from getOverrunStats().
+
+Idle frames
+
+When no layer has changed for idleAfter seconds, during a Wait or a start or end pause for example,
+the run loop backs off. It passes over 1, 2, 4... frame deadlines between frames, up to
+maxIdleInterval seconds, until something changes. The frames weren't being sent to the display
+anyway (see Panel.UpdateDisplay()), this saves stepping the layers too. Animations follow the clock
+so nothing slows down but the first change after an idle spell may be up to maxIdleInterval late.
+maxIdleInterval=0 renders every frame. getJitter() counts the deadlines passed over as idleSlots.
+
+Telemetry
+
+Frame timings (render, composite, UpdateDisplay, idle slack and the step time of each layer and
+animation class) are recorded in fixed size ring buffers. stats() returns their percentiles and,
+if statsFile is set, they are written to it every statsInterval seconds. See Telemetry.py
+
+Dirty rectangles
+
+Only the part of the frame which changed since the previous frame is recomposed, see Compositor.py.
+The fraction of the panel recomposed is recorded as frame.dirty and getDirtyStats() returns the
+counters. dirtyRects=False recomposes every frame in full.
+
+Prefetching
+
+Whilst an animation plays the next one in its sequence loads its images on a background thread,
+see Prefetcher.py, so moving on doesn't stall a frame. prefetch=False loads them in reset() instead.
+
 """
 import time
-from AnimInfo import AnimInfo
+from AnimInfo import AnimInfo,deriveSeed
+from FrameScheduler import FrameScheduler
+from LayerRenderer import LayerRenderer
+from Clock import Clock
+from Telemetry import Telemetry
+from Compositor import Compositor,rectArea
 import Panel
 import threading
 
@@ -26,24 +72,87 @@ class Animator(object):
     running=False
     runThread=None
 
+    executor="serial"   # how layers are stepped "serial","thread" or "process" see LayerRenderer.py
+    workers=None        # thread pool size for the "thread" executor
+
+    scheduler=None      # FrameScheduler, created by run()
+    renderer=None       # LayerRenderer, created by run()
+    loopThread=None     # the thread executing run()
+    spinTime=0.002      # passed to the FrameScheduler
+    clock=None          # the animation time source, created if not passed in
+    seed=None           # if set each layer gets a random number seed derived from it, see addAnimation()
+
+    overrunPolicy="drop"    # "drop","catchup" or "stretch" (see above)
+    maxCatchUp=4            # max missed frames stepped by the catchup policy
+
+    OVERRUN_POLICIES=("drop","catchup","stretch")
+
+    telemetry=None      # Telemetry, created if not passed in
+    statsSize=1024      # samples kept for each timing
+    statsFile=None      # .csv or .json file the stats are written to
+    statsInterval=60    # seconds between writes to statsFile
+
+    dirtyRects=True     # only recompose the part of the frame which changed
+    compositor=None     # Compositor, created if not passed in
+
+    prefetch=True       # prepare the next animation of each sequence in the background, see Prefetcher.py
+
+    idleAfter=0.5           # seconds of unchanged frames before run() backs off (see above)
+    maxIdleInterval=0.05    # longest run() waits between frames whilst nothing changes, 0 never backs off
+    frameChanged=True       # False if the last renderFrame() found nothing had changed
+    idleSince=None          # time the frames stopped changing
+    idleSkips=0             # frame deadlines run() is passing over whilst idle
+
     def __init__(self, **kwargs):
 
         for key,value in kwargs.iteritems():
             setattr(self,key,value)
 
+        assert self.overrunPolicy in self.OVERRUN_POLICIES,"Animator overrunPolicy must be one of "+\
+                                                           ",".join(self.OVERRUN_POLICIES)
+
+        if self.clock is None: self.clock=Clock()
+        if self.telemetry is None: self.telemetry=Telemetry(size=self.statsSize)
+        if self.compositor is None: self.compositor=Compositor(dirtyRects=self.dirtyRects)
+
         self.animations = []
+        self.resetOverrunStats()
         self.running=False
         self.runThread=None
 
+        # stopEvent is set to ask run() to exit, runEvent is cleared to pause it
+        # and stoppedEvent is set by run() when it has finished
+        self.stopEvent=threading.Event()
+        self.runEvent=threading.Event()
+        self.runEvent.set()
+        self.stoppedEvent=threading.Event()
+        self.stoppedEvent.set()
+
     def addAnimation(self, **kwargs):
+        """
+        adds a layer of animations. Layers are drawn in the order they are added (bottom to top)
+
+        If the Animator has a seed the layer gets a seed derived from it and its layer number, so
+        runs with the same seed produce the same frames. A layer seed can be given instead.
 
+        :param kwargs: seq=AnimSequence, chain=Chain (optional), id=str (optional),
+                    executor="serial","thread" or "process" (optional, overrides the Animator executor)
+                    seed=int (optional, overrides the seed derived from the Animator seed)
+        :return None:
+        """
         self.chain=None # text animations don't specify a chain
         self.seq=None
+        executor=kwargs.pop("executor",None)
+
+        seed=kwargs.pop("seed",None)
+        if seed is None and self.seed is not None:
+            seed=deriveSeed(self.seed,len(self.animations))
 
         for key,value in kwargs.iteritems():
             setattr(self,key,value)
 
-        self.animations.append(AnimInfo(chain=self.chain,animSeq=self.seq,fps=self.fps,id=self.id))
+        self.animations.append(AnimInfo(chain=self.chain,animSeq=self.seq,fps=self.fps,id=self.id,executor=executor,
+                                        clock=self.clock,seed=seed,prefetch=self.prefetch))
 
     def checkPanelIsRunning(self):
         # simulator window may have been closed
@@ -57,6 +166,7 @@ class Animator(object):
             if (time.time() - t0) >= 5:
                 if self.debug: print "Animator: panel is not running (5s timeout whilst waiting)."
                 exit(0)
+            time.sleep(0.01)
 
 
     def start(self,reset=True):
@@ -74,99 +184,341 @@ class Animator(object):
 
         if self.runThread is not None:
             print("Animator background thread is running. Ignored.")
+            return
+
+        # cleared here rather than in run() so that an immediate stop() isn't lost
+        self.stopEvent.clear()
+        self.stoppedEvent.clear()
+
         self.runThread=threading.Thread(target=self.run)
         self.runThread.start()
 
     def stop(self):
         """
-        stops the run() method
+        stops the run() method and waits for it to exit
 
         :return:
         """
         self.running=False
-        #wait for the run() method to exit
-        while self.runThread is not None:
-            pass
+        self.stopEvent.set()
+        self.runEvent.set()     # wake run() if it is paused
+
+        # wait for the run() method to exit - unless stop() was called from within it
+        if self.loopThread is not threading.current_thread():
+            self.stoppedEvent.wait()
+
         Panel.Clear()
         Panel.UpdateDisplay()
+        Panel.Flush()
+
+    def pause(self):
+        """
+        pauses the run() loop at the end of the current frame. The display is left showing
+        the last frame.
+
+        :return None:
+        """
+        self.runEvent.clear()
+
+    def resume(self):
+        """
+        resumes the run() loop after a pause()
+
+        :return None:
+        """
+        self.runEvent.set()
+
+    def isPaused(self):
+        """
+        :return bool: True if pause() has been called
+        """
+        return not self.runEvent.is_set()
+
+    def getJitter(self):
+        """
+        returns the frame scheduling jitter statistics. See FrameScheduler.getJitter()
+
+        :return dict: or None if run() has not been called
+        """
+        if self.scheduler is None: return None
+        return self.scheduler.getJitter()
+
+    def stats(self):
+        """
+        returns the frame timing percentiles. See Telemetry.py for the timing names
+
+        :return dict: name -> {"count","mean","p50","p95","p99","max"} in seconds
+        """
+        return self.telemetry.stats()
+
+    def resetStats(self):
+        """
+        discards the frame timings recorded so far
+        :return None:
+        """
+        self.telemetry.reset()
+
+    def dumpStats(self,filename=None):
+        """
+        writes stats() to a CSV or JSON file
+
+        :param str filename: default is statsFile
+        :return None:
+        """
+        filename=filename if filename is not None else self.statsFile
+        assert filename is not None,"Animator.dumpStats() no filename and statsFile not set."
+        self.telemetry.dump(filename)
+
+    def getDirtyStats(self):
+        """
+        returns the dirty rectangle counters. See Compositor.getStats()
+
+        :return dict: frames, fullFrames, unchangedFrames, dirtyPixels, hiddenLayers and meanDirtyFraction
+        """
+        return self.compositor.getStats()
 
     def reset(self):
         for animInfo in self.animations:
             animInfo.reset()
 
+    def resetOverrunStats(self):
+        """
+        zeroes the overrun counters
+        :return None:
+        """
+        self.overruns=0         # frames which finished after the next frame's deadline
+        self.framesDropped=0    # frames which were never output
+        self.catchUpFrames=0    # missed frames stepped by the catchup policy
+        self.stretchedTime=0.0  # seconds of animation time lost to the stretch policy
+
+    def getOverrunStats(self):
+        """
+        :return dict: the overrun policy and counters
+        """
+        return {"policy":self.overrunPolicy,
+                "overruns":self.overruns,
+                "framesDropped":self.framesDropped,
+                "catchUpFrames":self.catchUpFrames,
+                "stretchedTime":self.stretchedTime}
+
+    def handleOverrun(self,late,frameInterval):
+        """
+        applies the overrun policy after a frame finished late
+
+        :param float late: seconds the frame finished after the next frame's deadline
+        :param float frameInterval: 1/fps
+        :return None:
+        """
+        self.overruns+=1
+
+        # whole frames which should have been shown whilst we were late
+        missed=int(late/frameInterval)
+
+        if self.overrunPolicy=="stretch":
+            # animations see one frame interval between frames
+            self.clock.stretch(late)
+            self.stretchedTime+=late
+            return
+
+        self.framesDropped+=missed
+
+        if self.overrunPolicy=="catchup" and missed>0:
+            # step the animations at the times they missed but don't show them
+            t=self.clock.time()
+            for n in range(min(missed,self.maxCatchUp)):
+                t+=frameInterval
+                self.clock.setFrameTime(t)
+                self.renderer.render()
+                self.catchUpFrames+=1
+
+
+    def setClock(self,clock):
+        """
+        changes the time source used by the animations. Must not be called whilst running.
+
+        :param Clock clock: the new time source e.g. a VirtualClock for offline rendering
+        :return None:
+        """
+        assert not self.running,"Animator.setClock() cannot change the clock whilst running."
+
+        self.clock=clock
+        for animInfo in self.animations:
+            animInfo.clock=clock
+
+    def openRenderer(self,frameInterval):
+        """
+        creates the LayerRenderer used by renderFrame(). Layer processes are forked here so
+        they start with the state left by reset()
+
+        :param float frameInterval: 1/fps
+        :return None:
+        """
+        for animInfo in self.animations:
+            if animInfo is None:
+                print "Animator.run() No animation info."
+                exit(1)
+
+        self.renderer=LayerRenderer(self.animations,executor=self.executor,workers=self.workers,
+                                    frameInterval=frameInterval,telemetry=self.telemetry,debug=self.debug)
+
+        # the Panel may have been cleared or drawn on since the last frame
+        self.compositor.invalidate()
+
+    def closeRenderer(self):
+        """
+        shuts down the LayerRenderer threads and processes
+        :return None:
+        """
+        if self.renderer is not None:
+            self.renderer.close()
+            self.renderer=None
+
+    def renderFrame(self,update=True):
+        """
+        renders one frame at the current clock time. Used by run() and OfflineRenderer.
+
+        The clock frame time must have been set and openRenderer() called first.
+
+        :param bool update: if True the frame is sent to the display with Panel.UpdateDisplay()
+                            otherwise it is left in the Panel frameBuffer
+        :return float: seconds taken
+        """
+        telemetry=self.telemetry
+
+        t0=time.time()
+
+        # run through all the animations.
+        # the animation list contains info about each animation
+        # nextFrame() is called for each one on each pass, possibly in parallel
+        self.renderer.render()
+        t1=time.time()
+
+        # merge the layers, bottom to top, on this thread
+        # only where they changed. Layers which are one image are blended straight from it
+        rect=self.compositor.compose(self.renderer.getLayers(direct=True),self.renderer.takeDirtyRects())
+        self.frameChanged=rect is not None
+        t2=time.time()
+
+        # copy panel frame buffer to actual or simulator matrix
+        if update: Panel.UpdateDisplay()
+        t3=time.time()
+
+        telemetry.record("frame.render",t1-t0)
+        telemetry.record("frame.composite",t2-t1)
+        telemetry.record("frame.dirty",float(rectArea(rect))/(Panel.width*Panel.height))
+        if update: telemetry.record("frame.update",t3-t2)
+        telemetry.record("frame.busy",t3-t0)
+
+        return t3-t0
+
+    def idleSkip(self,now,maxSkip):
+        """
+        how many frame deadlines run() should pass over after this frame, see Idle frames above
+
+        :param float now: time the frame finished
+        :param int maxSkip: most deadlines to pass over
+        :return int: 0 unless nothing has changed for idleAfter seconds then 1,2,4... up to maxSkip
+        """
+        if self.frameChanged or maxSkip<=0:
+            self.idleSince=None
+            self.idleSkips=0
+        elif self.idleSince is None:
+            self.idleSince=now
+        elif now-self.idleSince>=self.idleAfter:
+            self.idleSkips=min(maxSkip,max(1,self.idleSkips*2))
+
+        return self.idleSkips
 
     def run(self):
         """
         the animation run loop
+
+        Frames are paced by a FrameScheduler which sleeps, rather than spins, between frames.
+        The loop exits when stop() is called.
+
         :return: Nothing
         """
         assert self.fps is not None,"Animator.run() - fps not set."
 
-        # if fps is integer 1/fps would be integer zero!
-        frameInterval=1.0/self.fps
-
-        if self.debug: print "Animator.run() Frame interval=",frameInterval
-
-        avg_frametime=0
+        # run() may be called directly, rather than via start(), in which case it blocks
+        if self.runThread is None:
+            self.stopEvent.clear()
+            self.stoppedEvent.clear()
 
-        warned=False
-        self.running=True;
+        self.loopThread=threading.current_thread()
 
-        while self.running:
+        self.scheduler=FrameScheduler(fps=self.fps,spinTime=self.spinTime)
+        frameInterval=self.scheduler.frameInterval
 
-            # simulator window may have been closed
-            # this exits if so
-            self.checkPanelIsRunning()
+        if self.debug: print "Animator.run() Frame interval=",frameInterval
 
-            t0 = time.time()    # start time for this frame
+        # debug average frame time
+        totalLoopTime=0.0
+        loopCount=0
 
-            Panel.Clear()
+        self.running=True;
 
-            # run through all the animations.
-            # the animation list contains info about each animation
-            # We call nextFrame() for each one on each pass
-            for animInfo in self.animations:
-                if animInfo is None:
-                    print "Animator.run() No animation info."
-                    exit(1)
+        self.openRenderer(frameInterval)
 
-                if self.debug:
-                    t2=time.time()
-                    animInfo.nextFrame(self.debug)
-                    t3=time.time()
-                    if (t3-t2)>frameInterval:
-                        print "Animator.run() anim.nextFrame() took","%.6f" % (t3-t2,) ,"for ",\
-                            animInfo.animFunc.__class__.__name__,"frameInterval is",frameInterval
-                else:
-                    animInfo.nextFrame(self.debug)
+        telemetry=self.telemetry
+        nextDump=time.time()+self.statsInterval
 
-            # copy panel frame buffer to actual or simulator matrix
+        # backing off whilst idle
+        maxSkip=max(0,int(round(self.maxIdleInterval/frameInterval))-1)
+        self.idleSince=None
+        self.idleSkips=0
 
-            Panel.UpdateDisplay()
+        try:
+            self.scheduler.start()
 
-            # work out if we need to wait before the next loop
-            loopTime=time.time() - t0
+            while not self.stopEvent.is_set():
 
-            # check if
-            if (loopTime>frameInterval) and not self.warned:
-                print "Animator.run() Animation frame interval exceeded - check animation durations. " \
-                                     "Total loopTime=",loopTime,"frameInterval=",frameInterval
-                self.warned=True
+                # paused? wait here without using any CPU
+                # animation time is held whilst paused
+                if not self.runEvent.is_set():
+                    tp=time.time()
+                    self.runEvent.wait()
+                    self.clock.stretch(time.time()-tp)
+                    self.scheduler.rebase()
+                    continue
 
-            # slow down animation cycle to match the required frameInterval
-            # this gives a repeatable time interval for the animations
-            # 200fps may not be achievable.
+                # simulator window may have been closed
+                # this exits if so
+                self.checkPanelIsRunning()
 
-            if self.debug:
-                if avg_frametime==0:
-                    avg_frametime=loopTime
-                else:
-                    avg_frametime=(avg_frametime+loopTime)/2
+                self.scheduler.beginFrame()
+                self.clock.setFrameTime()           # all layers see the same time
 
-                print "Animator.run() Frame animations took average of %.6f seconds" % (avg_frametime)
+                loopTime=self.renderFrame()
+                t3=time.time()
 
-            # wait till the next frame interval
-            while loopTime < frameInterval:
-                loopTime = time.time() - t0
+                # check if
+                if (loopTime>frameInterval) and not self.warned:
+                    print "Animator.run() Animation frame interval exceeded - check animation durations. " \
+                                         "Total loopTime=",loopTime,"frameInterval=",frameInterval
+                    self.warned=True
 
-        self.runThread=None
\ No newline at end of file
+                if self.debug:
+                    totalLoopTime+=loopTime
+                    loopCount+=1
+                    print "Animator.run() Frame animations took average of %.6f seconds" % (totalLoopTime/loopCount)
+
+                if self.statsFile is not None and t3>=nextDump:
+                    self.dumpStats()
+                    nextDump=t3+self.statsInterval
+
+                # wait till the next frame deadline
+                # 200fps may not be achievable.
+                late=self.scheduler.waitForNextFrame(self.idleSkip(t3,maxSkip))
+                telemetry.record("frame.idle",time.time()-t3)
+                if late>0:
+                    self.handleOverrun(late,frameInterval)
+
+        finally:
+            self.clock.clearFrameTime()
+            self.closeRenderer()
+            if self.statsFile is not None: self.dumpStats()
+            self.running=False
+            self.runThread=None
+            self.loopThread=None
+            self.stoppedEvent.set()
@@ -190,21 +190,17 @@ class Font():
         :param tuple or Palette fgColor: colors to use for the foreground
         :return int: next character x position
         """
-        if not isinstance(fgColor, Palette):
-            fgColor = channelSwap(fgColor)
-
         for ch in text:
 
             char=self.getChar(ch)
 
             if isinstance(fgColor,Palette):
                 charColor=fgColor.getNextEntry().getPixelColor()
-                charColor=channelSwap(charColor)
                 char = self._ColorGlyph(char, charColor)
             else:
                 char = self._ColorGlyph(char, fgColor)
 
-            x=pasteWithAlphaAt(image, x+1, y, char)
+            x=pasteWithAlphaAt(image, x+1, y, char, premultiplied=False)    # text buffers are straight alpha
 
         return x
 
@@ -0,0 +1,254 @@
+"""
+Backends.py
+
+Where the Panel sends its frames. Panel.init(backend=...) picks one:-
+
+    hzeller     the real matrix, via the hzeller rgbmatrix library
+    simulator   the OpenCV window in Simulator/RGBMatrix.py
+    null        nothing is output. For benchmarks, offline rendering and CI machines
+    file        every frame is appended, as raw (height,width,4) uint8 pixels, to a file
+
+The default is the simulator on Windows and the real matrix anywhere else, as it always was.
+headless=True is the same as backend="null".
+
+The hzeller and simulator libraries are only imported when their backend is opened so a Linux
+build server without the matrix library (or a display) can run the whole render path with the
+null or file backend.
+
+A backend is given the finished, colour corrected, RGBA frame by present() and puts the channels
+in whatever order its display wants. The frame belongs to the
+Panel (or the output pipeline) and is reused for the next frame, so a backend which needs it later
+must copy it, none of these do. present() counts the frames and the time spent outputting them,
+see getStats(), so the output cost can be measured separately from the render cost.
+
+To add a backend subclass Backend, implement output() and add it to backends below.
+
+"""
+
+import time
+import numpy as np
+from LEDAnimator.ExceptionErrors import *
+
+
+class Backend(object):
+    """
+    base class, the interface the Panel uses
+    """
+
+    name=None                   # as passed to Panel.init(backend=...)
+    colourCorrection=None       # which Panel lookup table is applied to the frames, "matrix", "simulator" or None
+    frames=0                    # frames presented
+    outputTime=0.0              # seconds spent in output()
+
+    def __init__(self,**kwargs):
+
+        for key,value in kwargs.iteritems():
+            setattr(self,key,value)
+
+    def createOptions(self):
+        """
+        makes the options object Panel.init() fills in from its kwargs. The backends which don't
+        have a matrix use the simulator options, they only need the panel size.
+
+        :return: RGBMatrixOptions
+        """
+        from Simulator.RGBMatrixOptions import RGBMatrixOptions
+        return RGBMatrixOptions()
+
+    def open(self,options):
+        """
+        called by Panel.init() once the options are set
+
+        :param options: RGBMatrixOptions from createOptions()
+        :return None:
+        """
+        self.frames=0
+        self.outputTime=0.0
+
+    def present(self,frame):
+        """
+        outputs a frame
+
+        :param numpy ndarray frame: (height,width,4) uint8 image, it must not be modified or kept
+        :return None:
+        """
+        start=time.time()
+        self.output(frame)
+        self.outputTime+=time.time()-start
+        self.frames+=1
+
+    def output(self,frame):
+        """
+        does the work of present()
+        """
+        raise MethodNotImplemented(self.__class__.__name__+".output()")
+
+    def isRunning(self):
+        """
+        :return bool: False once the display has gone away (e.g. the simulator window was closed)
+        """
+        return True
+
+    def close(self):
+        """
+        releases the display or file
+        :return None:
+        """
+        pass
+
+    def getStats(self):
+        """
+        :return dict: backend (name), frames (presented) and outputTime (seconds spent outputting them)
+        """
+        return {"backend":self.name,"frames":self.frames,"outputTime":self.outputTime}
+
+
+class HzellerBackend(Backend):
+    """
+    the real matrix
+    """
+
+    name="hzeller"
+    colourCorrection="matrix"
+    matrix=None
+    canvas=None
+    Image=None          # PIL.Image, the hzeller SetImage() wants a PIL RGB image
+
+    def createOptions(self):
+        # PyCharm underlines rgbmatrix when developing on Windows, it can be ignored
+        from rgbmatrix import RGBMatrixOptions
+        return RGBMatrixOptions()
+
+    def open(self,options):
+
+        super(HzellerBackend,self).open(options)
+
+        from rgbmatrix import RGBMatrix
+
+        try:
+            # works on windows (Anaconda) and maybe others
+            from PIL import Image
+        except ImportError:
+            try:
+                # moved and renamed on Raspbian Lite
+                from PILcompat import Image
+            except ImportError:
+                raise MissingImageTk
+
+        self.Image=Image
+        self.matrix=RGBMatrix(options=options)
+        self.canvas=self.matrix.CreateFrameCanvas()
+
+    def output(self,frame):
+        # PIL unpacks the RGBA frame straight into an RGB image, skipping the alpha bytes,
+        # rather than making an RGBA image and converting it
+        if not frame.flags.c_contiguous: frame=np.ascontiguousarray(frame)
+        h,w=frame.shape[:2]
+        self.canvas.SetImage(self.Image.frombytes("RGB",(w,h),frame,"raw","RGBX"))
+        self.canvas=self.matrix.SwapOnVSync(self.canvas)
+
+
+class SimulatorBackend(Backend):
+    """
+    the OpenCV window, see Docs/Simulator.md
+    """
+
+    name="simulator"
+    colourCorrection="simulator"
+    matrix=None
+
+    def open(self,options):
+
+        super(SimulatorBackend,self).open(options)
+
+        from Simulator.RGBMatrix import RGBMatrix
+        self.matrix=RGBMatrix(options=options)
+
+    def output(self,frame):
+        # the simulator thread picks it up in its run loop, no refresh needed
+        self.matrix.SetImage(frame)
+
+    def isRunning(self):
+        # if the simulator window has closed we should stop
+        return self.matrix.IsRunning()
+
+    def getStats(self):
+        # adds the window's submitted, presented and dropped frame counts
+        stats=super(SimulatorBackend,self).getStats()
+        stats.update(self.matrix.getStats())
+        return stats
+
+
+class NullBackend(Backend):
+    """
+    frames are counted and thrown away
+    """
+
+    name="null"
+
+    def output(self,frame):
+        pass
+
+
+class FileBackend(Backend):
+    """
+    appends the raw frames to a file. numpy can read it back with:-
+
+        np.fromfile(filename,dtype=np.uint8).reshape(-1,height,width,4)
+    """
+
+    name="file"
+    filename="panel.raw"        # passed in
+    colourCorrection=None       # "matrix" to record what the real matrix would be sent
+    file=None
+
+    def open(self,options):
+
+        super(FileBackend,self).open(options)
+
+        self.close()
+        self.file=open(self.filename,"wb")
+
+    def output(self,frame):
+        # tofile() writes straight from the frame's memory when it is contiguous
+        if not frame.flags.c_contiguous: frame=np.ascontiguousarray(frame)
+        frame.tofile(self.file)
+
+    def close(self):
+        if self.file is None: return
+        self.file.close()
+        self.file=None
+
+
+# backend names accepted by Panel.init(backend=...)
+backends={
+    HzellerBackend.name:HzellerBackend,
+    SimulatorBackend.name:SimulatorBackend,
+    NullBackend.name:NullBackend,
+    FileBackend.name:FileBackend,
+}
+
+
+def defaultBackendName():
+    """
+    :return str: "simulator" on Windows, "hzeller" anywhere else
+    """
+    import platform
+    return "simulator" if platform.system()=="Windows" else "hzeller"
+
+
+def createBackend(backend=None,**kwargs):
+    """
+    :param backend: a name from backends, a Backend object or None for defaultBackendName()
+    :param kwargs: attributes for a new backend e.g. filename for the file backend
+    :return Backend: not opened yet
+    :raises UnknownBackend: if the name isn't in backends
+    """
+    if isinstance(backend,Backend): return backend
+
+    if backend is None: backend=defaultBackendName()
+
+    if backend not in backends:
+        raise UnknownBackend("Panel backend "+str(backend)+" should be one of "+", ".join(sorted(backends)))
+
+    return backends[backend](**kwargs)
@@ -35,6 +35,8 @@ import colorsys
 from matplotlib.colors import *
 
 import Helpers.AntiAlias as AA
+from Scratch import getScratch
+from UtilLib import hsvToRgbInto
 
 ##########################################################
 #
@@ -56,6 +58,7 @@ class Chain():
     y=None          # 1D numpy array
     alias=None      # 1D numpy array, brightness multiplier
     hsv=None        # 5D numpy array H,S,V,A,AA (anti-alias)
+    spareHsv=None   # hsv is rolled into this then they are swapped, see _roll()
     curPos=0        # pointer to a given LED
     lenChain=0      # length of the chain
     brightness=1.0  # brightness multiplier for the whole chain
@@ -94,6 +97,17 @@ class Chain():
         self.lenChain=len(xyList)
         self.curPos=0
 
+    def reset(self):
+        """
+        returns the chain to the state it was created in - all pixels transparent black
+        and full brightness. The anti-alias values are kept.
+
+        :return None:
+        """
+        self.hsv[:,:ALIAS]=0.0
+        self.curPos=0
+        self.brightness=1.0
+        self.alpha=1.0
 
     def adjustPixel(self,pixelData):
         """
@@ -242,24 +256,25 @@ class Chain():
 
         The pixelsd are adjusted for alpha, brightness and Alias
 
-        :return numpy ndarray x,numpy ndarray y,numpy ndarray colors: x,y,rgba
+        :return numpy ndarray x,numpy ndarray y,numpy ndarray colors: x,y,rgba. colors is a scratch array
+                which the next call overwrites
         """
         # we are going to mod the brightness of the output only
         # we don't want to change the stored pixels
 
-        tmp=self.hsv.copy()
-        tmp[...,HSV_V]*=tmp[...,ALIAS]*self.brightness
-        tmp[...,ALPHA]*=self.alpha
-        # use matplotlib to convert to rgb
-        tmp[:, :3] = hsv_to_rgb(tmp[:, :3])  # only the HSV channels are used
+        # no temporary arrays, this is called for every chain layer every frame
+        pool=getScratch()
+        tmp=pool.get("chainPixels",self.hsv.shape,self.hsv.dtype)
+        np.copyto(tmp,self.hsv)
+        scale=np.multiply(tmp[...,ALIAS],self.brightness,out=pool.get("chainScale",self.hsv.shape[:1],self.hsv.dtype))
+        np.multiply(tmp[...,HSV_V],scale,out=tmp[...,HSV_V])
+        np.multiply(tmp[...,ALPHA],self.alpha,out=tmp[...,ALPHA])
+        # same values as matplotlib's hsv_to_rgb()
+        hsvToRgbInto(tmp[:, :3],tmp[:, :3])  # only the HSV channels are used
 
         # map all values (incl alpha) from 0->1.0 to  0->255
         tmp[:,:4]*= 255.0
 
-        if RGB_R <> 0:
-            # swap channels
-            tmp[[RGB_R, RGB_B]] = tmp[[RGB_B, RGB_R]]
-
         return self.x,self.y,tmp[:,:4]  # don't need the alias info
 
 
@@ -286,16 +301,17 @@ class Chain():
         self.hsv[...,:ALIAS]=[h,s,v,a]   # ignore ALIAS channel
 
 
-    def setAllPixelsRandom(self):
+    def setAllPixelsRandom(self,rng=np.random):
         """
         sets all pixels in the chain to a random color
+        :param RandomState rng: numpy random number generator, default is np.random
         :return: nothing the whole chain is set to random colors
         """
         h=self.lenChain
-        self.hsv[:,ALPHA]=np.random.random(size=self.lenChain)
-        self.hsv[:,HSV_H]=np.random.random(size=self.lenChain)
-        self.hsv[:,HSV_V]=np.random.random(size=self.lenChain)
-        self.hsv[:,HSV_S]=np.random.random(size=self.lenChain)
+        self.hsv[:,ALPHA]=rng.random_sample(size=self.lenChain)
+        self.hsv[:,HSV_H]=rng.random_sample(size=self.lenChain)
+        self.hsv[:,HSV_V]=rng.random_sample(size=self.lenChain)
+        self.hsv[:,HSV_S]=rng.random_sample(size=self.lenChain)
 
     def roll(self, steps=1):
         """
@@ -306,7 +322,28 @@ class Chain():
         :param steps: -/+ number of steps to roll
         :return: nothing the pixel array is rolled
         """
-        self.hsv = np.roll(self.hsv, steps, axis=0)
+        self._roll(steps)
+
+    def _roll(self,steps):
+        """
+        same as self.hsv=np.roll(self.hsv,steps,axis=0) but np.roll() makes a new array every call,
+        comets roll their chains every step. The pixels are rolled into spareHsv which then swaps
+        places with hsv.
+
+        :param int steps: -/+ number of steps to roll
+        :return: nothing the pixel array is rolled
+        """
+        n=len(self.hsv)
+        if n==0: return
+
+        if self.spareHsv is None or self.spareHsv.shape!=self.hsv.shape:
+            self.spareHsv=np.empty_like(self.hsv)
+
+        steps%=n
+        rolled=self.spareHsv
+        rolled[steps:]=self.hsv[:n-steps]
+        rolled[:steps]=self.hsv[n-steps:]
+        self.spareHsv,self.hsv=self.hsv,rolled
 
     def shiftRight(self,steps=1,fill=Black.getPixelColor()):
         """
@@ -315,7 +352,7 @@ class Chain():
         :param fill: color to use for backfill default is Black
         :return: nothing, the chain is shifted right
         """
-        self.hsv = np.roll(self.hsv, steps, axis=0)
+        self._roll(steps)
         if fill is not None:
             r,g,b,a=fill
             h,s,v=colorsys.rgb_to_hsv(r/255.0,g/255.0,b/255.0)
@@ -327,7 +364,7 @@ class Chain():
         :param steps: number of places to shift
         :return: nothing the pixel array is
         """
-        self.hsv = np.roll(self.hsv, -steps, axis=0)
+        self._roll(-steps)
         if fill is not None:
             r, g, b, a = fill
             h, s, v = colorsys.rgb_to_hsv(r / 255.0, g / 255.0, b / 255.0)
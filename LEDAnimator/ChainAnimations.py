@@ -39,9 +39,9 @@ class Sparkle(ChainAnimBase):
             self.init=False
 
         for p in range(self.chain.getLength()):
-            color=self.palette.getRandomEntry().getPixelColor()
+            color=self.palette.getRandomEntry(self.rng).getPixelColor()
             self.chain.setPixel(p,color)
-            factor=random.randint(0,10)/10.0
+            factor=self.rng.randint(0,10)/10.0
             self.chain.setPixelBrightness(p,factor)
 
         self.refreshCanvas()
@@ -56,7 +56,7 @@ class SparkleRandom(ChainAnimBase):
             self.refreshCanvas()
             return
 
-        self.chain.setAllPixelsRandom()
+        self.chain.setAllPixelsRandom(self.nprng)
         self.refreshCanvas()
 
 # COMET - a single comet heading left or right
@@ -102,6 +102,7 @@ class Comet(ChainAnimBase):
 
         self.refreshCanvas()
         self.chain.roll(self.direction)
+        self.invalidateLayer()  # the chain moved after refreshCanvas()
 
 # COMET-RIGHT
 class CometRight(Comet):
@@ -232,6 +233,7 @@ class AltOnOff(ChainAnimBase):
 
         self.refreshCanvas()
         self.chain.roll(1)
+        self.invalidateLayer()  # the chain moved after refreshCanvas()
 
 # ON - uses the palette to color LEDS
 # if the color is black the LEDs will be off
@@ -281,7 +283,7 @@ class Fade(ChainAnimBase):
             self.init=False
         else:
             # we want the brightness to go from zero to 1.0 in duration seconds
-            self.alpha= (time.time() - self.startTime) / self.duration
+            self.alpha= (self.clock.time() - self.startTime) / self.duration
             if self.direction>0:
                 if self.alpha>=1.0:
                     self.animationHasFinished()
@@ -0,0 +1,119 @@
+"""
+Clock.py
+
+The time source for animations.
+
+Animations ask their clock for the time, self.clock.time(), rather than calling time.time() so
+that the Animator controls what time they see:-
+
+- every layer sees the same time during a frame (the frame time) no matter how long the
+  earlier layers took to render.
+- frames which were missed because of an overrun can be stepped at the time they should have
+  been rendered (see Animator overrunPolicy="catchup").
+- animation time can be held back so that animations slow down, rather than jump, after an
+  overrun or whilst the Animator is paused (see stretch()).
+
+The Animator sets the frame time at the start of each frame and clears it when it stops.
+Outside of the Animator run loop time() returns the current time less any stretch.
+
+Each Animator has its own Clock which it passes to the animations via AnimInfo. Animations
+which are not run by an Animator use systemClock.
+
+VirtualClock does not follow the wall clock at all. It only moves when told to, which allows
+the OfflineRenderer to step the animations at exactly 1/fps as fast as the CPU allows.
+
+"""
+
+import time
+
+
+class Clock(object):
+
+    offset=0.0          # seconds that animation time is behind wall clock time, see stretch()
+    frameTime=None      # time of the frame being rendered, set by the Animator
+
+    def now(self):
+        """
+        the current animation time, ignoring the frame time
+
+        :return float: seconds
+        """
+        return time.time()-self.offset
+
+    def time(self):
+        """
+        the time animations should use
+
+        :return float: seconds - the frame time if set otherwise now()
+        """
+        if self.frameTime is not None: return self.frameTime
+        return self.now()
+
+    def setFrameTime(self,t=None):
+        """
+        sets the time seen by animations for the next frame
+
+        :param float t: frame time, default is now()
+        :return float: the frame time
+        """
+        self.frameTime=self.now() if t is None else t
+        return self.frameTime
+
+    def clearFrameTime(self):
+        """
+        called when the Animator stops so that time() follows the wall clock again
+        :return None:
+        """
+        self.frameTime=None
+
+    def stretch(self,seconds):
+        """
+        holds animation time back by the given number of seconds
+
+        :param float seconds: amount to hold back
+        :return None:
+        """
+        self.offset+=seconds
+
+
+class VirtualClock(Clock):
+    """
+    A clock which only moves when advance() or setTime() is called.
+
+    Time starts at zero so that frame times are small numbers and subtracting two of them
+    does not lose precision.
+    """
+
+    t=0.0       # current virtual time
+
+    def __init__(self,**kwargs):
+
+        for key,value in kwargs.iteritems():
+            setattr(self,key,value)
+
+    def now(self):
+        """
+        :return float: the virtual time less any stretch
+        """
+        return self.t-self.offset
+
+    def setTime(self,t):
+        """
+        :param float t: the new virtual time in seconds
+        :return None:
+        """
+        self.t=t
+
+    def advance(self,seconds):
+        """
+        moves the virtual time on
+
+        :param float seconds: amount to move on
+        :return float: the new virtual time
+        """
+        self.t+=seconds
+        return self.t
+
+
+# used by animations which are not run by an Animator
+systemClock=Clock()
@@ -68,37 +68,19 @@ class Color():
         G=float8(int(col[2:4], 16))
         B=float8(int(col[4:6], 16))
 
-        # if BGR format - swap the R&B channels (Royal pain)
-        if RGB_R==0:
-            self.H, self.S, self.V = colorsys.rgb_to_hsv(R, G, B)
-        else:
-            self.H, self.S, self.V = colorsys.rgb_to_hsv(B, G, R)
+        self.H, self.S, self.V = colorsys.rgb_to_hsv(R, G, B)
 
 
     def hsva2PixelColor(self,hsv):
         """
         internal only - converts HSV colour to RGB with 100% alpha added. Values are mapped to the 0->255 range.
 
-        The order of the channels is governed by the values of RGB_R,RGB_G and RGB_B defined in Constants.py
-
-        For simulating the BGR format is used by openCV's imshow()
-
         :param tuple hsv: (h,s,v,a)
-        :return tuple : (r,g,b,a) in Pixel order
+        :return tuple : (r,g,b,a)
         """
         h,s,v,a=hsv
         r,g,b=colorsys.hsv_to_rgb(h,s,v)
-        color = (uint8(r), uint8(g), uint8(b),uint8(a))
-        return self.rgba2PixelColor((color[RGB_R],color[RGB_G],color[RGB_B],color[ALPHA]))
-
-    def rgba2PixelColor(self,color):
-        """
-        Helper - ensures rgba is in the order required for pixels
-        :param color: tuple rgba in Pixel order
-        :return: tuple rgba in Pixel color order
-        """
-        assert len(color)==4,"color tuple should have 4 parts. Got "+str(color)
-        return (color[RGB_R], color[RGB_G], color[RGB_B], color[ALPHA])
+        return (uint8(r), uint8(g), uint8(b),uint8(a))
 
 
     def getPixelColor(self,brightness=1.0,alpha=1.0):
@@ -119,24 +101,23 @@ class Color():
 
         (r,g,b)=colorsys.hsv_to_rgb(self.H,self.S,self.V*brightness)
 
-        color=(uint8(r),uint8(g),uint8(b),uint8(alpha))
-        return self.rgba2PixelColor(color)
+        return (uint8(r),uint8(g),uint8(b),uint8(alpha))
 
-    def getRandomPixelColor(self,brightness=1.0,alpha=1.0):
+    def getRandomPixelColor(self,brightness=1.0,alpha=1.0,rng=random):
         """
         returns a random color with the requested brightness and alpha
 
         :param float brightness: multiplier range 0->1.0 default 1.0
         :param float alpha: value range 0->1.0 default 1.0
+        :param random.Random rng: random number generator, default is the random module
         :return tuple: (r,g,b,a) mapped to 0->255 with channels ordered
         """
         assert brightness >= 0.0 and brightness <= 1.0, "brightness value should be in range 0->1.0"
         assert alpha >= 0.0 and alpha <= 1.0, "alpha value should be in range 0->1.0"
 
-        H,S,V=random.randint(0,255)/255.0,random.randint(0,255)/255.0,random.randint(0,255)/255.0
+        H,S,V=rng.randint(0,255)/255.0,rng.randint(0,255)/255.0,rng.randint(0,255)/255.0
         (r,g,b)=colorsys.hsv_to_rgb(H,S,V*brightness)
-        color=(uint8(r),uint8(g),uint8(b),uint8(alpha))
-        return self.rgba2PixelColor(color)
+        return (uint8(r),uint8(g),uint8(b),uint8(alpha))
 
 
 
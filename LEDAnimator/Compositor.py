@@ -0,0 +1,380 @@
+"""
+Compositor.py
+
+Merges the Animator's layers with the Panel frameBuffer, only where something changed.
+
+Each layer keeps a copy of the image it drew on the previous frame (LayerDamage). After the layer
+has been stepped the new image is compared with the copy and the bounding rectangle of the pixels
+which changed is reported as the layer's dirty rectangle. The comparison is done on the thread or
+process which stepped the layer so it runs in parallel with the other layers.
+
+The frameBuffer is kept from one frame to the next. The Compositor takes the union of the layer
+dirty rectangles and, within that rectangle only, refills the Panel background colour and blends
+the layers, bottom to top, just as a full frame would be. Pixels outside it are already correct.
+
+A show made of a static logo and a small chain overlay only recomposes the few pixels under the
+chain on each frame instead of the whole panel.
+
+Rectangles are (x0,y0,x1,y1), x1 and y1 are exclusive. None means nothing changed.
+
+The whole frame is recomposed on the first frame, when the Panel background colour changes or
+when the frameBuffer is replaced by Panel.init().
+
+The layer stack is reduced into the frameBuffer in a single pass over the rectangle. It is looked
+at from the top down first (occlusion culling). Layers which are transparent there are left out,
+and the first layer which is opaque there hides everything below it, background colour included,
+so it is copied straight into the frameBuffer. The layers above it are then blended, bottom to top,
+once each.
+
+Most layers are just one image on transparency, an image animation's fgImage or a line of text
+(see AnimBase.getImageLayer()). Those are passed to compose() as an ImageLayer rather than drawn
+into a layerBuffer, and the image is blended straight into the frameBuffer. Each layer costs one
+blend, of the part of it inside the rectangle, instead of a clear and a paste into its own full
+size layerBuffer followed by a blend of that, and it never needs a layerBuffer at all. LayerDamage
+only compares the part of the image on the panel, or the rectangles it covered, when it moves.
+
+A full screen photo under a clock overlay is one copy of the photo and one blend of the text.
+
+Layers which draw more than one image, chains or a background colour still draw their own
+layerBuffer, as do layers stepped in a process (see LayerRenderer.py) since their images live in
+another process. Pasting an image onto a transparent layer and blending that gives exactly the
+same pixels as blending the image itself so the frames are the same either way.
+
+"""
+
+import numpy as np
+import Panel
+from UtilLib import alphaCoverage,nearest
+from Scratch import getScratch
+from Constants import OPAQUE_COVERAGE,TRANSPARENT_COVERAGE,MIXED_COVERAGE
+
+
+def unionRect(a,b):
+    """
+    :param tuple a: (x0,y0,x1,y1) or None
+    :param tuple b: (x0,y0,x1,y1) or None
+    :return tuple: the smallest rectangle containing a and b, None if both are None
+    """
+    if a is None: return b
+    if b is None: return a
+    return (min(a[0],b[0]),min(a[1],b[1]),max(a[2],b[2]),max(a[3],b[3]))
+
+
+def rectArea(rect):
+    """
+    :param tuple rect: (x0,y0,x1,y1) or None
+    :return int: number of pixels in the rectangle
+    """
+    if rect is None: return 0
+    return (rect[2]-rect[0])*(rect[3]-rect[1])
+
+
+def diffRect(img,prev):
+    """
+    finds the pixels which differ between two images of the same shape
+
+    :param numpy ndarray img: (h,w,4) uint8 image
+    :param numpy ndarray prev: (h,w,4) uint8 image
+    :return tuple: bounding rectangle (x0,y0,x1,y1) of the changed pixels or None if they are the same
+    """
+    h,w=img.shape[:2]
+    pool=getScratch()
+
+    # compare whole pixels at once (4 bytes as one uint32)
+    if img.flags.c_contiguous and prev.flags.c_contiguous:
+        changed=np.not_equal(img.view(np.uint32).reshape(h,w),prev.view(np.uint32).reshape(h,w),
+                             out=pool.get("diffChanged",(h,w),np.bool_))
+    else:
+        # a window of a bigger image
+        unequal=np.not_equal(img,prev,out=pool.get("diffUnequal",(h,w,4),np.bool_))
+        changed=np.any(unequal,axis=2,out=pool.get("diffChanged",(h,w),np.bool_))
+
+    rows=np.flatnonzero(np.any(changed,axis=1,out=pool.get("diffRows",(h,),np.bool_)))
+    if len(rows)==0: return None
+
+    y0,y1=rows[0],rows[-1]+1
+    cols=np.flatnonzero(changed[y0:y1].any(axis=0))
+
+    return (int(cols[0]),int(y0),int(cols[-1])+1,int(y1))
+
+
+def visibleLayers(layers,rect):
+    """
+    works down the layer stack, from the top, to find the layers which can be seen in a rectangle
+
+    :param list layers: layer images (numpy ndarray) or ImageLayers bottom to top, None if a layer drew nothing
+    :param tuple rect: (x0,y0,x1,y1)
+    :return tuple: (visible,covered). visible is a list of (x,y,image,coverage), where to draw the part of
+                   each visible layer in rect, bottom to top. covered is True if the first of them is opaque
+                   over the whole of rect so nothing below it, not even the background, shows
+    """
+    x0,y0,x1,y1=rect
+    visible=[]
+    covered=False
+
+    for layer in reversed(layers):
+        if layer is None: continue
+
+        if isinstance(layer,ImageLayer):
+            window=layer.window(rect)
+            if window is None: continue
+            x,y,roi=window
+            coverage=layer.windowCoverage(roi)
+            whole=roi.shape[:2]==(y1-y0,x1-x0)
+        else:
+            x,y,roi=x0,y0,layer[y0:y1,x0:x1]
+            coverage=alphaCoverage(roi)
+            whole=True
+
+        if coverage==TRANSPARENT_COVERAGE: continue
+
+        visible.append((x,y,roi,coverage))
+        if coverage==OPAQUE_COVERAGE and whole:
+            covered=True
+            break
+
+    visible.reverse()
+    return visible,covered
+
+
+class ImageLayer(object):
+    """
+    a layer which is one image at a position on an otherwise transparent layer, see
+    AnimBase.getImageLayer(). It is blended straight into the frameBuffer, nothing is drawn
+    into the layerBuffer.
+    """
+
+    def __init__(self,img,x,y,coverage=None):
+        """
+        :param numpy ndarray img: (h,w,4) uint8 image
+        :param float x: position of the image's top left corner, rounded as pasteWithAlphaAt() does
+        :param float y:
+        :param int coverage: alphaCoverage() of the whole image if known (see NumpyImage.getCoverage())
+        """
+        self.img=img
+        self.x,self.y=nearest(x),nearest(y)
+        self.coverage=coverage
+
+    def window(self,rect):
+        """
+        :param tuple rect: (x0,y0,x1,y1) on the panel
+        :return tuple: (x,y,roi) the part of the image inside rect and the panel position of its top
+                       left corner, None if the image isn't in rect
+        """
+        h,w=self.img.shape[:2]
+        x0,y0=max(rect[0],self.x),max(rect[1],self.y)
+        x1,y1=min(rect[2],self.x+w),min(rect[3],self.y+h)
+        if x1<=x0 or y1<=y0: return None
+
+        return x0,y0,self.img[y0-self.y:y1-self.y,x0-self.x:x1-self.x]
+
+    def windowCoverage(self,roi):
+        """
+        :param numpy ndarray roi: a window() of the image
+        :return int: alphaCoverage() of the window, the whole image's if it is the same
+        """
+        if self.coverage is None or (self.coverage==MIXED_COVERAGE and roi.shape!=self.img.shape):
+            return alphaCoverage(roi)
+        return self.coverage
+
+
+class LayerDamage(object):
+    """
+    remembers what a layer drew on the previous frame so that its dirty rectangle can be found
+    """
+
+    def __init__(self):
+        self.prev=None      # copy of the image drawn on the previous frame, or last drawn
+        self.drawn=False    # True if the layer drew anything on the previous frame
+        self.image=False    # True if the previous frame was an ImageLayer, see updateImage()
+        self.imageRect=None # (x0,y0,x1,y1) covered by the ImageLayer on the previous frame
+        self.imagePrev=None # copy of the ImageLayer inside imageRect, a window of imageStore
+        self.imageStore=None    # grows to the biggest window kept so a moving image doesn't allocate
+
+    def update(self,img):
+        """
+        compares the layer image with the one from the previous frame and keeps a copy
+
+        :param img: the layer image (numpy ndarray), an ImageLayer or None if the layer drew nothing
+        :return tuple: dirty rectangle (x0,y0,x1,y1) or None if nothing changed
+        """
+        if isinstance(img,ImageLayer): return self.updateImage(img)
+
+        drawn=img is not None
+
+        if self.image:
+            # only the part of the panel the image covered can change, a whole layer image
+            # is treated as if it had just appeared
+            self.image=False
+            if not drawn:
+                self.drawn=False
+                return self.imageRect
+            self.drawn=False
+
+        if drawn!=self.drawn or (drawn and (self.prev is None or self.prev.shape!=img.shape)):
+            # the layer appeared or disappeared. Layers which draw nothing aren't blended at all
+            # so every pixel of the frame may change
+            h,w=(img if drawn else self.prev).shape[:2]
+            self.drawn=drawn
+            if drawn:
+                # the copy is kept whilst the layer draws nothing so it can be reused
+                if self.prev is None or self.prev.shape!=img.shape: self.prev=np.empty_like(img)
+                np.copyto(self.prev,img)
+            return (0,0,w,h)
+
+        if not drawn: return None
+
+        rect=diffRect(img,self.prev)
+        if rect is not None:
+            x0,y0,x1,y1=rect
+            self.prev[y0:y1,x0:x1]=img[y0:y1,x0:x1]
+
+        return rect
+
+    def updateImage(self,layer):
+        """
+        update() for an ImageLayer. Outside the image the layer is transparent so only the part of
+        the image on the panel is compared and kept. If the image moves, or changes size, the
+        rectangles it covered before and after are dirty.
+
+        :param ImageLayer layer:
+        :return tuple: dirty rectangle (x0,y0,x1,y1) or None if nothing changed
+        """
+        panel=(0,0,Panel.width,Panel.height)
+        window=layer.window(panel)
+        rect=None
+        if window is not None:
+            x0,y0,roi=window
+            h,w=roi.shape[:2]
+            rect=(x0,y0,x0+w,y0+h)
+
+        if not self.image:
+            # a whole layer image may have drawn anywhere, nothing drawn shows nothing
+            dirty=panel if self.drawn else rect
+        elif rect!=self.imageRect:
+            dirty=unionRect(self.imageRect,rect)
+        elif rect is None:
+            dirty=None
+        else:
+            dirty=diffRect(roi,self.imagePrev)
+            if dirty is not None:
+                dx0,dy0,dx1,dy1=dirty
+                self.imagePrev[dy0:dy1,dx0:dx1]=roi[dy0:dy1,dx0:dx1]
+                dirty=(x0+dx0,y0+dy0,x0+dx1,y0+dy1)
+            return dirty
+
+        self.drawn=True
+        self.image=True
+        self.imageRect=rect
+        if rect is not None:
+            store=self.imageStore
+            if store is None or store.shape[0]<h or store.shape[1]<w:
+                sh,sw=(h,w) if store is None else (max(h,store.shape[0]),max(w,store.shape[1]))
+                store=self.imageStore=np.empty((sh,sw)+roi.shape[2:],dtype=roi.dtype)
+            self.imagePrev=store[:h,:w]
+            np.copyto(self.imagePrev,roi)
+        return dirty
+
+
+class Compositor(object):
+    """
+    merges the layer images with the Panel frameBuffer
+    """
+
+    dirtyRects=True     # False recomposes the whole frame every time
+
+    def __init__(self,**kwargs):
+
+        for key,value in kwargs.iteritems():
+            setattr(self,key,value)
+
+        self.resetStats()
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        makes the next compose() redraw the whole frame e.g. when something else has drawn on the Panel
+        :return None:
+        """
+        self.full=True
+        self.frameBuffer=None
+        self.bgColor=None
+
+    def resetStats(self):
+        """
+        zeroes the counters
+        :return None:
+        """
+        self.frames=0           # frames composed
+        self.fullFrames=0       # frames where the whole panel was recomposed
+        self.unchangedFrames=0  # frames where nothing changed
+        self.dirtyPixels=0      # total pixels recomposed
+        self.hiddenLayers=0     # layers not blended because they were transparent or covered
+        self.lastRect=None      # the rectangle recomposed by the last compose()
+
+    def getStats(self):
+        """
+        :return dict: frames, fullFrames, unchangedFrames, dirtyPixels, hiddenLayers and meanDirtyFraction,
+                      the mean fraction of the panel recomposed per frame
+        """
+        panelArea=max(1,Panel.width*Panel.height)
+        return {"frames":self.frames,
+                "fullFrames":self.fullFrames,
+                "unchangedFrames":self.unchangedFrames,
+                "dirtyPixels":self.dirtyPixels,
+                "hiddenLayers":self.hiddenLayers,
+                "meanDirtyFraction":float(self.dirtyPixels)/(panelArea*self.frames) if self.frames else 0.0}
+
+    def compose(self,layers,rects):
+        """
+        merges the layers, bottom to top, with the Panel frameBuffer. Layers which can't be seen are
+        skipped and an opaque bottom layer is copied, the rest are blended once each, an ImageLayer
+        straight from its image
+
+        :param list layers: layer images (numpy ndarray) or ImageLayers in layer order, None if a layer
+                            drew nothing
+        :param list rects: the dirty rectangle of each layer since the last compose(), None if unchanged
+        :return tuple: the rectangle which was recomposed or None if nothing changed
+        """
+        w,h=Panel.width,Panel.height
+
+        full=self.full or not self.dirtyRects or \
+             Panel.frameBuffer is not self.frameBuffer or Panel.panelBgColor!=self.bgColor
+
+        self.full=False
+        self.frameBuffer=Panel.frameBuffer
+        self.bgColor=Panel.panelBgColor
+        self.frames+=1
+
+        if full:
+            rect=(0,0,w,h)
+        else:
+            rect=None
+            for r in rects:
+                rect=unionRect(rect,r)
+
+        self.lastRect=rect
+
+        if rect is None:
+            self.unchangedFrames+=1
+            return None
+
+        area=rectArea(rect)
+        self.dirtyPixels+=area
+        if area==w*h: self.fullFrames+=1
+
+        x0,y0,x1,y1=rect
+        visible,covered=visibleLayers(layers,rect)
+        self.hiddenLayers+=sum(1 for layer in layers if layer is not None)-len(visible)
+
+        # an opaque bottom layer is copied over whatever was there
+        if not covered:
+            if full:
+                Panel.Clear()
+            else:
+                Panel.ClearWindow((x0,y0,x1-x0,y1-y0))
+
+        for x,y,img,coverage in visible:
+            Panel.DrawImage(x,y,img,coverage)
+
+        return rect
@@ -35,15 +35,31 @@ HSV_H=0
 HSV_S=1
 HSV_V=2
 
-# you probably need to set this ro RGB_R=0 and RGB_B=2 for the real panel
-# the simulator uses openCV therefore uses BGR order not RGB
-RGB_R=2
+# channel order of every image, colour tuple and frame buffer, always (r,g,b,a).
+# These are fixed, not settings. Conversion to another order is only done where
+# the pixels leave (or enter) the program: the output backend puts them in the
+# order its display wants (e.g. the simulator and video files use openCV's BGR),
+# and images are converted from BGR once when they are loaded, see ImageCache.py
+RGB_R=0
 RGB_G=1
-RGB_B=0
+RGB_B=2
 
 ALPHA=3
 ALIAS=4 # used by chains
 
+# True stores NumpyImage.out, the layer buffers and the Panel frameBuffer with premultiplied alpha
+# i.e. each colour channel already multiplied by the pixel alpha. Blending is then a multiply-add
+# with no division and fading is a single scale. Colours passed in (palettes, chains, fill and
+# draw colours) and loaded images are still straight alpha, they are converted as they go in.
+# See UtilLib.premultiply()
+PREMULTIPLIED=False
+
+# alpha coverage of an image, see UtilLib.alphaCoverage(). Pasting a transparent image does
+# nothing and pasting an opaque one is a plain copy
+TRANSPARENT_COVERAGE=0
+OPAQUE_COVERAGE=1
+MIXED_COVERAGE=2
+
 # used by Font to handle font types differently
 BDF_FONTTYPE=0
 HERSHEY_FONTTYPE=1
@@ -54,11 +70,11 @@ PIL_FONTTYPE=4
 UNKNOWN_FONTTYPE=-1
 
 
-# conversion routines based on rgb order
-PIXEL2HLS=cv2.COLOR_BGR2HLS if RGB_R==2 else cv2.COLOR_RGB2HLS
-HLS2PIXEL=cv2.COLOR_HLS2BGR if RGB_R==2 else cv2.COLOR_HLS2RGB
-PIXEL2HSV=cv2.COLOR_BGR2HSV if RGB_R==2 else cv2.COLOR_RGB2HSV
-HSV2PIXEL=cv2.COLOR_HSV2BGR if RGB_R==2 else cv2.COLOR_HSV2RGB
+# colour space conversions for pixels
+PIXEL2HLS=cv2.COLOR_RGB2HLS
+HLS2PIXEL=cv2.COLOR_HLS2RGB
+PIXEL2HSV=cv2.COLOR_RGB2HSV
+HSV2PIXEL=cv2.COLOR_HSV2RGB
 
 # Hershey fonts render at this size for fontScale=1.0
 HERSHEY_FONTSIZE=32.0   #22.0   # must be float
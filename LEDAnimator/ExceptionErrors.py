@@ -102,4 +102,15 @@ class InvalidScale(Error):
 
 class UnsupportedFont(Error):
     """ A request was made for an unsupported font """
-    pass
\ No newline at end of file
+    pass
+class LayerProcessFailed(Error):
+    """ an animation raised an exception in a layer process (see LayerRenderer.py)"""
+    pass
+
+class InvalidFrameFile(Error):
+    """ a baked frame file is corrupt, from a newer version or doesn't suit the Panel (see FrameFile.py)"""
+    pass
+
+class UnknownBackend(Error):
+    """ Panel.init() was given a backend name it doesn't know (see Backends.py)"""
+    pass
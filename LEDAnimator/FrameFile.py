@@ -0,0 +1,344 @@
+"""
+FrameFile.py
+
+Bakes an animation sequence to a compact frame file and reads it back.
+
+Sequences which are fully deterministic (chain logos, fixed image moves etc.) don't need to be
+recomputed on every frame. bakeSequence() renders the layer offline, on any machine, and the
+PlaybackAnimation streams the frames back with very little CPU:-
+
+    bakeSequence(seq=DAF_D_SEQ,filename="daf_d.frames",fps=FPS,chain=Chain(DAF_D))
+
+    A.addAnimation(seq=AnimSequence([PlaybackAnimation(frameFile="daf_d.frames",fps=FPS)]))
+
+File layout (little endian):-
+
+    header      magic "LEDFRAME", version, width, height, channel order (RGB_R), premultiplied flag,
+                fps, frame count, keyframe interval and the offset of the index
+    frames      one zlib compressed record per frame
+    index       (offset,length,kind) for each frame
+
+Each frame is one of:-
+
+    KEY         the whole frame. The first frame and every keyframeInterval'th frame are keys
+    DELTA       the frame XORed with the previous frame. Pixels which didn't change are zero
+                so a small moving chain on a big panel compresses to almost nothing
+    REPEAT      the same as the previous frame, nothing is stored
+
+The frames are the layer images, with alpha, so a baked layer composes with other layers exactly
+as the original did. The file is memory mapped by FrameReader so only the frames played are read
+from disc and forked layer processes share the pages.
+
+Usage from the command line:-
+
+    python -m LEDAnimator.FrameFile show.frames     # prints the header and compression
+
+"""
+
+import sys
+import zlib
+import mmap
+import struct
+import argparse
+import numpy as np
+from ExceptionErrors import *
+
+MAGIC="LEDFRAME"
+VERSION=1
+
+# magic,version,width,height,RGB_R,premultiplied,fps,frame count,keyframe interval,index offset
+# files written before the premultiplied flag have 0 there
+HEADER=struct.Struct("<8sHHHBBdIIQ")
+
+INDEX_DTYPE=np.dtype([("offset","<u8"),("length","<u4"),("kind","u1")])
+
+KEY=0
+DELTA=1
+REPEAT=2
+
+
+class FrameWriter(object):
+    """
+    writes frames to a frame file. Frames must all be the same (height,width,4) uint8 shape
+    """
+
+    filename=None           # passed in
+    width=None              # frame size, passed in
+    height=None
+    fps=100
+    keyframeInterval=100    # a whole frame is stored every this many frames so playback can seek
+    level=6                 # zlib compression level 1 (fast) to 9 (small)
+    channelOrder=None       # RGB_R of the frames, default from Constants.py
+    premultiplied=None      # True if the frames have premultiplied alpha, default PREMULTIPLIED from Constants.py
+
+    def __init__(self,**kwargs):
+
+        for key,value in kwargs.iteritems():
+            setattr(self,key,value)
+
+        assert self.filename is not None,"FrameWriter() filename not set."
+        assert self.width>0 and self.height>0,"FrameWriter() width and height must be set."
+        assert self.keyframeInterval>0,"FrameWriter() keyframeInterval must be at least 1."
+
+        if self.channelOrder is None:
+            from Constants import RGB_R
+            self.channelOrder=RGB_R
+
+        if self.premultiplied is None:
+            from Constants import PREMULTIPLIED
+            self.premultiplied=PREMULTIPLIED
+
+        self.file=open(self.filename,"wb")
+        self.file.write(HEADER.pack(MAGIC,VERSION,0,0,0,0,0.0,0,0,0))   # rewritten by close()
+
+        self.index=[]
+        self.prev=np.zeros((self.height,self.width,4),dtype=np.uint8)
+        self.delta=np.empty_like(self.prev)
+        self.bytesIn=0
+        self.bytesOut=0
+
+    def write(self,frame):
+        """
+        appends a frame
+
+        :param numpy ndarray frame: (height,width,4) uint8 image
+        :return None:
+        """
+        if frame.shape!=self.prev.shape:
+            raise InvalidFrameFile("FrameWriter frame shape "+str(frame.shape)+" should be "+str(self.prev.shape))
+
+        n=len(self.index)
+        offset=self.file.tell()
+
+        if n%self.keyframeInterval==0:
+            kind=KEY
+            data=zlib.compress(np.ascontiguousarray(frame).tostring(),self.level)
+        elif np.array_equal(frame,self.prev):
+            kind=REPEAT
+            data=""
+        else:
+            kind=DELTA
+            np.bitwise_xor(frame,self.prev,out=self.delta)
+            data=zlib.compress(self.delta.tostring(),self.level)
+
+        self.file.write(data)
+        self.index.append((offset,len(data),kind))
+        np.copyto(self.prev,frame)
+
+        self.bytesIn+=frame.nbytes
+        self.bytesOut+=len(data)
+
+    def close(self):
+        """
+        writes the index and the final header
+        :return None:
+        """
+        if self.file is None: return
+
+        indexOffset=self.file.tell()
+        self.file.write(np.array(self.index,dtype=INDEX_DTYPE).tostring())
+
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC,VERSION,self.width,self.height,self.channelOrder,int(bool(self.premultiplied)),
+                                    float(self.fps),len(self.index),self.keyframeInterval,indexOffset))
+        self.file.close()
+        self.file=None
+
+
+class FrameReader(object):
+    """
+    reads frames from a memory mapped frame file
+    """
+
+    def __init__(self,filename):
+        """
+        :param str filename: a file written by FrameWriter
+        :raises InvalidFrameFile: if the file is not a frame file or is from a newer version
+        """
+        self.filename=filename
+        self.file=open(filename,"rb")
+        self.map=mmap.mmap(self.file.fileno(),0,access=mmap.ACCESS_READ)
+
+        if len(self.map)<HEADER.size:
+            raise InvalidFrameFile(filename+" is too short to be a frame file.")
+
+        magic,version,self.width,self.height,self.channelOrder,premultiplied,self.fps,self.frameCount,\
+            self.keyframeInterval,indexOffset=HEADER.unpack(self.map[:HEADER.size])
+        self.premultiplied=bool(premultiplied)
+
+        if magic!=MAGIC:
+            raise InvalidFrameFile(filename+" is not a frame file.")
+        if version>VERSION:
+            raise InvalidFrameFile(filename+" is version "+str(version)+", this code reads up to "+str(VERSION))
+        if self.frameCount==0:
+            raise InvalidFrameFile(filename+" has no frames, was it closed?")
+
+        end=indexOffset+self.frameCount*INDEX_DTYPE.itemsize
+        self.index=np.frombuffer(self.map[indexOffset:end],dtype=INDEX_DTYPE)
+
+        # python lists are quicker to index one item at a time
+        self.offsets=self.index["offset"].tolist()
+        self.lengths=self.index["length"].tolist()
+        self.kinds=self.index["kind"].tolist()
+
+        self.frame=np.zeros((self.height,self.width,4),dtype=np.uint8)
+        self.frameNumber=None   # the frame held in self.frame
+
+    def duration(self):
+        """
+        :return float: seconds of animation in the file
+        """
+        return self.frameCount/self.fps
+
+    def isRepeat(self,n):
+        """
+        :param int n: frame number
+        :return bool: True if frame n is the same as frame n-1
+        """
+        return self.kinds[n]==REPEAT
+
+    def _apply(self,n):
+        """
+        decodes frame n on top of frame n-1 (unless it is a key)
+        :param int n: frame number
+        :return None: self.frame is updated
+        """
+        kind=self.kinds[n]
+
+        if kind!=REPEAT:
+            offset,length=self.offsets[n],self.lengths[n]
+            data=np.frombuffer(zlib.decompress(self.map[offset:offset+length]),dtype=np.uint8)
+            data=data.reshape(self.frame.shape)
+
+            if kind==KEY:
+                np.copyto(self.frame,data)
+            else:
+                np.bitwise_xor(self.frame,data,out=self.frame)
+
+        self.frameNumber=n
+
+    def getFrame(self,n):
+        """
+        returns frame n. Reading the frames in order only decodes one record per frame, seeking
+        decodes from the nearest keyframe before n.
+
+        :param int n: frame number 0 to frameCount-1
+        :return numpy ndarray: (height,width,4) uint8 image. It is overwritten by the next
+                               getFrame() so copy it if it's needed for longer
+        """
+        assert 0<=n<self.frameCount,"FrameReader.getFrame() frame "+str(n)+" is not in the file."
+
+        if n==self.frameNumber: return self.frame
+
+        if self.frameNumber is not None and self.frameNumber<n and \
+                n-self.frameNumber<=n%self.keyframeInterval:
+            # carry on from the current frame
+            start=self.frameNumber+1
+        else:
+            start=n-n%self.keyframeInterval
+
+        for f in xrange(start,n+1):
+            self._apply(f)
+
+        return self.frame
+
+    def getStats(self):
+        """
+        :return dict: frames, keys, deltas, repeats, bytes (compressed frame data) and ratio (raw/compressed)
+        """
+        kinds=self.index["kind"]
+        stored=int(self.index["length"].sum())
+        raw=self.frameCount*self.frame.nbytes
+        return {"frames":self.frameCount,
+                "keys":int((kinds==KEY).sum()),
+                "deltas":int((kinds==DELTA).sum()),
+                "repeats":int((kinds==REPEAT).sum()),
+                "bytes":stored,
+                "ratio":float(raw)/max(1,stored)}
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+def bakeSequence(seq,filename,fps=100,duration=None,chain=None,seed=None,keyframeInterval=100,level=6):
+    """
+    renders an animation sequence, as a single layer, to a frame file. Panel.init() must have
+    been called (headless=True will do) with the size of the panel it will be played on.
+
+    The sequence is stepped at exactly 1/fps intervals of a VirtualClock, as the OfflineRenderer does,
+    so a build machine produces the same frames the Pi would.
+
+    :param AnimSequence seq: the sequence to bake
+    :param str filename: the frame file to write
+    :param int fps: frames per second
+    :param float duration: seconds to bake, default one pass through the sequence
+    :param Chain chain: the chain for chain animations
+    :param int seed: random number seed for the layer (see Animator seed)
+    :param int keyframeInterval: frames between whole frames
+    :param int level: zlib compression level 1-9
+    :return dict: FrameReader.getStats() for the file written
+    """
+    import Panel
+    from Animator import Animator
+    from Clock import VirtualClock
+
+    Panel.CheckInit()
+
+    if duration is None:
+        duration=sum(anim.duration for anim in seq.animList)
+
+    frames=int(round(duration*fps))
+    interval=1.0/fps
+
+    A=Animator(fps=fps,seed=seed)
+    A.addAnimation(seq=seq,chain=chain)
+
+    clock=VirtualClock()
+    A.setClock(clock)
+    A.reset()
+    A.openRenderer(interval)
+
+    writer=FrameWriter(filename=filename,width=Panel.width,height=Panel.height,fps=fps,
+                       keyframeInterval=keyframeInterval,level=level)
+    blank=np.zeros((Panel.height,Panel.width,4),dtype=np.uint8)
+
+    try:
+        for n in xrange(frames):
+            clock.setTime(n*interval)
+            clock.setFrameTime()
+
+            A.renderer.render()
+            layer=A.renderer.getLayers()[0]
+
+            writer.write(layer if layer is not None else blank)
+    finally:
+        A.closeRenderer()
+        clock.clearFrameTime()
+        writer.close()
+
+    reader=FrameReader(filename)
+    stats=reader.getStats()
+    reader.close()
+    return stats
+
+
+def main(argv=None):
+    parser=argparse.ArgumentParser(description="Describes an LEDAnimator frame file.")
+    parser.add_argument("filename",help="frame file written by bakeSequence()")
+    args=parser.parse_args(argv)
+
+    reader=FrameReader(args.filename)
+    stats=reader.getStats()
+
+    print "%s: %dx%d %.1f fps %d frames (%.1f seconds) keyframe interval %d%s" % \
+          (args.filename,reader.width,reader.height,reader.fps,reader.frameCount,reader.duration(),
+           reader.keyframeInterval," premultiplied" if reader.premultiplied else "")
+    print "keys %(keys)d deltas %(deltas)d repeats %(repeats)d, %(bytes)d bytes, compression %(ratio).1f:1" % stats
+
+    reader.close()
+    return 0
+
+
+if __name__=="__main__":
+    sys.exit(main())
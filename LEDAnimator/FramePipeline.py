@@ -0,0 +1,162 @@
+"""
+FramePipeline.py
+
+Decouples rendering from output.
+
+Without a pipeline Panel.UpdateDisplay() does the colour adjustment, PIL conversion and SwapOnVSync
+on the Animator thread, so rendering of the next frame cannot begin until the current frame is on
+the matrix.
+
+With a pipeline UpdateDisplay() copies the frameBuffer into one of a small pool of frame buffers
+(2=double buffered, 3=triple buffered) and returns. A dedicated output thread presents the queued
+frames in order, so output overlaps rendering of the next frame.
+
+When all the buffers are queued the renderer is running faster than the output. What happens next
+depends on dropFrames:-
+
+    dropFrames=False    UpdateDisplay() waits for a buffer to be freed (back-pressure). Every frame
+                        is shown.
+    dropFrames=True     the oldest frame which has not been presented yet is dropped and its buffer
+                        re-used. The renderer never waits.
+
+Counters for submitted, presented, dropped frames and back-pressure stalls are available from
+getStats().
+
+Used by Panel.py - see Panel.init(pipelineDepth=2)
+"""
+
+import threading
+import time
+import Queue
+import numpy as np
+
+
+class FramePipeline(object):
+
+    depth=2             # number of frame buffers
+    dropFrames=False    # see above
+    present=None        # function(img) which sends a frame to the matrix
+    debug=False
+
+    def __init__(self,shape,**kwargs):
+        """
+        creates the frame buffers and starts the output thread
+
+        :param tuple shape: (height,width,channels) of the frames
+        :param kwargs: depth=int, dropFrames=bool, present=function(img)
+        """
+        for key,value in kwargs.iteritems():
+            setattr(self,key,value)
+
+        assert self.depth>=2,"FramePipeline depth must be 2 or more."
+        assert self.present is not None,"FramePipeline needs a present() function."
+
+        self.free=Queue.Queue()     # buffers available for the renderer
+        self.ready=Queue.Queue()    # buffers waiting to be presented, oldest first
+
+        for n in range(self.depth):
+            self.free.put(np.zeros(shape,dtype=np.uint8))
+
+        # counters
+        self.submitted=0
+        self.presented=0
+        self.dropped=0
+        self.stalls=0           # times UpdateDisplay() had to wait for a buffer
+        self.stallTime=0.0      # total time spent waiting
+
+        self.error=None         # exception raised by present(), re-raised by submit()
+
+        self.thread=threading.Thread(target=self._run,name="FramePipeline")
+        self.thread.daemon=True
+        self.thread.start()
+
+    def _getBuffer(self):
+        """
+        gets a free buffer for the next frame, waiting or dropping a frame if there isn't one
+
+        :return numpy ndarray: a buffer to copy the next frame into
+        """
+        try:
+            return self.free.get_nowait()
+        except Queue.Empty:
+            pass
+
+        if self.dropFrames:
+            try:
+                buf=self.ready.get_nowait()
+                self.ready.task_done()
+                self.dropped+=1
+                return buf
+            except Queue.Empty:
+                pass    # the output thread took it first - wait for it to finish
+
+        t0=time.time()
+        buf=self.free.get()
+        self.stalls+=1
+        self.stallTime+=time.time()-t0
+        return buf
+
+    def submit(self,img):
+        """
+        queues a copy of img for output
+
+        :param numpy ndarray img: the frame
+        :return None:
+        :raises: any exception raised by present() on the output thread
+        """
+        if self.error is not None:
+            error,self.error=self.error,None
+            raise error
+
+        buf=self._getBuffer()
+        np.copyto(buf,img)
+        self.submitted+=1
+        self.ready.put(buf)
+
+    def _run(self):
+        """
+        output thread. Presents frames in the order they were submitted
+
+        :return None:
+        """
+        while True:
+            buf=self.ready.get()
+            if buf is None:
+                self.ready.task_done()
+                break
+
+            try:
+                self.present(buf)
+                self.presented+=1
+            except Exception as e:
+                self.error=e
+            finally:
+                self.free.put(buf)
+                self.ready.task_done()
+
+    def flush(self):
+        """
+        waits until all queued frames have been presented
+        :return None:
+        """
+        self.ready.join()
+
+    def close(self):
+        """
+        presents any queued frames then stops the output thread
+        :return None:
+        """
+        self.ready.put(None)
+        self.thread.join()
+
+    def getStats(self):
+        """
+        :return dict: frame counters
+        """
+        return {"depth":self.depth,
+                "submitted":self.submitted,
+                "presented":self.presented,
+                "dropped":self.dropped,
+                "queued":self.ready.qsize(),
+                "stalls":self.stalls,
+                "stallTime":self.stallTime}
@@ -0,0 +1,149 @@
+"""
+FrameScheduler.py
+
+Paces the Animator run loop at the requested fps.
+
+Frames are scheduled against absolute deadlines (start time + n * frameInterval) rather than
+waiting frameInterval after each frame finishes. Small errors in each wait therefore do not
+accumulate and the animation does not drift.
+
+Waiting is done in two parts:-
+
+1. sleep until spinTime seconds before the deadline. This hands the CPU back to the OS so
+   the hzeller refresh thread is not starved.
+2. spin for the remainder. This absorbs the wake-up latency of time.sleep() which can be a
+   millisecond or more on a Pi.
+
+The scheduler also records how late each frame started (jitter) so you can check that frames
+land on time.
+
+waitForNextFrame(skip=n) passes over n deadlines before the next frame. The Animator does that
+whilst its frames aren't changing so a static sign isn't rendered 100 times a second.
+
+usage (see Animator.run()):-
+
+    sched=FrameScheduler(fps=100)
+    sched.start()
+    while running:
+        sched.beginFrame()
+        ... render the frame ...
+        sched.waitForNextFrame()
+
+"""
+
+import time
+
+
+class FrameScheduler(object):
+
+    fps=None            # passed in
+    spinTime=0.002      # seconds before a deadline at which we stop sleeping and start spinning
+
+    # calculated
+    frameInterval=None  # 1.0/fps
+    deadline=None       # absolute time the current frame was due to start
+    frameCount=0        # frames scheduled since start()
+    overruns=0          # number of frames which finished after the next deadline
+    idleSlots=0         # deadlines passed over by waitForNextFrame(skip)
+
+    # jitter - how late each frame started compared with its deadline (seconds)
+    jitterLast=0.0
+    jitterMax=0.0
+    jitterTotal=0.0
+
+    def __init__(self,**kwargs):
+
+        for key,value in kwargs.iteritems():
+            setattr(self,key,value)
+
+        assert self.fps is not None,"FrameScheduler() fps not set."
+
+        # if fps is integer 1/fps would be integer zero!
+        self.frameInterval=1.0/self.fps
+
+    def start(self):
+        """
+        Sets the first deadline to now and clears the counters
+
+        :return None:
+        """
+        self.deadline=time.time()
+        self.frameCount=0
+        self.overruns=0
+        self.idleSlots=0
+        self.jitterLast=0.0
+        self.jitterMax=0.0
+        self.jitterTotal=0.0
+
+    def rebase(self):
+        """
+        Moves the next deadline to now. Used after a pause so that the scheduler doesn't
+        try to catch up on the frames which would have been shown whilst paused.
+
+        :return None:
+        """
+        self.deadline=time.time()
+
+    def beginFrame(self):
+        """
+        Called at the start of each frame to record the scheduling jitter
+
+        :return float: the time the frame started
+        """
+        t=time.time()
+
+        late=t-self.deadline
+        if late<0: late=0.0     # can't start early but time.time() may be coarse
+
+        self.jitterLast=late
+        self.jitterTotal+=late
+        if late>self.jitterMax: self.jitterMax=late
+
+        self.frameCount+=1
+        return t
+
+    def waitForNextFrame(self,skip=0):
+        """
+        Moves the deadline on by one frame interval, or 1+skip intervals, and waits for it.
+
+        If the frame overran the next deadline we don't wait at all. The deadline is moved
+        to now so that a long stall doesn't result in a burst of frames trying to catch up.
+
+        :param int skip: frame deadlines to pass over, e.g. whilst nothing is changing
+        :return float: the overrun in seconds (0 if the frame finished in time)
+        """
+        self.deadline+=self.frameInterval*(1+skip)
+        self.idleSlots+=skip
+
+        now=time.time()
+        remaining=self.deadline-now
+
+        if remaining<0:
+            self.overruns+=1
+            self.deadline=now
+            return -remaining
+
+        # sleep for most of the interval
+        if remaining>self.spinTime:
+            time.sleep(remaining-self.spinTime)
+
+        # spin for the last bit
+        while time.time()<self.deadline:
+            pass
+
+        return 0.0
+
+    def getJitter(self):
+        """
+        returns the scheduling jitter statistics
+
+        :return dict: frames, overruns, idleSlots (deadlines passed over), last, mean and max jitter in seconds
+        """
+        mean=self.jitterTotal/self.frameCount if self.frameCount>0 else 0.0
+
+        return {"frames":self.frameCount,
+                "overruns":self.overruns,
+                "idleSlots":self.idleSlots,
+                "last":self.jitterLast,
+                "mean":mean,
+                "max":self.jitterMax}
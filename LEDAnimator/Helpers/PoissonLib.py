@@ -131,7 +131,7 @@ def point_valid(pt):
     return True
 
 
-def get_point(k, refpt):
+def get_point(k, refpt, rng=np.random):
     """Try to find a candidate point relative to refpt to emit in the sample.
 
     We draw up to k points from the annulus of inner radius r, outer radius 2r
@@ -139,12 +139,14 @@ def get_point(k, refpt):
     they're too close to existing points in the sample), return False.
     Otherwise, return the pt.
 
+    rng is the random number generator (np.random or a RandomState).
+
     """
     global r,rx2,PIx2,height,width
     i = 0
 
     while i < k:
-        rho, theta = np.random.uniform(r, rx2), np.random.uniform(0, PIx2)
+        rho, theta = rng.uniform(r, rx2), rng.uniform(0, PIx2)
         pt = refpt[0] + rho*np.cos(theta), refpt[1] + rho*np.sin(theta)
         if not (0 < pt[0] < width and 0 < pt[1] < height):
             # This point falls outside the domain, so try again.
@@ -155,14 +157,14 @@ def get_point(k, refpt):
     # We failed to find a suitable point in the vicinity of refpt.
     return False
 
-def getSamples2(k,r,w,h):
+def getSamples2(k,r,w,h,rng=np.random):
 
     global coords_list,cells,a,mx,ny,samples,rx2,rxx2,PIx2,width,height
 
     init(k,r,w,h)
 
     # Pick a random point to start with.
-    pt = (np.random.uniform(0, w), np.random.uniform(0, h))
+    pt = (rng.uniform(0, w), rng.uniform(0, h))
     samples = [pt]
 
     # Our first sample is indexed at 0 in the samples list...
@@ -177,10 +179,10 @@ def getSamples2(k,r,w,h):
     # As long as there are points in the active list, keep trying to find samples.
     while active:
         # choose a random "reference" point from the active list.
-        idx = np.random.choice(active)
+        idx = rng.choice(active)
         refpt = samples[idx]
         # Try to pick a new point relative to the reference point.
-        pt = get_point(k, refpt)
+        pt = get_point(k, refpt, rng)
         if pt:
             # Point pt is valid: add it to the samples list and mark it as active
             samples.append(pt)
@@ -213,5 +215,5 @@ def getSamples2(k,r,w,h):
 
 class PoissonLib():
 
-    def getSamples(self,k,r,w,h):
-        return getSamples2(k,r,w,h)
\ No newline at end of file
+    def getSamples(self,k,r,w,h,rng=np.random):
+        return getSamples2(k,r,w,h,rng)
\ No newline at end of file
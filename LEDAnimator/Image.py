@@ -19,7 +19,9 @@ fgImage=ThisImage or bgImage=ThisImage
 
 """
 
+import threading
 import NumpyImage
+import numpy as np
 from Constants import *
 
 class Image():
@@ -72,11 +74,14 @@ class Image():
     alignMode=("C","C") # center on the panel
     debug=False
     loadVisible=True
+    lock=None           # held whilst the image is being loaded, it may be prefetched by another thread
 
     def __init__(self,**kwargs):
         for key, value in kwargs.iteritems():
             setattr(self, key, value)
 
+        self.lock=threading.RLock()
+
 
     def loadImage(self):
         """
@@ -86,16 +91,28 @@ class Image():
         """
         if self.debug: print "Image.loadImage() called for imagePath=",self.imagePath
 
-        # already loaded?
-        if self.image is not None:
-            if self.debug: print "Image.loadImage() imagePath=",self.imagePath,"is already loaded"
-            return
+        with self.lock:
+            # already loaded?
+            if self.image is not None:
+                if self.debug: print "Image.loadImage() imagePath=",self.imagePath,"is already loaded"
+                return
+
+            self.image=self.createImage()
+
+    def createImage(self):
+        """
+        loads the image from imagePath without keeping it. Used by loadImage() and by
+        AnimBase.prepareImage() which transforms it before handing it over.
+
+        :return NumpyImage: the image or None if there's no imagePath
+        """
+        if self.imagePath is None: return None
 
-        if self.imagePath is not None:
-            if self.debug: print "Image.loadImage() loadVisible=",self.loadVisible
-            alpha=255 if self.loadVisible else 0
-            self.image=NumpyImage.NumpyImage(imagePath=self.imagePath,alpha=alpha)
-            assert self.image is not None,"Image.loadImage() FAILED for imagePath="+self.imagePath
+        if self.debug: print "Image.createImage() loadVisible=",self.loadVisible
+        alpha=255 if self.loadVisible else 0
+        image=NumpyImage.NumpyImage(imagePath=self.imagePath,alpha=alpha)
+        assert image is not None,"Image.createImage() FAILED for imagePath="+self.imagePath
+        return image
 
     def getScaleMode(self):
         return self.scaleMode
@@ -119,6 +136,10 @@ class Image():
         if self.image is None: return None
         return self.image.getImageData()
 
+    def getCoverage(self):
+        if self.image is None: return None
+        return self.image.getCoverage()
+
     def getSize(self):
         if self.image is None:
             print "Image not loaded ",self.imagePath
@@ -215,9 +236,9 @@ class Image():
         if self.image is None: return
         self.image.resetImage()
 
-    def fillWindowRandom(self, color):
+    def fillWindowRandom(self, window, alpha=255, rng=np.random):
         if self.image is None: return
-        self.image.fillWindowRandom(color)
+        self.image.fillWindowRandom(window,alpha,rng)
 
     def fillWindowAlpha(self, window, alpha=255):
         if self.image is None: return
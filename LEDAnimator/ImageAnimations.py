@@ -348,7 +348,7 @@ class Dissolve(ImageAnimBase):
 
         self.lenList=w*h
 
-        random.shuffle(self.LEDlist)
+        self.rng.shuffle(self.LEDlist)
 
     def step(self):
         # speed control
@@ -769,7 +769,7 @@ class TheMatrix(ImageAnimBase):
 
         if self.init:
             for s in range(imWidth):
-                self.columnSpeeds.append(random.randint(1,3))
+                self.columnSpeeds.append(self.rng.randint(1,3))
             self.refreshCanvas()
             self.init=False
             return
@@ -11,25 +11,15 @@ memory usage and speeds
 ImageCache does the following:-
 
 1 checks the image loaded ok - aborts the program if not
-2 if not simulating adjusts the RGB channels for the LED panel (not individual leds)
+2 converts it, once, from the BGR order openCV reads in to RGBA (see Constants.py)
 '''
 
 import cv2
 import os
-import numpy as np
 from LEDAnimator.ExceptionErrors import *
 from LEDAnimator.Constants import *
 from Constants import *
 
-# simple test to see if we are using the simulator or not
-# if rgbmartrix imports we are running for real
-
-try:
-    import rgbmatrix
-    simulating=False
-except:
-    simulating=True
-
 #dictionary for the images
 # usage: cache[imagePath]=numpy image
 cache={}
@@ -63,18 +53,16 @@ def loadImage(imagePath):
     if not srcBGR.data:
         raise NoImageData
 
-    # change image color channel order to match output
-    if RGB_R==0:
-        cache[imagePath]=cv2.cvtColor(srcBGR,cv2.COLOR_BGR2RGB)
+    # change image color channel order to RGBA, adding an opaque alpha channel if needed
+    # alpha is always used for Fadein/out effects
+    if srcBGR.ndim==2:
+        toRGBA=cv2.COLOR_GRAY2RGBA
+    elif srcBGR.shape[2]==4:
+        toRGBA=cv2.COLOR_BGRA2RGBA
     else:
-        cache[imagePath]=srcBGR
-
-    # add an alpha channel if needed
-    # always used for Fadein/out effects
-    h, w, c = cache[imagePath].shape
-    if c < 4:
-        alpha = np.full([h, w, 1], 255, dtype=np.uint8)  # opaquee
-        cache[imagePath] = np.concatenate((cache[imagePath], alpha), axis=2)
+        toRGBA=cv2.COLOR_BGR2RGBA
+
+    cache[imagePath]=cv2.cvtColor(srcBGR,toRGBA)
 
     return cache[imagePath]
 
@@ -0,0 +1,312 @@
+"""
+LayerRenderer.py
+
+Steps the animation layers for the Animator, optionally in parallel.
+
+Each layer (AnimInfo) renders into its own layerBuffer, or is just one image (see Compositor.py), so
+the layers are independent of each other until they are merged with the Panel frameBuffer. The merge
+is always done by the Animator, in layer order, on its own thread. Only the step()/refreshCanvas()
+work is run in parallel.
+
+Executors:-
+
+    serial      layers are stepped one after the other on the Animator thread (the default)
+
+    thread      layers are stepped by a thread pool. Best for layers which spend their time in numpy
+                or openCV since those release the GIL.
+
+    process     each layer is stepped by its own process which copies the finished layer image into
+                shared memory, so a process layer always draws its layerBuffer. Best for layers
+                which spend their time in python code (chains etc).
+                Requires fork() so is only available on Linux (e.g. the Pi). The animation state
+                lives in the layer process so Animator.start(reset=False) restarts from the state
+                the animations had before the previous start().
+
+The executor is chosen for all layers by the Animator and can be overridden for a single layer:-
+
+    A=Animator(fps=FPS,executor="thread",workers=4)
+    A.addAnimation(seq=IMAGE_SEQ)                                           # uses a pool thread
+    A.addAnimation(chain=Chain(DAF_D),seq=DAF_D_SEQ,executor="process")     # has its own process
+
+Layers must not share objects which are changed whilst rendering (e.g. the same Image in two
+layers) when using thread or process executors.
+
+"""
+
+import os
+import time
+import ctypes
+import traceback
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import numpy as np
+import Panel
+from Compositor import unionRect
+from Prefetcher import waitForPrefetcher
+from ExceptionErrors import *
+
+SERIAL="serial"
+THREAD="thread"
+PROCESS="process"
+
+EXECUTORS=(SERIAL,THREAD,PROCESS)
+
+
+def _layerWorker(animInfo,shared,shape,conn):
+    """
+    run loop for a layer process. Waits for the Animator to ask for a frame, steps the
+    layer then copies the layerBuffer to shared memory.
+
+    :param AnimInfo animInfo: the layer - a forked copy of the Animator's
+    :param RawArray shared: shared memory for the layer image
+    :param tuple shape: (height,width) of the layer image
+    :param Connection conn: pipe to the Animator
+    :return None:
+    """
+    h,w=shape
+    layer=np.frombuffer(shared,dtype=np.uint8).reshape((h,w,4))
+
+    while True:
+        msg=conn.recv()
+        if msg is None: break       # closed by the Animator
+
+        # the clock is a copy of the Animator's so it needs the frame time
+        debug,frameTime=msg
+        animInfo.clock.setFrameTime(frameTime)
+
+        try:
+            t0=time.time()
+            animInfo.nextFrame(debug)
+            stepTime=time.time()-t0
+            img=animInfo.getLayer()
+            if img is not None:
+                np.copyto(layer,img)
+            conn.send(("ok",(img is not None,stepTime,animInfo.layerAnim.__class__.__name__,animInfo.dirtyRect)))
+        except Exception:
+            conn.send(("error",traceback.format_exc()))
+            break
+
+    conn.close()
+
+
+class LayerProcess(object):
+    """
+    A layer stepped in its own process. The layer image is returned via shared memory
+    so only a short status message is sent through the pipe on each frame.
+    """
+
+    def __init__(self,animInfo):
+        h,w=Panel.height,Panel.width
+
+        self.drawn=False
+        self.stepTime=0.0       # seconds the layer process took to step the last frame
+        self.animName=None      # class name of the animation stepped on the last frame
+        self.dirtyRect=None     # part of the layer changed by the last frame
+
+        self.id=animInfo.id
+        self.clock=animInfo.clock
+        self.shared=multiprocessing.RawArray(ctypes.c_uint8,h*w*4)
+        self.layer=np.frombuffer(self.shared,dtype=np.uint8).reshape((h,w,4))
+
+        self.conn,child=multiprocessing.Pipe()
+        self.process=multiprocessing.Process(target=_layerWorker,args=(animInfo,self.shared,(h,w),child))
+        self.process.daemon=True    # dies with the Animator
+        self.process.start()
+
+    def send(self,debug):
+        """
+        ask the layer process to render the next frame at the current frame time
+        :param bool debug: passed to AnimInfo.nextFrame()
+        :return None:
+        """
+        self.conn.send((debug,self.clock.time()))
+
+    def receive(self):
+        """
+        wait for the layer process to finish the frame requested by send()
+
+        :return None:
+        :raises LayerProcessFailed: if the animation raised an exception
+        """
+        status,value=self.conn.recv()
+        if status=="error":
+            raise LayerProcessFailed("Layer "+str(self.id)+" failed:\n"+value)
+        self.drawn,self.stepTime,self.animName,self.dirtyRect=value
+
+    def getLayer(self):
+        """
+        :return numpy ndarray: the shared layer image or None if the layer drew nothing
+        """
+        return self.layer if self.drawn else None
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except (IOError,EOFError):
+            pass    # process has already gone
+
+        self.process.join(1.0)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+class LayerRenderer(object):
+    """
+    Steps all the Animator layers once per frame using the chosen executors then
+    returns the layer images, in layer order, for merging with the Panel.
+    """
+
+    executor=SERIAL     # default executor for layers which don't specify one
+    workers=None        # thread pool size, default is the number of CPUs
+    frameInterval=None  # used for debug timing messages
+    telemetry=None      # Telemetry, if set the step time of each layer is recorded
+    debug=False
+
+    def __init__(self,animations,**kwargs):
+
+        for key,value in kwargs.iteritems():
+            setattr(self,key,value)
+
+        self.animations=animations
+        self.modes=[self._layerMode(animInfo) for animInfo in animations]
+
+        self.pool=None
+        self.processes={}   # layer index -> LayerProcess
+
+        # dirty rectangle of each layer since takeDirtyRects() was last called
+        self.dirty=[None]*len(animations)
+
+        if PROCESS in self.modes:
+            # a prefetch in progress would be forked holding an Image lock
+            waitForPrefetcher()
+
+        for n,mode in enumerate(self.modes):
+            if mode==PROCESS:
+                self.processes[n]=LayerProcess(animations[n])
+
+        # (layer index,AnimInfo) pairs
+        self.threaded=[(n,a) for n,(a,mode) in enumerate(zip(animations,self.modes)) if mode==THREAD]
+        self.serial=[(n,a) for n,(a,mode) in enumerate(zip(animations,self.modes)) if mode==SERIAL]
+
+        if len(self.threaded)>0:
+            workers=self.workers if self.workers is not None else multiprocessing.cpu_count()
+            self.pool=ThreadPool(min(workers,len(self.threaded)))
+
+    def _layerMode(self,animInfo):
+        """
+        works out which executor a layer should use
+
+        :param AnimInfo animInfo: the layer
+        :return str: SERIAL, THREAD or PROCESS
+        :raises InvalidMode: if the executor name is not recognised
+        """
+        mode=animInfo.executor if animInfo.executor is not None else self.executor
+
+        if mode not in EXECUTORS:
+            raise InvalidMode("LayerRenderer executor must be one of "+",".join(EXECUTORS)+" got "+str(mode))
+
+        if mode==PROCESS and not hasattr(os,"fork"):
+            print "LayerRenderer: process executor needs fork(). Using a thread for layer",animInfo.id
+            return THREAD
+
+        return mode
+
+    def _recordStep(self,n,animName,stepTime):
+        """
+        records the time taken to step a layer, against the layer and the animation class
+
+        :param int n: layer index
+        :param str animName: class name of the animation which was stepped
+        :param float stepTime: seconds
+        :return None:
+        """
+        if self.telemetry is not None:
+            self.telemetry.record("layer%d.step" % n,stepTime)
+            self.telemetry.record("anim."+animName+".step",stepTime)
+
+        if self.debug and stepTime>self.frameInterval:
+            print "Animator.run() anim.nextFrame() took","%.6f" % (stepTime,) ,"for ",\
+                animName,"frameInterval is",self.frameInterval
+
+    def _renderLayer(self,layer):
+        """
+        steps one layer on the calling thread
+
+        :param tuple layer: (layer index,AnimInfo)
+        :return None:
+        """
+        n,animInfo=layer
+
+        if self.telemetry is None and not self.debug:
+            animInfo.nextFrame(self.debug)
+        else:
+            t2=time.time()
+            animInfo.nextFrame(self.debug)
+            t3=time.time()
+            self._recordStep(n,animInfo.layerAnim.__class__.__name__,t3-t2)
+
+        self.dirty[n]=unionRect(self.dirty[n],animInfo.dirtyRect)
+
+    def render(self):
+        """
+        steps every layer once. Process layers are started first, then threaded layers, so
+        that they run whilst the serial layers are stepped on this thread.
+
+        :return None: returns when all layers have finished
+        """
+        for proc in self.processes.itervalues():
+            proc.send(self.debug)
+
+        pending=None
+        if self.pool is not None:
+            pending=self.pool.map_async(self._renderLayer,self.threaded)
+
+        for layer in self.serial:
+            self._renderLayer(layer)
+
+        if pending is not None:
+            pending.get()   # re-raises any exception from the layer
+
+        for n,proc in self.processes.iteritems():
+            proc.receive()
+            self._recordStep(n,proc.animName,proc.stepTime)
+            self.dirty[n]=unionRect(self.dirty[n],proc.dirtyRect)
+
+    def getLayers(self,direct=False):
+        """
+        :param bool direct: True returns layers which are just one image as ImageLayers, for the Compositor
+        :return list: layer images in layer (bottom to top) order. None if a layer drew nothing.
+        """
+        layers=[]
+        for n,animInfo in enumerate(self.animations):
+            if n in self.processes:
+                layers.append(self.processes[n].getLayer())
+            else:
+                layers.append(animInfo.getLayer(direct))
+        return layers
+
+    def takeDirtyRects(self):
+        """
+        returns the part of each layer which changed since the last call. Frames stepped
+        without being composed (see the Animator catchup overrun policy) are included.
+
+        :return list: (x0,y0,x1,y1) or None for each layer, in layer order
+        """
+        rects=self.dirty
+        self.dirty=[None]*len(self.animations)
+        return rects
+
+    def close(self):
+        """
+        shuts down the thread pool and layer processes
+        :return None:
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool=None
+
+        for proc in self.processes.itervalues():
+            proc.close()
+        self.processes={}
@@ -16,6 +16,9 @@
 # Also, when adjusting the brightness etc of the image rgba_cached is used as the source. This means we can always
 # get back to the original image (Undo brightness or alpha changes)
 #
+# If PREMULTIPLIED is set in Constants.py rgba_orig, rgba_cached and out hold premultiplied alpha.
+# Colours passed to the fill/draw/setPixel functions are straight alpha and are converted as they are
+# written, getPixel() converts back.
 #
 import math
 from scipy import ndimage
@@ -24,6 +27,7 @@ import ImageCache
 from LEDAnimator.UtilLib import *
 import cv2
 import random
+import functools
 
 # required to support PIL image formats for hzeller drivers
 # TODO - find out how to do this with numpy alone
@@ -40,6 +44,20 @@ except:
 
 # numpy images allow for fast(ish) image manipulation
 
+def changesImage(method):
+    """
+    decorates the NumpyImage methods which write to the image. Each call moves the image on to a
+    new version so that the cached alpha coverage (see getCoverage()) is worked out again.
+    """
+    @functools.wraps(method)
+    def wrapper(self,*args,**kwargs):
+        try:
+            return method(self,*args,**kwargs)
+        finally:
+            self.version+=1
+    return wrapper
+
+
 class NumpyImage():
     """
     Class to encapsulate image handling.
@@ -56,10 +74,8 @@ class NumpyImage():
 
     NumpyImage, as it's name implies, uses numpy images as the core format.
 
-    The colour channel order is determined by the RGB_R setting in Constants.py. This allows the code to use either RGB or BGR images.
-    The LED RGB Matrix simulator uses openCV imshow to display the simulated matrix.imshow uses BGR pixel ordering but the real matrix uses RGB.
-
-    For testing on a PC RGB_R is set to 2 - meaning it is the third colour in the Pixel tuple (b,g,r)
+    Images are always RGBA (see RGB_R etc. in Constants.py). Loaded images are converted from openCV's BGR
+    order by the ImageCache and the output backend converts the frame to whatever order the display uses.
 
 
     """
@@ -77,11 +93,84 @@ class NumpyImage():
     debug=False
     alpha=255           # used when NumbyImage is created from dimensions
     fillColor=None      # (r,g,b,a)
+    version=0           # incremented whenever the image is written to
+    coverage=None       # (version,out,alpha coverage) cached by getCoverage()
 
 
     def getImageData(self):
         return self.out
 
+    def changed(self):
+        """
+        call after writing to getImageData() directly so that the cached alpha coverage is not used again
+        :return None:
+        """
+        self.version+=1
+
+    def getCoverage(self):
+        """
+        returns the alpha coverage of self.out, as UtilLib.alphaCoverage() does, but only looks at the
+        image again if it has been changed since the last time
+
+        :return int: OPAQUE_COVERAGE, TRANSPARENT_COVERAGE or MIXED_COVERAGE (see Constants.py)
+        """
+        cached=self.coverage
+        if cached is not None and cached[0]==self.version and cached[1] is self.out:
+            return cached[2]
+
+        version,out=self.version,self.out
+        coverage=alphaCoverage(out)
+        self.coverage=(version,out,coverage)
+        return coverage
+
+    def _pixelColor(self,color):
+        """
+        :param tuple color: straight alpha (r,g,b,a) in Pixel order
+        :return tuple: the colour as it is stored in out (premultiplied if PREMULTIPLIED)
+        """
+        if PREMULTIPLIED and color is not None: return premultiplyColor(color)
+        return color
+
+    def _straight(self,img):
+        """
+        :param numpy ndarray img: out, rgba_cached or a window of them
+        :return numpy ndarray: img with straight alpha (a copy if it had to be converted)
+        """
+        if PREMULTIPLIED: return unpremultiply(img.copy())
+        return img
+
+    def _setColors(self,rgb):
+        """
+        writes straight alpha colours to the colour channels of out, keeping its alpha channel
+
+        :param numpy ndarray rgb: (h,w,3 or more) colours
+        :return None: self.out is modified
+        """
+        self.out[:,:,:3]=rgb[:,:,:3]
+        if PREMULTIPLIED: premultiply(self.out)
+
+    def _setAlpha(self,alpha,X0=None,Y0=None,X1=None,Y1=None):
+        """
+        sets the alpha of a window of out, all of it by default.
+
+        If PREMULTIPLIED the colours are rebuilt from rgba_cached (if it is the same size as out)
+        because a pixel which has been made transparent has lost its colour.
+
+        :param int alpha: 0-255
+        :return None: self.out is modified
+        """
+        window=(slice(Y0,Y1),slice(X0,X1))
+
+        if not PREMULTIPLIED:
+            self.out[window+(ALPHA,)]=alpha
+            return
+
+        src=self.rgba_cached if self.rgba_cached.shape==self.out.shape else self.out
+        straight=unpremultiply(src[window].copy())
+        straight[...,ALPHA]=alpha
+        self.out[window]=premultiply(straight)
+
+    @changesImage
     def resetImage(self):
         """
         used to undo ALL image editing changes to the final (out) image.
@@ -119,6 +208,7 @@ class NumpyImage():
                                                   "ndarray)."
             self.rgba_orig=self.image.copy()
             self.rgba_orig[...,ALPHA]=self.alpha    # set by caller
+            if PREMULTIPLIED: premultiply(self.rgba_orig)
 
         else:
             assert self.height>0 and self.width>0,"NumpyImage.__init__() no imagePath and width/height is zero."
@@ -136,6 +226,10 @@ class NumpyImage():
             alpha = np.full([h, w, 1], 255, dtype=np.uint8)  # opaquee
             self.rgba_orig = np.concatenate((self.rgba_orig, alpha), axis=2)
 
+        if PREMULTIPLIED and self.imagePath is not None:
+            # the ImageCache keeps the straight image, it may be shared
+            self.rgba_orig=premultiply(self.rgba_orig.copy())
+
         self.rgba_cached=self.rgba_orig.copy()
         self.resetImage()
 
@@ -203,6 +297,7 @@ class NumpyImage():
         """
         return self.rgba_orig.copy()
 
+    @changesImage
     def fill(self,color=None):
         """
         Fill the entire final image with a given pixel color.
@@ -214,19 +309,21 @@ class NumpyImage():
 
         if color is None:
             # just make it transparent
-            self.out[...,ALPHA]=0
+            self._setAlpha(0)
         else:
             assert len(color) == 4, "Fill colour must have 4 channels got " + str(color)
-            self.out[:,:]=[color]
+            self.out[:,:]=[self._pixelColor(color)]
 
+    @changesImage
     def fillAlpha(self,alpha=255):
         """
         Fill the alpha channel for the entire image with a given value- defaults to opaque
         :param alpha : 0-255 alpha value, default 255
         :return: nothing, self.out is moddified
         """
-        self.out[...,ALPHA]=alpha
+        self._setAlpha(alpha)
 
+    @changesImage
     def clearWindow(self,window):
         """
         Fill the window with the default color see filLWindow()
@@ -236,6 +333,7 @@ class NumpyImage():
         """
         self.fillWindow(window)
 
+    @changesImage
     def fillWindow(self,window,color=None):
         """
         fills a window of this image with the given color
@@ -250,12 +348,13 @@ class NumpyImage():
         X0, Y0, X1, Y1 = self.getViewport(window)
         if color is None:
             # just make the window transparent
-            self.out[Y0:Y1,X0:X1,ALPHA]=0
+            self._setAlpha(0,X0,Y0,X1,Y1)
         else:
             print "NumpyImage.filLWindow color=",color
             assert len(color) == 4, "Fill colour must have 4 channels got " + str(color)
-            self.out[Y0:Y1, X0:X1] = [color]
+            self.out[Y0:Y1, X0:X1] = [self._pixelColor(color)]
 
+    @changesImage
     def fillWindowAlpha(self,window,alpha=255):
         """
         Fill a region with the given alpha value.
@@ -266,16 +365,18 @@ class NumpyImage():
         :return: nothing self.out region has alpha set accordingly
         """
         X0, Y0, X1, Y1 = self.getViewport(window)
-        self.out[Y0:Y1, X0:X1,ALPHA ] = alpha
+        self._setAlpha(alpha,X0,Y0,X1,Y1)
 
     # TODO needs testing
-    def fillWindowRandomPalette(self,window,palette):
+    @changesImage
+    def fillWindowRandomPalette(self,window,palette,rng=random):
         """
         fills the specified window with colors chosen at random from
         the supplied palette.
 
         :param tuple window: (x,y,w,h)
         :param list palette: python list of color objects
+        :param random.Random rng: random number generator, default is the random module
         :return: nothing, the specified area is colored
         """
 
@@ -284,22 +385,26 @@ class NumpyImage():
 
         for x in range(X1-X0):
             for y in range (Y1-Y0):
-                pixel=palette[random.randint[0,palLen]].getPixelColor()
-                self.out[y,x]=[pixel]
+                pixel=palette[rng.randint(0,palLen-1)].getPixelColor()
+                self.out[y,x]=[self._pixelColor(pixel)]
 
-    def fillWindowRandom(self,window,alpha=255):
+    @changesImage
+    def fillWindowRandom(self,window,alpha=255,rng=np.random):
         """
         fills a window with one random color
 
         :param tuple window: (x,y,w,h)
         :param int alpha: 0 (transp[arent) to 255 (opaque)
+        :param RandomState rng: numpy random number generator, default is np.random
         :return: the window area is filled.
         """
         x,y,w,h=window
-        tmp=np.random.randint(0,256,(h,w,3))
+        tmp=rng.randint(0,256,(h,w,3))
         self.out[y:y + h, x:x + w, :3 ] = tmp # np.random.randint(0, 256, (h, w, 3))
         self.out[y:y + h, x:x + w, ALPHA]=alpha
+        if PREMULTIPLIED: premultiply(self.out[y:y + h, x:x + w])
 
+    @changesImage
     def clear(self):
         """
         alternate for fill() with no color specified which should result
@@ -324,6 +429,7 @@ class NumpyImage():
     #
     #############################################################
 
+    @changesImage
     def resizeByFactor(self,factor):
         """
         Scales the rgba_orig image to rgba_cached and copies rgba_cached to the output image.
@@ -360,6 +466,7 @@ class NumpyImage():
 
         self.resetImage()
 
+    @changesImage
     def resizeKeepAspect(self,boundaryWidth,boundaryHeight):
         """
         Resizes an image so that it fits within a given boundary.
@@ -398,6 +505,7 @@ class NumpyImage():
 
         self.resetImage()
 
+    @changesImage
     def resizeFitToTarget(self,targetWidth,targetHeight):
         """
         image is stretched to fit the targetWidth snd targetHeight area
@@ -417,6 +525,7 @@ class NumpyImage():
 
         self.resetImage()
 
+    @changesImage
     def setWindow(self,window):
         """
         copies the specified window from rgba_cached to out
@@ -455,8 +564,10 @@ class NumpyImage():
         :return tuple: color (rgba) in Pixel order
         """
         a,b,c,d= self.out[y,x]
+        if PREMULTIPLIED: return unpremultiplyColor((a,b,c,d))
         return (a,b,c,d)
 
+    @changesImage
     def setPixelAlpha(self,x,y,alpha=255):
         """
 
@@ -472,8 +583,9 @@ class NumpyImage():
         if x<0 or x>=self.width: return
         if y<0 or y>=self.height: return
 
-        self.out[y,x,ALPHA]=alpha
+        self._setAlpha(alpha,x,y,x+1,y+1)
 
+    @changesImage
     def setPixel(self, x, y, color):
         """
         sets the image pixel(s) using the color(s) provided.
@@ -494,7 +606,7 @@ class NumpyImage():
             # but x,y,color and self.out[y,x] are all integers (as observed by printing the type()
             # of each variable involved. Hence this try/except workaroundi
             try:
-                self.out[y, x] = alphaBlendPixels(color, self.out[y, x])
+                self.out[y, x] = alphaBlendPixels(self._pixelColor(color), self.out[y, x])
                 return
             except ValueError:
                 return
@@ -507,13 +619,52 @@ class NumpyImage():
             assert type(x) is list and type(y) is list, "If color is a list then x and y must also be lists. Got x="+str(type(x))+" y="+str(type(y))
             assert len(x) == len(y) == len(color), "Lists must be of the same length."
 
+        # chain coordinates are usually whole numbers already
         f=np.vectorize(nearest)
-        x=f(x)
-        y=f(y)
+        if type(x) is not np.ndarray or x.dtype.kind not in "iu": x=f(x)
+        if type(y) is not np.ndarray or y.dtype.kind not in "iu": y=f(y)
+
+        if type(color) is np.ndarray and color.ndim==2 and self.out.flags.c_contiguous:
+            # the chains are drawn this way every frame
+            self._blendPixels(x,y,color)
+            return
+
+        if PREMULTIPLIED: color=premultiply(np.array(color,dtype=np.uint8))
 
         self.out[y, x] =alphaBlendPixel(color,self.out[y,x])
 
-    def setPixelRandom(self, x, y):
+    def _blendPixels(self,x,y,color):
+        """
+        setPixel() for an array of colours. Does the same as alphaBlendPixel() but in scratch arrays
+        so nothing is allocated.
+
+        :param numpy ndarray x: int x-coords
+        :param numpy ndarray y: int y-coords
+        :param numpy ndarray color: (n,4) colours, converted to uint8 like np.asarray(color,dtype=np.uint8)
+        :return None: the pixels are blended into out
+        """
+        pool=getScratch()
+        n=color.shape[0]
+
+        fg=pool.get("pixelColors",(n,4),np.uint8)
+        np.copyto(fg,color,casting="unsafe")
+        if PREMULTIPLIED: premultiply(fg)
+
+        # gather the pixels underneath, y%height and x%width wrap negative coords the way out[y,x]
+        # does. Coords out of range are clipped here but the out[y,x] write below raises IndexError
+        h,w=self.out.shape[:2]
+        index=pool.get("pixelIndex",(n,),np.intp)
+        column=pool.get("pixelColumn",(n,),np.intp)
+        np.remainder(y,h,out=index)
+        np.multiply(index,w,out=index)
+        np.remainder(x,w,out=column)
+        np.add(index,column,out=index)
+        bg=np.take(self.out.reshape(-1,4),index,axis=0,out=pool.get("pixelUnder",(n,4),np.uint8),mode="clip")
+
+        self.out[y, x]=alphaBlendInto(fg,bg)
+
+    @changesImage
+    def setPixelRandom(self, x, y, rng=np.random):
         """
         sets the pixel(s) using randomised color channels and alpha.
 
@@ -521,6 +672,7 @@ class NumpyImage():
 
         :param int or numpy ndarray x:   int [ x0,x1,...xn] or x
         :param int or numpy ndarray y:   int [y0,y1,..yn] or y
+        :param RandomState rng: numpy random number generator, default is np.random
         :return Nothing: pixel at x,y is/are set to random color(s)
         """
         if type(x) is list:
@@ -533,13 +685,14 @@ class NumpyImage():
         f=np.vectorize(nearest)
         x=f(x)
         y=f(y)
-        self.out[y, x] = [np.random.random_integers(0, 255), np.random.random_integers(0, 255),
-                          np.random.random_integers(0, 255), np.random.random_integers(0, 255)]
+        self.out[y, x] = [self._pixelColor((rng.randint(0, 256), rng.randint(0, 256),
+                                            rng.randint(0, 256), rng.randint(0, 256)))]
 
     ######################################################################
     #
     # Adjuster functions
 
+    @changesImage
     def adjustHue(self,amount=0):
         """
         adds amount to rgba_cached image
@@ -549,11 +702,12 @@ class NumpyImage():
         """
         assert type(amount) is int, self.classname+".adjustHue() Amount should be an int."
         if amount==0: return
-        tmp=cv2.cvtColor(self.rgba_cached,PIXEL2HSV)   # CONVERT2HLS - see Constants.py to HLS
+        tmp=cv2.cvtColor(self._straight(self.rgba_cached),PIXEL2HSV)   # CONVERT2HLS - see Constants.py to HLS
         tmp[:,:,HSV_H]=(tmp[:,:,HSV_H] + amount ) % 180
         tmp2=cv2.cvtColor(tmp,HLS2PIXEL)      # back to RGB (or BGR - see Constants.py
-        self.out[:,:,:3]=tmp2
+        self._setColors(tmp2)
 
+    @changesImage
     def adjustSat(self,amount=0):
         """
         adjust saturation
@@ -564,15 +718,16 @@ class NumpyImage():
         assert amount >= -255 and amount <= 255,  self.classname+".adjustSat() amount should be between -255 and +255"
         if amount == 0: return
 
-        tmp = cv2.cvtColor(self.out, PIXEL2HSV)  # see Constants.py
+        tmp = cv2.cvtColor(self._straight(self.out), PIXEL2HSV)  # see Constants.py
         if amount<0:
             tmp[:, :, HSV_S] = np.maximum(tmp[:, :, HSV_S] + amount, 0)
         elif amount>0:
             tmp[:, :, HSV_S] = np.minimum(tmp[:, :, HSV_S] + amount,255)
 
         tmp = cv2.cvtColor(tmp, HSV2PIXEL)  # see Constants.py
-        self.out[:, :, :3] = tmp[:, :, :3]
+        self._setColors(tmp)
 
+    @changesImage
     def adjustLum(self,amount=0):
         """
         adjust luminance adds amount to current luminance and caps the min/max values at 0 and 255 respectively
@@ -584,18 +739,19 @@ class NumpyImage():
 
         if amount==0: return
 
-        tmp = cv2.cvtColor(self.out, PIXEL2HSV)  # see Constants.py
+        tmp = cv2.cvtColor(self._straight(self.out), PIXEL2HSV)  # see Constants.py
         if amount<0:
             tmp[:, :, HSV_V] = np.maximum(tmp[:, :, HSV_V] + amount, 0)
         elif amount>0:
             tmp[:, :, HSV_V] = np.minimum(tmp[:, :, HSV_V] + amount, 255)
         tmp = cv2.cvtColor(tmp, HSV2PIXEL)  # see Constants.py
-        self.out[:, :, :3] = tmp[:, :, :3]
+        self._setColors(tmp)
     ##########################################################################
     #
     # setter functions - simply set H,S or L to a value
 
     #TODO test setHue
+    @changesImage
     def setHue(self,amount):
         """
         sets the Hue of the out image to a given amount.
@@ -607,11 +763,12 @@ class NumpyImage():
         assert type(amount) is int,  self.classname+".setHue() amount should be an int."
         assert amount >=0 and amount <= 180,  self.classname+".setHue() amount should be between 0 and 360"
 
-        tmp = cv2.cvtColor(self.out, PIXEL2HSV)  # see Constants.py
+        tmp = cv2.cvtColor(self._straight(self.out), PIXEL2HSV)  # see Constants.py
         tmp[:, :, HSV_H] = np.minimum(amount, 180)
         tmp = cv2.cvtColor(tmp, HSV2PIXEL)  # see Constants.py
-        self.out[:, :, :3] = tmp[:, :, :3]
+        self._setColors(tmp)
 
+    @changesImage
     def setSat(self, amount):
         """
         changes the saturation of the self.out image
@@ -624,11 +781,12 @@ class NumpyImage():
         assert type(amount) is int,  self.classname+".setSat() amount should be an int."
         assert amount >=0 and amount <= 255,  self.classname+".setSat() amount should be between 0 and 255"
 
-        tmp = cv2.cvtColor(self.out, PIXEL2HSV)  # see Constants.py
+        tmp = cv2.cvtColor(self._straight(self.out), PIXEL2HSV)  # see Constants.py
         tmp[:, :, HSV_S] = amount
         tmp = cv2.cvtColor(tmp, HSV2PIXEL)  # see Constants.py
-        self.out[:, :, :3] = tmp[:, :, :3]
+        self._setColors(tmp)
 
+    @changesImage
     def setValue(self,amount):
         """
         set V component of self.out when converted to HSV.
@@ -644,11 +802,12 @@ class NumpyImage():
 
         # openCV uses numer ranges 0-255
         # see Constants.py for PIXEL2HSV and HSV2PIXEL
-        tmp = cv2.cvtColor(self.out, PIXEL2HSV)
+        tmp = cv2.cvtColor(self._straight(self.out), PIXEL2HSV)
         tmp[:, :, HSV_V] = np.minimum(amount, 255)
         tmp = cv2.cvtColor(tmp, HSV2PIXEL)
-        self.out[:, :, :3] = tmp[:, :, :3]
+        self._setColors(tmp)
 
+    @changesImage
     def OFF_setBrightness(self,wanted):
         """
         Changes the overall brightness of the image
@@ -664,6 +823,7 @@ class NumpyImage():
         return self.fade(wanted)
 
 
+    @changesImage
     def fade(self,percent):
         """
         Changes the overall alpha of the self.out image.
@@ -680,9 +840,15 @@ class NumpyImage():
         # this makes the transition appear correct
         factor=getActualBrightness(percent)
 
+        if PREMULTIPLIED and self.rgba_cached.shape==self.out.shape:
+            # scale every channel, transparent parts of the image stay transparent
+            self.out=scaleOpacity(self.rgba_cached,int(factor*255))
+            return
+
         # alter the alpha
-        self.out[...,ALPHA]=int(factor*255)
+        self._setAlpha(int(factor*255))
 
+    @changesImage
     def OFFfade(self,percent):
         """
         Changes the overall brightness and alpha of the self.out image.
@@ -721,6 +887,7 @@ class NumpyImage():
     #
     ######################################################
 
+    @changesImage
     def blur(self,sigma=0):
         """
         blurs the rgba cached image and copies to self.out
@@ -734,9 +901,11 @@ class NumpyImage():
         if sigma==0:
             self.out=self.rgba_cached.copy()
         else:
-            self.out=ndimage.gaussian_filter(self.rgba_cached,sigma=sigma)
+            # blur across the image but not across the channels
+            self.out=ndimage.gaussian_filter(self.rgba_cached,sigma=(sigma,sigma,0))
 
     # TODO test blend
+    @changesImage
     def blend(self,blendWith,alpha=0):
         """
         blend mixes two images with a certain alpha
@@ -749,6 +918,7 @@ class NumpyImage():
         """
         self.out=alpha*self.out+(1-alpha)*blendWith
 
+    @changesImage
     def rotateAboutCenter(self, angle):
         """
         performs an affine transform rotating the image about it's center
@@ -761,6 +931,7 @@ class NumpyImage():
         # just call the base routine
         self.rotateAboutCenterRadians(math.radians(angle))
 
+    @changesImage
     def rotateAboutCenterRadians(self, angle):
         """
         Performs an affine transform rotating the self.out image about it's center
@@ -780,6 +951,7 @@ class NumpyImage():
         X=x-x*cosa+y*sina
         self.transform((cosa, -sina, X, sina, cosa, Y))
 
+    @changesImage
     def rotate(self,x,y,angle):
         """
         rotate the shape about the x,y coordinates.
@@ -799,6 +971,7 @@ class NumpyImage():
         X=x-x*cosa+y*sina
         self.transform((cosa, -sina, X,sina,cosa, Y))
 
+    @changesImage
     def rotateRadians(self,x,y,angle):
         """
         rotate the shape about the x,y coordinates.
@@ -817,6 +990,7 @@ class NumpyImage():
         X=x-x*cosa+y*sina
         self.transform((cosa, -sina, X,sina,cosa, Y))
 
+    @changesImage
     def shear(self,angle):
         """
         shear the image with the given angle
@@ -828,6 +1002,7 @@ class NumpyImage():
         a=math.radians(angle)
         self.transform(1,-math.tan(a),0,0,1,0)
 
+    @changesImage
     def transform(self,matrix=None):
         """
         transform self.rgba to create new rgba_cached and out images
@@ -864,6 +1039,7 @@ class NumpyImage():
     #
     # Roll left/right/up/down
     #
+    @changesImage
     def roll(self,direction="right",distance=0):
         """
         shifts the output matrix in required direction
@@ -889,6 +1065,7 @@ class NumpyImage():
 
         self.out=np.roll(self.out,distance,axis=axis)
 
+    @changesImage
     def copyWindow(self,window):
         """
         copies the windowed area from rgba_cached to out
@@ -924,6 +1101,7 @@ class NumpyImage():
 
         return X0,Y0,X1,Y1
 
+    @changesImage
     def rollWindow(self,window,direction="right",distance=0):
         """
         Rolls a sub-section of this image defined by (x,y,w,h)
@@ -961,6 +1139,7 @@ class NumpyImage():
 
         self.out[y0:y1, x0:x1] = np.roll(self.out[y0:y1,x0:x1], distance, axis=axis)
 
+    @changesImage
     def cvCircle(self,center,radius,color,thickness=cv2.FILLED,lineType=cv2.LINE_AA):
         """
         draws a circle (unfilled). Line is solid (no alpha)
@@ -971,8 +1150,9 @@ class NumpyImage():
         :param lineType: see openCV docs for line type. default LINE_AA (anti-aliased)
         :return:
         """
-        self.out = cv2.circle(self.out, center, radius, color, thickness, lineType)
+        self.out = cv2.circle(self.out, center, radius, self._pixelColor(color), thickness, lineType)
 
+    @changesImage
     def cvLine(self,startPt,endPt,color,thickness=1,lineType=cv2.LINE_AA):
         """
         draws a line between two points using the specified color which must include the transparency.
@@ -984,8 +1164,9 @@ class NumpyImage():
         :param lineType: int default LINE_AA (anti-aliased) see openCV docs for line types
         :return: self.out has the required line added
         """
-        self.out=cv2.line(self.out,startPt,endPt,color,thickness,lineType)
+        self.out=cv2.line(self.out,startPt,endPt,self._pixelColor(color),thickness,lineType)
 
+    @changesImage
     def cvRectangle(self,pt1,pt2,color,thickness=cv2.FILLED,lineType=cv2.LINE_AA):
         """
         draw a rectangle using openCV rectangle method.
@@ -996,8 +1177,9 @@ class NumpyImage():
         :param lineType: int default LINE_AA (anti-aliased) see openCV docs for line types
         :return: self.out has the shape drawn on it
         """
-        self.out=cv2.rectangle(self.out,pt1,pt2,color,thickness,lineType)
+        self.out=cv2.rectangle(self.out,pt1,pt2,self._pixelColor(color),thickness,lineType)
 
+    @changesImage
     def cvPolyLines(self, pts, color, isClosed=False,thickness=1, lineType=cv2.LINE_AA):
         """
         draw a sequence of connected lines
@@ -1011,8 +1193,9 @@ class NumpyImage():
         """
         pts=np.array(pts,np.int32)
         pts=pts.reshape((-1,1,2))
-        self.out = cv2.polylines(self.out,[pts],isClosed, color, thickness, lineType)
+        self.out = cv2.polylines(self.out,[pts],isClosed, self._pixelColor(color), thickness, lineType)
 
+    @changesImage
     def cvFilledPoly(self,pts,color,lineType=cv2.LINE_AA):
         """
         creates a closed and filled shape from the list of pts given.
@@ -1022,8 +1205,9 @@ class NumpyImage():
         :return: the shape is drawn
         """
         pts=np.array(pts,dtype=np.int32)
-        self.out=cv2.fillPoly(self.out,[pts],color,lineType)
+        self.out=cv2.fillPoly(self.out,[pts],self._pixelColor(color),lineType)
 
+    @changesImage
     def cvEllipse(self,center,axes,angle=0,startAngle=0,endAngle=360,color=(255,255,255,255),thickness=cv2.FILLED,
                   lineType=cv2.LINE_AA):
         """
@@ -1040,7 +1224,7 @@ class NumpyImage():
         :param lineType: see openCV line types - default is LINE_AA (anti-aliased)
         :return: self.out has an ellipse drawn on it
         """
-        self.out=cv2.ellipse(self.out,center,axes,angle,startAngle,endAngle,color,thickness,lineType)
+        self.out=cv2.ellipse(self.out,center,axes,angle,startAngle,endAngle,self._pixelColor(color),thickness,lineType)
 
 
 
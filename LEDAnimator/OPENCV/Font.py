@@ -162,7 +162,6 @@ class Font():
                 (mw, h),b = cv2.getTextSize(subStr,self.fontFace, self.fontScale, self.thickness)
                 (cw, h), b = cv2.getTextSize(message[i], self.fontFace, self.fontScale, self.thickness)
                 color = fgColor.getNextEntry().getPixelColor()
-                color = channelSwap(color)
                 cv2.putText( img,message[i],(x + mw - cw, y),  font, self.fontScale, color,self.thickness,lineType,
                              False)
 
@@ -170,11 +169,9 @@ class Font():
             #for ch in message:
             #    (w, h), b = cv2.getTextSize(ch, self.fontFace, self.fontScale, self.thickness)
             #    color=fgColor.getNextEntry().getPixelColor(alpha=1.0)
-            #    color=channelSwap(color)
             #    cv2.putText(img, ch,(Xpos,y), font, self.fontScale, color,self.thickness,lineType,False)
             #    Xpos+=w
         else:
             # text is all one colour
-            color = channelSwap(fgColor)
-            cv2.putText(img, message,(x,y), font, self.fontScale, color, self.thickness, self.lineType,False)
+            cv2.putText(img, message,(x,y), font, self.fontScale, fgColor, self.thickness, self.lineType,False)
 
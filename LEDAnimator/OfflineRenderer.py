@@ -0,0 +1,168 @@
+"""
+OfflineRenderer.py
+
+Renders an Animator's layers faster than real time, without a display.
+
+The Animator is driven by a VirtualClock which is moved on exactly 1/fps between frames, so the
+animations see the same times they would have seen when played in real time but nothing waits
+for the wall clock. A 10 minute show can be rendered in seconds and checked frame by frame.
+
+The frames can be returned as a numpy array, written as an image sequence or written to a video
+file:-
+
+    A=Animator(fps=FPS)
+    A.addAnimation(seq=IMAGE_SEQ)
+
+    R=OfflineRenderer(animator=A)
+    frames=R.render(duration=10)                             # numpy array (n,height,width,4)
+    R.render(duration=600,output="frames/frame%05d.png")    # image sequence
+    R.render(duration=600,output="show.avi")                # video file
+
+Panel.init() must have been called because the frames are composed in the Panel frameBuffer.
+Panel.UpdateDisplay() is not called so nothing is sent to the matrix or simulator.
+
+The Animator must not be running. Its clock is restored when rendering finishes.
+
+"""
+
+import os
+import time
+import numpy as np
+import cv2
+import Panel
+from Clock import VirtualClock
+from ExceptionErrors import *
+
+VIDEO_EXTENSIONS=(".avi",".mp4",".mov",".mkv")
+
+
+class OfflineRenderer(object):
+
+    animator=None       # the Animator to render, passed in
+    fps=None            # default is the Animator fps
+    fourcc="MJPG"       # video codec, see cv2.VideoWriter_fourcc()
+    reset=True          # if True each render() starts the animations from the beginning otherwise
+                        # it carries on from the end of the previous render()
+    debug=False
+
+    def __init__(self,**kwargs):
+
+        for key,value in kwargs.iteritems():
+            setattr(self,key,value)
+
+        assert self.animator is not None,"OfflineRenderer() animator not set."
+
+        if self.fps is None: self.fps=self.animator.fps
+        assert self.fps is not None,"OfflineRenderer() fps not set."
+
+        self.frameInterval=1.0/self.fps
+        self.clock=VirtualClock()
+
+        # set by render()
+        self.frameNumber=0      # number of the next frame, frame n is rendered at time n/fps
+        self.framesRendered=0
+        self.renderTime=0.0     # wall clock seconds taken by the last render()
+
+    def _openWriter(self,output):
+        """
+        works out how frames are to be saved
+
+        :param str output: None, an image file pattern containing %d or a video filename
+        :return function: writer(n,frame) or None for a numpy array
+        :raises InvalidMode: if the output is not recognised
+        """
+        if output is None: return None
+
+        # frames are in pixel order with an alpha channel, files want BGR
+        toBGR=cv2.COLOR_RGBA2BGR    # opencv writes BGR
+
+        if output.lower().endswith(VIDEO_EXTENSIONS):
+            video=cv2.VideoWriter(output,cv2.VideoWriter_fourcc(*self.fourcc),self.fps,(Panel.width,Panel.height))
+            if not video.isOpened():
+                raise InvalidMode("OfflineRenderer cannot open video file "+output+" with codec "+self.fourcc)
+
+            def writeVideo(n,frame):
+                if frame is None:
+                    video.release()
+                    return
+                video.write(cv2.cvtColor(frame,toBGR))
+
+            return writeVideo
+
+        if "%" in output:
+            folder=os.path.dirname(output)
+            if folder!="" and not os.path.isdir(folder): os.makedirs(folder)
+
+            def writeImage(n,frame):
+                if frame is None: return
+                cv2.imwrite(output % n,cv2.cvtColor(frame,toBGR))
+
+            return writeImage
+
+        raise InvalidMode("OfflineRenderer output should be a video file "+",".join(VIDEO_EXTENSIONS)+
+                          " or an image file pattern like frame%05d.png got "+output)
+
+    def render(self,duration=None,frames=None,output=None):
+        """
+        renders the animations
+
+        :param float duration: seconds of animation to render
+        :param int frames: or the number of frames to render
+        :param str output: None to return the frames as a numpy array, an image filename pattern such
+                           as "frames/frame%05d.png" or a video filename ending .avi,.mp4,.mov or .mkv
+        :return numpy ndarray or int: the frames (n,height,width,4) if output is None otherwise the
+                           number of frames written
+        """
+        assert duration is not None or frames is not None,"OfflineRenderer.render() needs a duration or frames."
+        assert not self.animator.running,"OfflineRenderer.render() the Animator is running."
+        Panel.CheckInit()
+
+        if frames is None: frames=int(round(duration*self.fps))
+
+        writer=self._openWriter(output)
+        result=None
+        if writer is None:
+            result=np.empty((frames,Panel.height,Panel.width,4),dtype=np.uint8)
+
+        animator=self.animator
+        oldClock=animator.clock
+        animator.setClock(self.clock)
+
+        t0=time.time()
+        self.framesRendered=0
+
+        try:
+            if self.reset:
+                animator.reset()
+                self.frameNumber=0
+
+            animator.openRenderer(self.frameInterval)
+
+            for n in range(frames):
+                # n/fps rather than adding frameInterval each time so errors don't accumulate
+                self.clock.setTime(self.frameNumber*self.frameInterval)
+                self.frameNumber+=1
+                self.clock.setFrameTime()
+
+                animator.renderFrame(update=False)
+
+                frame=Panel.frameBuffer.getImageData()
+                if writer is None:
+                    result[n]=frame
+                else:
+                    writer(n,frame)
+
+                self.framesRendered+=1
+
+        finally:
+            animator.closeRenderer()
+            if writer is not None: writer(self.framesRendered,None)
+            self.clock.clearFrameTime()
+            animator.setClock(oldClock)
+            self.renderTime=time.time()-t0
+
+        if self.debug:
+            print "OfflineRenderer.render() %d frames in %.3f seconds (%.1f fps)" % \
+                  (self.framesRendered,self.renderTime,self.framesRendered/max(self.renderTime,1e-9))
+
+        return result if writer is None else self.framesRendered
@@ -181,17 +181,14 @@ class Font():
                 mw, h= self.getTextBbox(subStr)
                 cw,h=self.getTextBbox(message[i])
                 color = fgColor.getNextEntry().getPixelColor()
-                color=channelSwap(color)
                 render.text((x+mw-cw,y),message[i],font=self.font,fill=color)
             #for ch in message:
             #    (w, h)= self.getTextBbox(ch)
             #    color=fgColor.getNextEntry().getPixelColor()
-            #    color=channelSwap(color)
             #    render.text((Xpos,y),ch,font=self.font,fill=color)
             #    Xpos+=w
         else:
             # single color text
-            fgColor=channelSwap(fgColor)
             render.text((x, y), message, font=self.font,fill=fgColor)
 
         #convert the PIL image back to a numpy array
@@ -43,12 +43,13 @@ class Palette():
             # affecting the original colours
             self.pal.append(copy.deepcopy(c))
 
-    def getRandomEntry(self):
+    def getRandomEntry(self,rng=random):
         """
         get a random entry from the palette
+        :param random.Random rng: random number generator, default is the random module
         :return Color object: randomly selected
         """
-        entry=random.randint(0,self.lenPal-1)
+        entry=rng.randint(0,self.lenPal-1)
         return self.pal[entry]
 
     def getEntry(self,n):
@@ -71,6 +72,18 @@ class Palette():
         self.curEntry=(self.curEntry+1) % len(self.pal)
         return c
 
+    def newCursor(self):
+        """
+        palettes are shared between animations so getNextEntry() on a shared palette depends on
+        what every other user has done. This returns a Palette with the same colours and its own
+        getNextEntry() position, starting at the first entry.
+
+        :return Palette: shares the colour list, not the position
+        """
+        cursor=copy.copy(self)
+        cursor.curEntry=0
+        return cursor
+
     def getLength(self):
         """
         return the number of entries in the palette
@@ -7,77 +7,47 @@ or through a simulator (which uses opencv to display the output).
 Panel maintains a frameBuffer (video frame) which is written to by the animations and which is
 sent off to the simulated or real matrix when swap is called (to signify the caller has finished)
 
+Where the frames go is chosen by init(backend=...), see Backends.py. The default is the simulator
+on Windows and the real matrix elsewhere.
+
 The frameBuffer is a NumpyImage which allows the Panel to support, for example, Alpha channels
 which the Hzeller drivers don't.
 
+Colours sent to the real matrix go through a 256 entry lookup table per channel which applies
+the colour balance (redAdjust, greenAdjust and blueAdjust in Constants.py), the gamma and the
+dim level in one step, into a separate output buffer. The tables are only rebuilt when one of
+those is changed (SetColourAdjust(), SetGamma(), SetDimLevel()). The simulator only gets the
+dim level, a monitor doesn't need balancing.
+
+With PREMULTIPLIED (see Constants.py) the frameBuffer holds premultiplied colours. They are sent as
+they are because a premultiplied colour is what the pixel looks like over black, which is what an
+unlit LED is. The frameBuffer is normally opaque anyway, where both forms are the same.
+
 NOTE: sys.stdout.flush is used to prevent startuop messages being delayed
 
 
 """
 
 import LEDAnimator.NumpyImage as ni
+import numpy as np
+import cv2
 from LEDAnimator.ExceptionErrors import *
-from LEDAnimator.UtilLib import pasteWithAlphaAt
+from LEDAnimator.UtilLib import pasteWithAlphaAt,premultiplyColor
+from LEDAnimator.Constants import PREMULTIPLIED
 from LEDAnimator.Colors import *
+from LEDAnimator.FramePipeline import FramePipeline
+from LEDAnimator.Backends import createBackend
 import sys
 
-##############################################################
-# are we simulating or running on the Raspberry Pi?
-# try the actual hzeller imports first
-#
-# PyCharm underlines rgbmatrix below if developing the code
-# on a Windows machine. It can be ignored.
-##############################################################
-
-import platform
-
-if platform.system()=="Windows":
-    print "Running on Windows simulator"
-    sys.stdout.flush()
-
-    from Simulator.RGBMatrix import RGBMatrix
-    from Simulator.RGBMatrixOptions import RGBMatrixOptions
-    simulating=True
-else:
-    from rgbmatrix import RGBMatrix,RGBMatrixOptions
-    simulating=False
-
-
-###############################################################
-#
-# hzeller driver SetImage wants a PIL RGB image, so we need these
-#
-###############################################################
-try:
-    # works on windows (Anaconda) and maybe others
-    # might work ok using Anaconda on Linux (Pi Raspbian)
-    from PIL import ImageTk,Image
-except:
-    try:
-        # PILcompat is underlined in PyCharm when developing
-        # on Windows because it was moved and renamed on Rasbian Lite
-        from PILcompat import ImageTk,Image
-    except:
-        raise MissingImageTk
-
-##########################################################################################
-# define the default options for a 64x64 matrix comprising of two 64x32 panels in parallel
-# each panel has two 32x32 sub-panels chained together
-# these are passed in via init(rows=x, ...)
 ##########################################################################################
-Options = RGBMatrixOptions()
-
-# these are the default values in RGBMatrixOPtions so don't need specfying here
-#Options.rows = 32           # 32 rows in each panel
-#Options.cols = 32
-#Options.parallel = 2        # two panels in parallel
-#Options.chain_length = 2       # sub-panels per panel
-#Options.gpio_slowdown = 2   # gets rid of flickering leds on my Pi3
-
-# on Linux not doing this prevents access to images (files)
+# the options for the matrix configuration, made by the backend in init() and filled in from
+# its kwargs e.g. init(rows=x, ...). The defaults are for a 64x64 matrix comprising of two
+# 64x32 panels in parallel, each panel has two 32x32 sub-panels chained together
+#
+# on Linux not setting drop_privileges=False prevents access to images (files)
 # after the RGBMatrix is created
-Options.drop_privileges = False
-
+##########################################################################################
+Options = None
 
 ###########################################################################
 #
@@ -89,12 +59,25 @@ Options.drop_privileges = False
 #
 ###########################################################################
 
-matrix = None                           # the RGB matrix
-canvas = None                           # not used by the simulator
+backend=None                            # Backend the frames are sent to, see Backends.py
+simulating=False                        # True if the backend is the simulator
 frameBuffer=None                        # NumpyImage used to represent the current display
 panelBgColor=Black.getPixelColor()     # panel background color opaque Black
 width=0                                 # panel width in pixels
 height=0                                # panel height in pixels
+pipeline=None                           # FramePipeline if output is done on a separate thread
+headless=False                          # True if frames are rendered but not output (the null backend)
+skipUnchanged=True                      # UpdateDisplay() does nothing if the frameBuffer hasn't changed
+frameVersion=0                          # incremented whenever the frameBuffer is drawn on
+displayedVersion=None                   # frameVersion last sent to the matrix
+updates=0                               # frames sent to the matrix by UpdateDisplay()
+skippedFrames=0                         # UpdateDisplay() calls skipped because the frame hadn't changed
+colourAdjust=(redAdjust,greenAdjust,blueAdjust)    # colour balance for the real matrix, see Constants.py
+gamma=1.0                               # output = input**gamma, 1.0 leaves the colours alone
+dimLevel=1.0                            # overall output level 0.0 (off) to 1.0 (full), e.g. for night time
+matrixLUT=None                          # (256,1,4) lookup table for the real matrix, None if it changes nothing
+simulatorLUT=None                       # lookup table for the simulator (dim level only)
+outputBuffer=None                       # _present() writes the corrected frame here
 
 ###################################################################
 # some classes to help PyCharm know what parameters exist
@@ -119,21 +102,65 @@ class imageOptions(object):
 def init(**kwargs):
     """
     init() must be called at the start of the program to create a Panel (matrix and canvas)
-    :param kwargs: options for the matrix configuration
+
+    backend chooses where the frames go, "hzeller", "simulator", "null" or "file" (see Backends.py),
+    or a Backend object. The default is the simulator on Windows and the real matrix elsewhere.
+    outputFile is the file the "file" backend writes to.
+
+    Output can be done on a separate thread, overlapping with rendering, by passing pipelineDepth=2 (double
+    buffered) or 3 (triple buffered). See FramePipeline.py. dropFrames=True drops the oldest waiting frame,
+    rather than waiting, if the output cannot keep up.
+
+    headless=True is the same as backend="null", the frameBuffer is set up without creating a matrix and
+    frames are not output. Used for benchmarking and offline rendering.
+
+    skipUnchanged=False makes UpdateDisplay() send every frame, even if it is the same as the last one.
+
+    gamma and dimLevel set the output colour correction, see SetGamma() and SetDimLevel().
+
+    :param kwargs: options for the matrix configuration plus backend, outputFile, pipelineDepth, dropFrames,
+                   headless, skipUnchanged, gamma and dimLevel
     :return: Nothing
+    :raises UnknownBackend: if backend isn't one of the names above
     """
-    global matrix,simulating,width,height,frameBuffer,canvas
+    global Options,backend,simulating,width,height,frameBuffer,pipeline,headless,skipUnchanged,displayedVersion
 
     print "Panel.init() starting.."
     sys.stdout.flush()
 
+    # these are not RGBMatrix options
+    backendName=kwargs.pop("backend",None)
+    outputFile=kwargs.pop("outputFile",None)
+    pipelineDepth=kwargs.pop("pipelineDepth",0)
+    dropFrames=kwargs.pop("dropFrames",False)
+    headless=kwargs.pop("headless",False)
+    skipUnchanged=kwargs.pop("skipUnchanged",True)
+    SetGamma(kwargs.pop("gamma",gamma))
+    SetDimLevel(kwargs.pop("dimLevel",dimLevel))
+
+    if backendName is None and headless: backendName="null"
+
+    if pipeline is not None:
+        pipeline.close()
+        pipeline=None
+
+    if backend is not None:
+        backend.close()
+
+    backend=createBackend(backendName,**({} if outputFile is None else {"filename":outputFile}))
+    headless=backend.name=="null"
+    simulating=backend.name=="simulator"
+
+    print "Panel.init() output to the %s backend" % backend.name
+    sys.stdout.flush()
+
+    Options=backend.createOptions()
+    Options.drop_privileges=False
+
     for key, value in kwargs.iteritems():
         # only accept valid RGBMatrix options
         if getattr(Options,key,None) is not None: setattr(Options,key,value)
 
-    #create the matrix object
-    matrix=RGBMatrix(options=Options)
-
     height=Options.rows*Options.parallel
     width=Options.rows*Options.chain_length
 
@@ -141,43 +168,215 @@ def init(**kwargs):
     sys.stdout.flush()
 
     frameBuffer=ni.NumpyImage(width=width,height=height)
-    if not simulating:
-        canvas=matrix.CreateFrameCanvas()
+    displayedVersion=None
+    ResetUpdateStats()
+
+    # creates the matrix or simulator window
+    backend.open(Options)
+
+    if pipelineDepth>0:
+        print "Panel.init() output pipeline depth %d dropFrames=%s" % (pipelineDepth,dropFrames)
+        sys.stdout.flush()
+        pipeline=FramePipeline(frameBuffer.getImageData().shape,depth=pipelineDepth,dropFrames=dropFrames,
+                               present=_present)
 
 def CheckInit():
     """
     Checks if init has been called and if not aborts the program
     :return: Nothing
     """
-    if matrix is None:
+    if backend is None:
         raise PanelInitNotCalled
 
 def UpdateDisplay():
     """
     copies the frameBuffer to the RGBMatrix and refreshes the visible display
+
+    If there is an output pipeline a copy of the frameBuffer is queued and the display is
+    refreshed by the pipeline output thread.
+
+    If nothing has been drawn on the frameBuffer since the last call the display already shows
+    it so nothing is done, unless init() was called with skipUnchanged=False. The matrix (or
+    simulator) keeps showing the last frame it was sent.
+
     :return: nothing
     """
-    global matrix,simulating,canvas
+    global displayedVersion,updates,skippedFrames
 
     CheckInit()
 
-    # simulator and physical matrices behave differently here
+    if skipUnchanged and frameVersion==displayedVersion:
+        skippedFrames+=1
+        return
+
+    displayedVersion=frameVersion
+    updates+=1
+
     img=frameBuffer.getImageData()
 
-    if simulating:
-        # no matrix refresh needed here
-        matrix.SetImage(img)
+    if pipeline is not None:
+        pipeline.submit(img)
     else:
-        img[RGB_R] = (img[RGB_R] * redAdjust)
-        img[RGB_G] = (img[RGB_G] * greenAdjust)
-        img[RGB_B] = (img[RGB_B] * blueAdjust)
+        # _present() doesn't modify the frameBuffer, the corrected colours go to outputBuffer
+        _present(img)
+
+def _present(img):
+    """
+    sends an image to the backend. Called by UpdateDisplay() or the pipeline output thread.
+
+    :param numpy ndarray img: the image to display, it is not modified
+    :return: nothing
+    """
+    if backend.colourCorrection=="matrix":
+        img=_correctColours(img,matrixLUT)
+    elif backend.colourCorrection=="simulator":
+        img=_correctColours(img,simulatorLUT)
+
+    backend.present(img)
+
+def _correctColours(img,lut):
+    """
+    looks up the output colours of an image. Only one thread presents frames at a time so one
+    output buffer is enough.
+
+    :param numpy ndarray img: (h,w,4) uint8 frame
+    :param numpy ndarray lut: (256,1,4) uint8 table or None to leave the colours alone
+    :return numpy ndarray: img or outputBuffer holding the corrected frame
+    """
+    global outputBuffer
+
+    if lut is None: return img
+
+    if outputBuffer is None or outputBuffer.shape!=img.shape:
+        outputBuffer=np.empty_like(img)
+
+    return cv2.LUT(img,lut,dst=outputBuffer)
+
+def _buildLUT(adjust,gamma,level):
+    """
+    builds a lookup table which, for each colour channel, maps v to 255*((v/255)**gamma)*adjust*level
+
+    :param tuple adjust: (red,green,blue) multipliers
+    :param float gamma: see SetGamma()
+    :param float level: see SetDimLevel()
+    :return numpy ndarray: (256,1,4) uint8 table in Pixel order, None if it would change nothing
+    """
+    if tuple(adjust)==(1.0,1.0,1.0) and gamma==1.0 and level==1.0: return None
+
+    v=np.arange(256)/255.0
+    if gamma!=1.0: v=v**gamma
+
+    lut=np.empty((256,1,4),dtype=np.uint8)
+    for channel,multiplier in zip((RGB_R,RGB_G,RGB_B),adjust):
+        lut[:,0,channel]=np.clip(np.rint(v*(255.0*multiplier*level)),0,255)
+    lut[:,0,ALPHA]=np.arange(256)
+
+    return lut
+
+def _rebuildLUTs():
+    """
+    makes new lookup tables after a setting has changed. The tables are replaced, not changed,
+    so the pipeline output thread always sees a whole table.
+
+    :return: nothing
+    """
+    global matrixLUT,simulatorLUT,displayedVersion
+    matrixLUT=_buildLUT(colourAdjust,gamma,dimLevel)
+    simulatorLUT=_buildLUT((1.0,1.0,1.0),1.0,dimLevel)
+
+    # send the frame again with the new colours
+    displayedVersion=None
+
+def SetColourAdjust(red=None,green=None,blue=None):
+    """
+    sets the colour balance of the real matrix, see Docs/ColourBalancing.md. Starts with the
+    values in Constants.py
 
-        # note Constants.RGB_R & RGB_B will need to be set RGB_R=0 and RGB_B=2
-        # to ensure RGB colours are in the correct order
-        canvas.SetImage(Image.fromarray(img).convert("RGB"))
-        canvas=matrix.SwapOnVSync(canvas)
+    :param float red: red multiplier, None leaves it as it is
+    :param float green: green multiplier
+    :param float blue: blue multiplier
+    :return: nothing
+    """
+    global colourAdjust
+    r,g,b=colourAdjust
+    colourAdjust=(r if red is None else red,g if green is None else green,b if blue is None else blue)
+    _rebuildLUTs()
+
+def SetGamma(value=1.0):
+    """
+    sets the gamma of the real matrix. The LEDs are linear so values of 2.0 or more make a mid
+    grey look like one.
+
+    :param float value: output=input**value, 1.0 leaves the colours alone
+    :return: nothing
+    """
+    global gamma
+    assert value>0,"Panel.SetGamma() gamma must be greater than 0."
+    gamma=float(value)
+    _rebuildLUTs()
 
-def DrawImage(x,y,image):
+def SetDimLevel(level=1.0):
+    """
+    dims the whole output, e.g. at night, without changing anything the animations draw. Costs
+    nothing more per frame than the colour balance does.
+
+    :param float level: 0.0 (off) to 1.0 (full brightness)
+    :return: nothing
+    """
+    global dimLevel
+    assert 0.0<=level<=1.0,"Panel.SetDimLevel() level must be in the range 0.0 to 1.0"
+    dimLevel=float(level)
+    _rebuildLUTs()
+
+def Flush():
+    """
+    waits until all frames queued by UpdateDisplay() are on the display
+    :return: nothing
+    """
+    if pipeline is not None: pipeline.flush()
+
+def FrameChanged():
+    """
+    Tells the Panel the frameBuffer has changed. The Panel drawing functions do this themselves, call
+    it if you write to frameBuffer directly otherwise UpdateDisplay() may not send the change.
+
+    :return: nothing
+    """
+    global frameVersion
+    frameVersion+=1
+
+def GetUpdateStats():
+    """
+    :return dict: updates (frames sent to the matrix) and skippedFrames (UpdateDisplay() calls skipped
+                  because the frame was unchanged)
+    """
+    return {"updates":updates,"skippedFrames":skippedFrames}
+
+def ResetUpdateStats():
+    """
+    zeroes the UpdateDisplay() counters
+    :return: nothing
+    """
+    global updates,skippedFrames
+    updates=0
+    skippedFrames=0
+
+def GetBackendStats():
+    """
+    :return dict: frames output and the time spent outputting them (see Backends.Backend.getStats()) or
+                  None if init() hasn't been called
+    """
+    if backend is None: return None
+    return backend.getStats()
+
+def GetPipelineStats():
+    """
+    :return dict: output pipeline frame counters (see FramePipeline.getStats()) or None if there is no pipeline
+    """
+    if pipeline is None: return None
+    return pipeline.getStats()
+
+def DrawImage(x,y,image,coverage=None):
     """
     Overwrites whatever is on the matrix in the region of the image.
 
@@ -186,6 +385,7 @@ def DrawImage(x,y,image):
     :param float x:   top left coord of image
     :param float y:   top left coord of image
     :param image: numpy image (ndarray) to draw
+    :param int coverage: alpha coverage of the image if known, see UtilLib.alphaCoverage()
     :return None: frameBuffer is updated
     """
 
@@ -194,7 +394,8 @@ def DrawImage(x,y,image):
     CheckInit()
 
     # paste with Alpha converts X/y to nearest pixel
-    pasteWithAlphaAt(frameBuffer.out,x,y,image)
+    pasteWithAlphaAt(frameBuffer.out,x,y,image,coverage=coverage)
+    FrameChanged()
 
 
 def DrawPixel(x,y,color):
@@ -215,6 +416,7 @@ def DrawPixel(x,y,color):
     CheckInit()
 
     frameBuffer.setPixel(x, y, color)
+    FrameChanged()
 
 def DrawPixelsRandom(x,y):
     """
@@ -231,6 +433,7 @@ def DrawPixelsRandom(x,y):
     # frameBuffer.setPixelRandom validates the parameters
     #print "Panel.DrawPixelsRandom(x,y) type x", type(x), "y", type(y)
     frameBuffer.setPixelRandom(x, y)
+    FrameChanged()
 
 def GetPixel(x,y):
     """
@@ -257,6 +460,19 @@ def Clear():
     """
     global  panelBgColor
     frameBuffer.fill(panelBgColor)
+    FrameChanged()
+
+def ClearWindow(window):
+    """
+    Fill a window of the frameBuffer with the current background color.
+    Used by the Compositor to redraw only the part of the frame which changed.
+
+    :param tuple window: (x,y,w,h) in pixels, must lie within the panel
+    :return: Nothing
+    """
+    x,y,w,h=window
+    frameBuffer.out[y:y+h,x:x+w]=[premultiplyColor(panelBgColor) if PREMULTIPLIED else panelBgColor]
+    FrameChanged()
 
 def Fill(color):
     """
@@ -267,6 +483,7 @@ def Fill(color):
     global frameBuffer
     CheckInit()
     frameBuffer.fill(color)
+    FrameChanged()
 
 def SetBgColor(bg=Black.getPixelColor()):
     """
@@ -285,13 +502,9 @@ def isRunning():
     appropriate action
     :return: True if the matrix is running otherwise False
     """
-    global simulating,matrix
-
-    # if the TSimulator window has closed we should stop
-    if simulating: return matrix.IsRunning()
-
+    # if the simulator window has closed we should stop
     # actual matrix will always be running
-    return True
+    return backend.isRunning()
 
 def nearestInt(x):
     if type(x) is int: return x
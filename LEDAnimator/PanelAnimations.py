@@ -73,15 +73,15 @@ class RandomRectangles(PanelAnimBase):
         if self.multiColored:
             self.color = self.getNextPaletteEntry().getPixelColor()
 
-        x=random.randint(0,Panel.width-2)   # rectangles min of 2x2
-        y=random.randint(0,Panel.height-2)
+        x=self.rng.randint(0,Panel.width-2)   # rectangles min of 2x2
+        y=self.rng.randint(0,Panel.height-2)
         w=int((Panel.width-x)/2)
         h=int((Panel.height-y)/2)
 
         if w>2:
-            w=random.randint(2,w)
+            w=self.rng.randint(2,w)
         if h>2:
-            h=random.randint(2,h)
+            h=self.rng.randint(2,h)
 
         self.fgImage.drawRectangle((x,y),(x+w,y+h), self.color, self.filled)
         self.refreshCanvas()
@@ -120,9 +120,9 @@ class RandomCircles(PanelAnimBase):
             self.color = self.getNextPaletteEntry().getPixelColor()
             self.init=False
 
-        posX=random.randint(10,50)
-        posY=random.randint(10,50)
-        radius=random.randint(5,10)
+        posX=self.rng.randint(10,50)
+        posY=self.rng.randint(10,50)
+        radius=self.rng.randint(5,10)
 
         if self.multicolored:
             self.color=self.getNextPaletteEntry().getPixelColor()
@@ -160,10 +160,10 @@ class RandomEllipses(PanelAnimBase):
             self.fgImage.clear()
             self.init = False
 
-        posX = random.randint(10, 50)
-        posY = random.randint(10, 50)
-        rad1 = random.randint(5, 10)
-        rad2 = random.randint(5, 10)
+        posX = self.rng.randint(10, 50)
+        posY = self.rng.randint(10, 50)
+        rad1 = self.rng.randint(5, 10)
+        rad2 = self.rng.randint(5, 10)
         color = self.getNextPaletteEntry().getPixelColor()
 
         thickness = FILLED if self.filled else self.thickness
@@ -193,7 +193,7 @@ class RandomSparkle(PanelAnimBase):
                 self.window=(0,0,self.fgImage.getWidth(),self.fgImage.getHeight())
             self.init=False
 
-        self.fgImage.fillWindowRandom(self.window)
+        self.fgImage.fillWindowRandom(self.window,rng=self.nprng)
         self.refreshCanvas()
 
 class Line(PanelAnimBase):
@@ -233,7 +233,7 @@ class Line(PanelAnimBase):
             self.color = self.getNextPaletteEntry().getPixelColor()
 
         # draw a line on the output image
-        self.fgImage.fgImage.drawLine(self.fromXY,self.toXY, self.color,self.thickness,self.lineType)
+        self.fgImage.drawLine(self.fromXY,self.toXY, self.color,self.thickness,self.lineType)
         # send it to the panel
         self.refreshCanvas()
 
@@ -350,7 +350,7 @@ class Twinkle(PanelAnimBase):
             self.fgImage.clear()
             if self.stars is None:
                 p=PoissonLib()
-                self.stars=p.getSamples(30,self.radius,Panel.width,Panel.height)
+                self.stars=p.getSamples(30,self.radius,Panel.width,Panel.height,self.nprng)
             self.init=False
 
         # main loop - iterate through the list of stars and
@@ -358,7 +358,7 @@ class Twinkle(PanelAnimBase):
 
         for (x,y) in self.stars:
 
-            color=self.getNextPaletteEntry().getPixelColor(brightness=random.uniform(0,1),alpha=random.uniform(0,1))
+            color=self.getNextPaletteEntry().getPixelColor(brightness=self.rng.uniform(0,1),alpha=self.rng.uniform(0,1))
 
 
             # using int cords prevents setPixel rounding 63.8 to 64 which causes
@@ -0,0 +1,92 @@
+"""
+PlaybackAnimation.py
+
+Plays a frame file made by FrameFile.bakeSequence() as an animation layer.
+
+The frame shown is chosen from the animation time so playback keeps to the fps the file was
+baked at whatever the Animator fps. The FrameReader decodes each frame into its own buffer, which
+the deltas are applied to, and drawLayer() copies it into the layerBuffer. Frames which repeat the
+previous one aren't decoded or copied at all (see AnimBase.refreshCanvas()).
+
+    A.addAnimation(seq=AnimSequence([PlaybackAnimation(frameFile="daf_d.frames",fps=FPS)]))
+
+duration defaults to the length of the file. With loop=True (the default) the file is played
+again from the start if the duration is longer, otherwise the last frame is held.
+
+bgImage, fgImage, background and chain are ignored, the frames already contain the whole layer.
+
+"""
+
+import numpy as np
+import Panel
+from AnimBase import AnimBase
+from FrameFile import FrameReader
+from Constants import RGB_R,PREMULTIPLIED
+from UtilLib import premultiply,unpremultiply
+from ExceptionErrors import *
+
+
+class PlaybackAnimation(AnimBase):
+
+    frameFile=None      # path of the frame file, passed in
+    loop=True           # play the file again if the duration is longer than the file
+    reader=None         # FrameReader
+    frameNumber=None    # frame in the layerBuffer
+
+    def __init__(self,**kwargs):
+
+        super(PlaybackAnimation,self).__init__(**kwargs)
+
+        assert self.frameFile is not None,"PlaybackAnimation() frameFile not set."
+
+        self.reader=FrameReader(self.frameFile)
+
+        if self.reader.width!=Panel.width or self.reader.height!=Panel.height:
+            raise InvalidFrameFile(self.frameFile+" is %dx%d, the Panel is %dx%d" %
+                                   (self.reader.width,self.reader.height,Panel.width,Panel.height))
+
+        if "duration" not in kwargs:
+            self.duration=self.reader.duration()
+
+    def reset(self,**kwargs):
+
+        super(PlaybackAnimation,self).reset(**kwargs)
+        self.frameNumber=None
+
+    def step(self):
+
+        n=int((self.clock.time()-self.startTime)*self.reader.fps+1e-6)
+
+        if n>=self.reader.frameCount:
+            n=n%self.reader.frameCount if self.loop else self.reader.frameCount-1
+
+        # nothing to decode?
+        if n==self.frameNumber or (self.frameNumber is not None and n==self.frameNumber+1 and self.reader.isRepeat(n)):
+            self.layerUnchanged=True
+
+        self.frameNumber=n
+        self.refreshCanvas()
+
+    def drawLayer(self):
+        """
+        copies the current frame to the layerBuffer
+        :return None:
+        """
+        frame=self.reader.getFrame(self.frameNumber)
+        layer=self.layerBuffer.getImageData()
+
+        if self.reader.channelOrder==RGB_R:
+            np.copyto(layer,frame)
+        else:
+            # baked with the red and blue channels the other way round
+            layer[...]=frame[...,[2,1,0,3]]
+
+        # baked with the other alpha format (see Constants.py)
+        if self.reader.premultiplied!=PREMULTIPLIED:
+            if PREMULTIPLIED:
+                premultiply(layer)
+            else:
+                unpremultiply(layer)
+
+        # written through getImageData() so the cached alpha coverage must be worked out again
+        self.layerBuffer.changed()
@@ -0,0 +1,115 @@
+"""
+Prefetcher.py
+
+Prepares the next animation in a sequence on a background thread whilst the current one plays.
+
+Without it the next animation loads, transforms, scales and aligns its bgImage and fgImage in
+its reset(), on the frame where the sequence moves on, which can take several frame intervals
+for a large photo. AnimInfo submits the next animation as soon as the current one starts and the
+Prefetcher calls its prepare() so the images are ready before they are needed.
+
+Images are handed over atomically: AnimBase.prepareImage() builds the image privately and only
+assigns Image.image when it is complete, with the Image lock held. If reset() gets there first it
+waits for the lock and finds the image already loaded, otherwise it loads it as it always has.
+
+Fonts and text buffers don't need prefetching, TextAnimBase builds them when the animation is
+created.
+
+There is one Prefetcher per process (see getPrefetcher()) so layers stepped by the "process"
+executor prefetch in their own process.
+
+"""
+
+import os
+import sys
+import threading
+import traceback
+import Queue
+
+
+class Prefetcher(object):
+    """
+    a daemon thread which calls prepare() on the animations submitted to it, in order
+    """
+
+    debug=False
+
+    def __init__(self,**kwargs):
+
+        for key,value in kwargs.iteritems():
+            setattr(self,key,value)
+
+        self.queue=Queue.Queue()
+        self.prepared=0     # animations prepared
+        self.failed=0       # animations whose prepare() raised an exception
+
+        self.thread=threading.Thread(target=self._run,name="Prefetcher")
+        self.thread.daemon=True
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            anim=self.queue.get()
+            try:
+                anim.prepare()
+                self.prepared+=1
+            except Exception:
+                # reset() will try again, on the render thread, and raise it there
+                self.failed+=1
+                if self.debug:
+                    print >>sys.stderr,"Prefetcher: prepare() failed for",anim.__class__.__name__
+                    traceback.print_exc()
+            finally:
+                self.queue.task_done()
+
+    def submit(self,anim):
+        """
+        queues an animation to be prepared
+        :param AnimBase anim: the animation
+        :return None:
+        """
+        self.queue.put(anim)
+
+    def wait(self):
+        """
+        blocks until everything submitted has been prepared
+        :return None:
+        """
+        self.queue.join()
+
+    def getStats(self):
+        """
+        :return dict: prepared, failed and queued counts
+        """
+        return {"prepared":self.prepared,"failed":self.failed,"queued":self.queue.qsize()}
+
+
+_prefetcher=None
+_pid=None
+
+
+def getPrefetcher():
+    """
+    returns the Prefetcher for this process. A forked layer process doesn't inherit the parent's
+    thread so it gets a new one.
+
+    :return Prefetcher:
+    """
+    global _prefetcher,_pid
+
+    if _prefetcher is None or _pid!=os.getpid():
+        _prefetcher=Prefetcher()
+        _pid=os.getpid()
+
+    return _prefetcher
+
+
+def waitForPrefetcher():
+    """
+    waits for this process's Prefetcher, if it has one, to finish. Called before forking layer
+    processes because a thread part way through a prefetch would leave its Image lock held in the child.
+
+    :return None:
+    """
+    if _prefetcher is not None and _pid==os.getpid():
+        _prefetcher.wait()
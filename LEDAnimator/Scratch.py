@@ -0,0 +1,126 @@
+"""
+Scratch.py
+
+Reusable work arrays for the compositing kernels so that a frame doesn't allocate any.
+
+Blending a layer needs several temporary arrays the size of the layer. Allocating them on every
+call, at 100 fps with several layers, churns megabytes a second and the garbage collector pauses
+show up as judder. Instead the kernels ask the ScratchPool for a named buffer:-
+
+    pool=getScratch()
+    w=pool.get("weights",(h,w,4),np.uint8)
+
+Each name keeps one flat buffer which grows to the largest size asked for and is then reused,
+get() returns a view of the front of it with the shape wanted. After the first frame or so
+nothing new is allocated. getStats() only counts the pool's own buffers, Tests/AllocationTest.py
+counts every numpy allocation made by the frames.
+
+A buffer returned by get() is only valid until the next get() of the same name so a kernel
+must use different names for the arrays it needs at the same time. Kernels which call each
+other (pasteWithAlphaAt() -> alphaBlendInto()) must not use the same names either.
+
+There is one pool per thread. The "thread" executor (see LayerRenderer.py) has min(workers,layers)
+threads so a thread may step several layers, one after the other. That is safe because no kernel
+keeps a buffer once it returns but the thread's buffers grow to suit the largest of its layers.
+The "process" executor gives each layer its own process, and so its own pool.
+
+"""
+
+import threading
+import numpy as np
+
+_local=threading.local()
+_pools=[]               # every pool made, for getScratchStats()
+_poolsLock=threading.Lock()
+
+
+class ScratchPool(object):
+    """
+    named work arrays which are reused from one call to the next
+    """
+
+    maxViews=256        # views remembered before they are all forgotten, dirty rectangles come in many sizes
+
+    def __init__(self):
+        self.buffers={}         # (name,dtype) -> flat ndarray
+        self.views={}           # (name,dtype,shape) -> view of the buffer handed out before
+        self.allocations=0      # buffers allocated or grown
+        self.bytes=0            # bytes held
+
+    def get(self,name,shape,dtype):
+        """
+        returns a work array. Its contents are whatever was left in it last time.
+
+        :param str name: which buffer
+        :param tuple shape: shape wanted
+        :param numpy dtype dtype: type wanted e.g. np.uint16
+        :return numpy ndarray: C contiguous array of the given shape, a view of the buffer
+        """
+        # the kernels are called with the same few shapes over and over
+        view=self.views.get((name,dtype,shape))
+        if view is not None: return view
+
+        return self._newView(name,shape,dtype)
+
+    def _newView(self,name,shape,dtype):
+        """
+        makes a view for get(), growing the buffer if it is too small
+        """
+        n=1
+        for d in shape: n*=d
+
+        key=(name,dtype)
+        buf=self.buffers.get(key)
+
+        if buf is None or buf.size<n:
+            old=0 if buf is None else buf.nbytes
+            buf=np.empty(n,dtype=dtype)
+            self.buffers[key]=buf
+            self.allocations+=1
+            self.bytes+=buf.nbytes-old
+
+            # views of the old buffer must not be handed out again
+            for k in [k for k in self.views if k[:2]==key]:
+                del self.views[k]
+
+        if len(self.views)>=self.maxViews: self.views.clear()
+
+        view=buf[:n].reshape(shape)
+        self.views[(name,dtype,shape)]=view
+        return view
+
+    def getStats(self):
+        """
+        :return dict: buffers, allocations and bytes
+        """
+        return {"buffers":len(self.buffers),"allocations":self.allocations,"bytes":self.bytes}
+
+
+def getScratch():
+    """
+    :return ScratchPool: the pool for the calling thread
+    """
+    try:
+        return _local.pool
+    except AttributeError:
+        pool=_local.pool=ScratchPool()
+        with _poolsLock:
+            _pools.append(pool)
+        return pool
+
+
+def getScratchStats():
+    """
+    totals for every pool made in this process. allocations stops going up once every kernel has
+    seen the largest image it is going to get.
+
+    :return dict: pools, buffers, allocations and bytes
+    """
+    with _poolsLock:
+        pools=list(_pools)
+
+    stats={"pools":len(pools),"buffers":0,"allocations":0,"bytes":0}
+    for pool in pools:
+        for key,value in pool.getStats().iteritems():
+            stats[key]+=value
+    return stats
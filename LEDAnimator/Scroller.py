@@ -7,42 +7,20 @@ achieve the scroll rates required to deliver smooth scrolling
 This class backgrounds the scrolling to provide a tight update loop.
 This should not be used with other animations
 
+It draws through the Panel so it works with whichever backend Panel.init() chose.
+
+The duration is timed with the clock passed in, the animation's clock when run by an Animator
+(see Clock.py), so it sees the same time as the other animations. The loop still sleeps for
+loopDelay of real time between steps.
+
 """
 
-import platform,sys
 from LEDAnimator.ExceptionErrors import *
+from LEDAnimator.Clock import systemClock
 import time
 import threading
 import Panel
 
-if platform.system()=="Windows":
-    print "Running on Windows simulator"
-    sys.stdout.flush()
-
-    from Simulator.RGBMatrix import RGBMatrix
-    from Simulator.RGBMatrixOptions import RGBMatrixOptions
-    simulating=True
-else:
-    from rgbmatrix import RGBMatrix,RGBMatrixOptions
-    simulating=False
-
-###############################################################
-#
-# hzeller driver SetImage wants a PIL RGB image, so we need these
-#
-###############################################################
-try:
-    # works on windows (Anaconda) and maybe others
-    # might work ok using Anaconda on Linux (Pi Raspbian)
-    from PIL import ImageTk,Image
-except:
-    try:
-        # PILcompat is underlined in PyCharm when developing
-        # on Windows because it was moved and renamed on Rasbian Lite
-        from PILcompat import ImageTk,Image
-    except:
-        raise MissingImageTk
-
 
 class Scroller():
 
@@ -54,10 +32,12 @@ class Scroller():
     loopDelay=0.005
     busy=False
     img=None
+    clock=systemClock       # time source for the duration
 
-    def __init__(self,img,startPos,endPos,duration,matrixOptions):
+    def __init__(self,img,startPos,endPos,duration,matrixOptions,clock=systemClock):
 
         self.duration=duration
+        self.clock=clock
         self.img=img
         startX,startY=startPos
         endX,endY=endPos
@@ -79,10 +59,10 @@ class Scroller():
     def _run(self):
         self.busy=True
 
-        self.startTime=time.time()
+        self.startTime=self.clock.time()
 
         while self.busy:
-            if time.time()-self.startTime>=self.duration:
+            if self.clock.time()-self.startTime>=self.duration:
                 break
 
             self.Xpos=self.Xpos+self.xStep
@@ -0,0 +1,161 @@
+"""
+Telemetry.py
+
+Low overhead frame timing for the Animator.
+
+Each named timing (e.g. "frame.update" or "anim.Sparkle.step") keeps the last size samples in a
+fixed size numpy ring buffer so memory use doesn't grow however long the Animator runs and
+recording a sample is just a store into an array.
+
+Timings recorded by the Animator (all in seconds):-
+
+    frame.render            stepping all the layers (includes waiting for thread/process layers)
+    frame.composite         merging the layers with the Panel frameBuffer
+    frame.update            Panel.UpdateDisplay()
+    frame.busy              the whole frame, render+composite+update
+    frame.idle              slack - time spent waiting for the next frame deadline
+    layer<n>.step           stepping layer n (layer 0 is the first one added)
+    anim.<ClassName>.step   stepping any animation of that class, on any layer
+
+and one which is not a time:-
+
+    frame.dirty             fraction (0 to 1) of the panel recomposed, see Compositor.py
+
+Usage:-
+
+    A=Animator(fps=FPS,statsInterval=60,statsFile="stats.csv")
+    ...
+    print A.stats()["anim.Sparkle.step"]["p99"]
+
+stats() returns count, mean, p50, p95, p99 and max for each timing. The statsFile is rewritten
+every statsInterval seconds, as CSV or JSON depending on the file extension.
+
+"""
+
+import csv
+import json
+import threading
+import numpy as np
+
+
+class RingBuffer(object):
+    """
+    fixed size store of the most recent samples
+    """
+
+    def __init__(self,size):
+        """
+        :param int size: number of samples kept
+        """
+        self.data=np.zeros(size,dtype=np.float64)
+        self.size=size
+        self.index=0    # where the next sample goes
+        self.count=0    # total samples added
+
+    def add(self,value):
+        """
+        stores a sample, overwriting the oldest once the buffer is full
+
+        :param float value: the sample
+        :return None:
+        """
+        self.data[self.index]=value
+        self.index+=1
+        if self.index==self.size: self.index=0
+        self.count+=1
+
+    def values(self):
+        """
+        :return numpy ndarray: the samples held, not in time order
+        """
+        if self.count<self.size: return self.data[:self.count]
+        return self.data
+
+    def clear(self):
+        self.index=0
+        self.count=0
+
+
+class Telemetry(object):
+
+    size=1024       # samples kept for each timing
+
+    PERCENTILES=(50,95,99)
+
+    def __init__(self,**kwargs):
+
+        for key,value in kwargs.iteritems():
+            setattr(self,key,value)
+
+        self.timings={}     # name -> RingBuffer
+
+        # layers stepped by the thread executor record from pool threads
+        self.lock=threading.Lock()
+
+    def record(self,name,seconds):
+        """
+        adds a sample to the named timing
+
+        :param str name: timing name e.g. "frame.update"
+        :param float seconds: the sample
+        :return None:
+        """
+        with self.lock:
+            buf=self.timings.get(name)
+            if buf is None:
+                buf=self.timings[name]=RingBuffer(self.size)
+            buf.add(seconds)
+
+    def reset(self):
+        """
+        discards all samples
+        :return None:
+        """
+        with self.lock:
+            for buf in self.timings.itervalues():
+                buf.clear()
+
+    def stats(self):
+        """
+        summarises the samples held for each timing
+
+        :return dict: name -> {"count","mean","p50","p95","p99","max"} in seconds. count is the
+                      total number of samples recorded, the others only cover the samples held.
+        """
+        with self.lock:
+            samples=[(name,buf.count,buf.values().copy()) for name,buf in self.timings.iteritems()]
+
+        stats={}
+        for name,count,values in samples:
+            if len(values)==0: continue
+
+            p50,p95,p99=np.percentile(values,self.PERCENTILES)
+            stats[name]={"count":count,
+                         "mean":float(values.mean()),
+                         "p50":float(p50),
+                         "p95":float(p95),
+                         "p99":float(p99),
+                         "max":float(values.max())}
+        return stats
+
+    def dump(self,filename):
+        """
+        writes stats() to a file. Files ending .json are written as JSON otherwise CSV with
+        one row per timing.
+
+        :param str filename: the file to write, it is overwritten
+        :return None:
+        """
+        stats=self.stats()
+
+        if filename.lower().endswith(".json"):
+            with open(filename,"w") as f:
+                json.dump(stats,f,indent=2,sort_keys=True)
+            return
+
+        fields=["count","mean","p50","p95","p99","max"]
+        with open(filename,"wb") as f:
+            writer=csv.writer(f)
+            writer.writerow(["name"]+fields)
+            for name in sorted(stats):
+                writer.writerow([name]+[stats[name][field] for field in fields])
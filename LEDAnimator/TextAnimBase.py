@@ -26,6 +26,9 @@ import numpy as np
 import Panel
 from LEDAnimator.AnimBase import AnimBase
 from LEDAnimator.NumpyImage import NumpyImage
+from LEDAnimator.UtilLib import pasteWithAlphaAt,premultiply
+from LEDAnimator.Scratch import getScratch
+from LEDAnimator.Compositor import ImageLayer
 from LEDAnimator.BDF import Font as bdf
 from Constants import *
 import Font
@@ -51,9 +54,12 @@ class TextAnimBase(AnimBase):
     textAlpha=1.0                   # for fading effects
     zoom=None                       # Future: would be (startSize,endSize)
     textBuffer=None                 # for rendering text before sending to panel
+    textImage=None                  # the textBuffer with textAlpha applied, see getTextImage()
     lineType=None                   # possibly passed in for Hershey fonts
     startPos=None                   # used by Move routines
     endPos=None                     # ditto
+    paletteCursors=None             # this animation's position in each Text palette, see getPaletteCursor()
+    _startPos=None                  # (Xpos,Ypos) as constructed, setSeed() puts the text back there
 
     def __init__(self, **kwargs):
         super(TextAnimBase, self).__init__(**kwargs)
@@ -70,6 +76,7 @@ class TextAnimBase(AnimBase):
         # This needs changing to use self.text.Xpos etc at some point
         self.origin=(self.Xpos,self.Ypos)
         self.Xpos1,self.Ypos1=self.origin
+        self._startPos=self.origin
 
         if self.text.lineType:
             self.lineType=self.text.lineType
@@ -99,6 +106,35 @@ class TextAnimBase(AnimBase):
         if self.startPos is not None:
             self.origin=self.startPos
 
+    def setSeed(self,seed):
+        """
+        also restarts the text colours from the first palette entry, see getPaletteCursor(), and puts
+        the text back to its blank starting state. Some animations show the textBuffer before their
+        first step() draws it so the last run's text and position would otherwise appear. The
+        position goes back to the one given to the constructor, not the class default.
+        """
+        super(TextAnimBase,self).setSeed(seed)
+        self.paletteCursors={}
+        if self._startPos is not None:
+            self.Xpos,self.Ypos=self.origin=self._startPos
+        if self.textBuffer is not None: self.textBuffer.fill(0)
+
+    def getPaletteCursor(self,palette):
+        """
+        the Text palettes are shared, stepping through them directly would make the colours
+        depend on whatever else used them first. Each animation steps through its own cursor
+        instead (see Palette.newCursor()) which setSeed() restarts.
+
+        :param Palette palette: the fg or bg palette
+        :return Palette: this animation's cursor for it
+        """
+        if self.paletteCursors is None: self.paletteCursors={}
+
+        cursor=self.paletteCursors.get(id(palette))
+        if cursor is None:
+            cursor=self.paletteCursors[id(palette)]=palette.newCursor()
+        return cursor
+
     def getFgColor(self):
         """
         Deals with returning a single colour or next color from   a palette
@@ -108,6 +144,7 @@ class TextAnimBase(AnimBase):
         if color is None:
             return None
         elif isinstance(color,Palette):
+            color=self.getPaletteCursor(color)
 
             # text is multicolored so return the palette
             if self.text.getMultiColored():
@@ -127,6 +164,7 @@ class TextAnimBase(AnimBase):
         if  color is None:
             return None
         elif isinstance(color,Palette):
+            color=self.getPaletteCursor(color)
             c=color.getNextEntry().getPixelColor()
             return c
         elif isinstance(color,Color):
@@ -199,25 +237,49 @@ class TextAnimBase(AnimBase):
         self.font.drawText(self.textBuffer,origin,self.text.getText(),self.getFgColor(),self.lineType)
 
 
-    def refreshCanvas(self):
+    def drawLayer(self):
         """
         create the canvas for this text layer on top of image layers.
 
-        calls the base class refreshCanvas() method first
+        calls the base class drawLayer() method first
 
-        :return Nothing: the text buffer is written to the Panel
+        :return Nothing: the text buffer is written to the layerBuffer
 
         """
 
         # lay down background color/images etc first
-        super(TextAnimBase,self).refreshCanvas()
+        super(TextAnimBase,self).drawLayer()
 
         # text is drawn on the top of previous layers
-        h,w=self.font.getFontBbox()
+        text=self.getTextImage()
+        if text is not None:
+            im,x,y=text
+            pasteWithAlphaAt(self.layerBuffer.getImageData(), x, y, im)
 
+    def getImageLayer(self):
+        """
+        a text layer with no background colour, images or chain is just the text image, see
+        AnimBase.getImageLayer()
+
+        :return ImageLayer: or None if the layerBuffer has to be drawn
+        """
+        if not self.drawsLayerWith(TextAnimBase) or self.drawsBackground(): return None
+
+        text=self.getTextImage()
+        if text is None: return None    # faded out, the layerBuffer is drawn transparent
+
+        im,x,y=text
+        return ImageLayer(im,x,y)
+
+    def getTextImage(self):
+        """
+        the textBuffer with textAlpha applied, in the Panel alpha format, and where it is drawn
+
+        :return tuple: (image,x,y) or None if textAlpha is 0. The image is reused each frame
+        """
         x,y=self.origin if self.origin is not None else (0,0)
 
-        print "TextAnimbase.refreshCanvas() origin",self.origin
+        self._Debug("TextAnimbase.drawLayer() origin",self.origin)
 
         if self.bottomLeftOrigin:
             h,w=self.textBuffer.shape[:2]
@@ -227,11 +289,22 @@ class TextAnimBase(AnimBase):
         # textAlpha is in range 0->1.0
         # multiply current settings
         # no point bothering if alpha is zero
-        if self.textAlpha>0:
-            # multiply all alphas by textAlpha to retain relative transparency
-            im=self.textBuffer.copy()
-            im[:, :, 3] = im[:, :, 3].astype(float) * self.textAlpha
-            Panel.DrawImage(x, y, im)
+        if self.textAlpha<=0: return None
+
+        # multiply all alphas by textAlpha to retain relative transparency
+        # the text buffer is left alone, the copy belongs to the animation since the Compositor may
+        # blend it after other layers have been drawn
+        if self.textImage is None or self.textImage.shape!=self.textBuffer.shape:
+            self.textImage=np.empty_like(self.textBuffer)
+        im=self.textImage
+        np.copyto(im,self.textBuffer)
+        a=np.multiply(self.textBuffer[:, :, 3],self.textAlpha,out=getScratch().get("textAlpha",im.shape[:2],np.float64))
+        np.copyto(im[:, :, 3],a,casting="unsafe")
+
+        # the fonts draw the textBuffer with straight alpha
+        if PREMULTIPLIED: premultiply(im)
+
+        return im,x,y
 
 
 
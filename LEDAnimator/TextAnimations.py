@@ -62,7 +62,7 @@ class Fade(TextAnimBase):
         # work out visibility - time based. We want to fade in starting from the end of a startPause
         # upto the start of the endPause
         # So, goes from zero to hero in duration-startPause-endPause seconds
-        self.textAlpha = (time.time()-self.startTime)/(self.duration-self.startPause-self.endPause)
+        self.textAlpha = (self.clock.time()-self.startTime)/(self.duration-self.startPause-self.endPause)
 
         # make the transparency decrease
         if self.direction==1:
@@ -179,7 +179,7 @@ class SmoothScroller(TextAnimBase):
 
             if self.scroller is None:
                 self.scroller = Scroller.Scroller(self.textBuffer,self.startPos,self.endPos,self.duration,
-                                                  Panel.Options)
+                                                  Panel.Options,clock=self.clock)
             self.scroller.start()
             self.init = False
 
@@ -229,7 +229,7 @@ class MoveTimed(TextAnimBase):
     def step(self):
 
         if self.init:
-            self.startTime=time.time()
+            self.startTime=self.clock.time()
             self.fgColor=self.getFgColor()
             self.origin = self.startPos
             self.multiColored=self.text.getMultiColored()
@@ -246,7 +246,7 @@ class MoveTimed(TextAnimBase):
         if self.endPaused(): return
 
         # how long since this animation started?
-        tElapsed=time.time()-self.startTime-self.startPause # begins after the startPause
+        tElapsed=self.clock.time()-self.startTime-self.startPause # begins after the startPause
 
         # animation has finished
         if tElapsed >= self.duration:
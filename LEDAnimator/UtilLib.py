@@ -8,20 +8,21 @@ Library with a variety of general purpose routines
 import numpy as np
 import time
 
-# alphaBlend sometimes throws a "RuntimeWarning: invalid value encountered in divide"
-# but still carries on without throwing an exception, the next line keeps it quiet
-np.seterr(divide='ignore', invalid='ignore')
-
 import BDF
 from Constants import *
+from Scratch import getScratch
 import cv2
 import colorsys
 
 def alphaBlend(fg, bg):
     """
-    Used internally by pasteWithAlphaAt() and alphaBlendPixel() but could be used externally
     blend two images based on the alpha channel. src (fg) and dst (bg) MUST be the same size.
 
+    This is the floating point reference version of alphaBlendInto() which pasteWithAlphaAt()
+    and alphaBlendPixel() use. It is kept for checking the fixed point results.
+
+    If PREMULTIPLIED (see Constants.py) the images are premultiplied and so is the result.
+
     :param numpy ndarray fg: foreground numpy image
     :param numpy ndarray bg: background numpy image
     :return: numpy ndarray blended images
@@ -52,6 +53,12 @@ def alphaBlend(fg, bg):
             return None
 
 
+    if PREMULTIPLIED:
+        # out=fg+bg*(1-fa) for all four channels
+        src = fg.astype(np.float32) / 255.0
+        dst = bg.astype(np.float32) / 255.0
+        return ((src + dst * (1.0 - src[..., ALPHA:ALPHA+1])) * 255).astype(np.uint8)
+
     src_rgb = fg[..., :3].astype(np.float32) / 255.0
     src_a = fg[..., 3].astype(np.float32) / 255.0
     dst_rgb = bg[..., :3].astype(np.float32) / 255.0
@@ -59,10 +66,10 @@ def alphaBlend(fg, bg):
 
     out_a = src_a + dst_a * (1.0 - src_a)
 
-    # sometimes throws a "RuntimeWarning: invalid value encountered in divide"
-    # but still carries on without throwing an exception
-    out_rgb = (src_rgb * src_a[..., None]
-               + dst_rgb * dst_a[..., None] * (1.0 - src_a[..., None])) / out_a[..., None]
+    # out_a is zero where both pixels are transparent
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out_rgb = (src_rgb * src_a[..., None]
+                   + dst_rgb * dst_a[..., None] * (1.0 - src_a[..., None])) / out_a[..., None]
 
     out = np.zeros_like(bg)
     out[..., :3] = out_rgb * 255
@@ -70,6 +77,226 @@ def alphaBlend(fg, bg):
 
     return out
 
+def _div255(x,pool):
+    """
+    divides a uint16 array by 255, rounding to nearest. Exact for 0 to 255*255.
+
+    :param numpy ndarray x: uint16 values, modified
+    :param ScratchPool pool: work arrays (see Scratch.py)
+    :return numpy ndarray: the result, a "div255" scratch array
+    """
+    # in place operations with a scalar are fast, array+=array isn't so the sum goes in another array
+    x+=128
+    shifted,y=pool.get("div255",(2,)+x.shape,np.uint16)
+    np.right_shift(x,8,out=shifted)
+    np.add(x,shifted,out=y)
+    y>>=8
+    return y
+
+def _alphaWeights(img,alphaWeight,pool):
+    """
+    spreads the alpha of each pixel across its colour channels
+
+    :param numpy ndarray img: (...,4) uint8 image
+    :param int alphaWeight: value for the alpha channel, or None to use the pixel alpha there too
+    :param ScratchPool pool: work arrays (see Scratch.py)
+    :return numpy ndarray: (...,4) uint8, the pixel alpha in the colour channels and alphaWeight in the alpha
+                           channel. A "weights" scratch array
+    """
+    if np.little_endian and ALPHA==3:
+        # one pixel as one uint32, alpha is the top byte
+        if not img.flags.c_contiguous:
+            px=pool.get("pixels",img.shape,np.uint8)
+            np.copyto(px,img)
+            img=px
+        a=np.right_shift(img.view(np.uint32),24,out=pool.get("weights",img.shape[:-1]+(1,),np.uint32))
+        if alphaWeight is None:
+            a*=0x01010101
+        else:
+            a*=0x010101
+            if alphaWeight: a|=alphaWeight<<24
+        return a.view(np.uint8)
+
+    w=pool.get("weights",img.shape,np.uint8)
+    for c in range(4):
+        w[..., c]=img[..., ALPHA] if c!=ALPHA or alphaWeight is None else alphaWeight
+    return w
+
+def premultiply(img):
+    """
+    converts a straight alpha image to premultiplied alpha, in place, by multiplying each colour
+    channel by the pixel alpha. Used when images are loaded and when colours are drawn if PREMULTIPLIED.
+
+    :param numpy ndarray img: (...,4) uint8 image, modified
+    :return numpy ndarray: img
+    """
+    pool=getScratch()
+    out=np.multiply(img,_alphaWeights(img,255,pool),out=pool.get("blend",img.shape,np.uint16),dtype=np.uint16)
+    np.copyto(img,_div255(out,pool),casting="unsafe")
+    return img
+
+def unpremultiply(img):
+    """
+    converts a premultiplied alpha image back to straight alpha, in place. Colours of fully
+    transparent pixels are lost, they become black.
+
+    :param numpy ndarray img: (...,4) uint8 image, modified
+    :return numpy ndarray: img
+    """
+    a=img[..., ALPHA].astype(np.uint32)
+    half=a>>1
+    div=np.maximum(a,1)
+
+    for c in range(4):
+        if c==ALPHA: continue
+        v=np.multiply(img[..., c],255,dtype=np.uint32)
+        img[..., c]=np.minimum(np.floor_divide(np.add(v,half),div),255)
+
+    return img
+
+def scaleOpacity(img,alpha):
+    """
+    multiplies the opacity of a premultiplied image by alpha/255. Every channel is scaled by the same
+    amount so it's a single multiply.
+
+    :param numpy ndarray img: (...,4) uint8 premultiplied image
+    :param int alpha: 0-255
+    :return numpy ndarray: a new image
+    """
+    pool=getScratch()
+    out=np.multiply(img,int(alpha),out=pool.get("blend",img.shape,np.uint16),dtype=np.uint16)
+    return _div255(out,pool).astype(np.uint8)
+
+def premultiplyColor(color):
+    """
+    :param tuple color: straight alpha (r,g,b,a) in Pixel order
+    :return tuple: the premultiplied colour
+    """
+    a=color[ALPHA]
+    return tuple(c if n==ALPHA else (c*a+127)//255 for n,c in enumerate(color))
+
+def unpremultiplyColor(color):
+    """
+    :param tuple color: premultiplied (r,g,b,a) in Pixel order
+    :return tuple: the straight alpha colour, black if the colour is transparent
+    """
+    a=int(color[ALPHA])
+    if a==0: return (0,0,0,0)
+    return tuple(a if n==ALPHA else min(255,(int(c)*255+a//2)//a) for n,c in enumerate(color))
+
+def alphaCoverage(img):
+    """
+    classifies an image by its alpha channel so that pasteWithAlphaAt() can skip the blend
+
+    :param numpy ndarray img: (...,4) uint8 image
+    :return int: OPAQUE_COVERAGE if every pixel has alpha 255, TRANSPARENT_COVERAGE if every pixel
+                 has alpha 0 otherwise MIXED_COVERAGE (see Constants.py)
+    """
+    if img.size==0: return TRANSPARENT_COVERAGE
+
+    if np.little_endian and ALPHA==3 and img.flags.c_contiguous:
+        # one pixel as one uint32, alpha is the top byte. Quicker than reading every 4th byte
+        px=img.view(np.uint32)
+        if px.min()>=0xff000000: return OPAQUE_COVERAGE
+        if px.max()<=0x00ffffff: return TRANSPARENT_COVERAGE
+        return MIXED_COVERAGE
+
+    a=img[..., ALPHA]
+    lo=a.min()
+    if lo==255: return OPAQUE_COVERAGE
+    if lo==0 and a.max()==0: return TRANSPARENT_COVERAGE
+    return MIXED_COVERAGE
+
+def alphaBlendInto(fg, bg, premultiplied=None):
+    """
+    blend fg over bg based on the alpha channel using integer arithmetic, writing the result
+    into bg. src (fg) and dst (bg) MUST be the same size. bg is usually a slice (ROI) of a bigger image.
+
+    Gives the same result as alphaBlend(), rounded to the nearest value instead of truncated.
+
+    When bg is opaque, as the Panel frameBuffer is, or the images are PREMULTIPLIED (see Constants.py)
+    the blend is done in uint16 with no division. Otherwise the general "over" is done in uint32.
+
+    The working arrays come from the thread's ScratchPool (see Scratch.py) so, once they have grown
+    to the largest image blended, nothing is allocated.
+
+    :param numpy ndarray fg: foreground numpy image, uint8
+    :param numpy ndarray bg: background numpy image, uint8, modified in place
+    :param bool premultiplied: True if the images are premultiplied, default PREMULTIPLIED
+    :return: numpy ndarray bg or None if the images can't be blended
+    """
+    if fg.shape<>bg.shape:
+        print "UtilLib.alphaBlendInto() images not the same shape. Ignored. fg", fg.shape, "bg", bg.shape
+        return None
+
+    # cannot blend images which have a zero width or height
+    if fg.size==0:
+        print "UtilLib.alphaBlendInto() image has a zero dimension. Ignored"
+        return None
+
+    result=bg
+    if fg.ndim==1:
+        # a single pixel, treated as a list of one so that the arithmetic stays in arrays
+        fg,bg=fg.reshape(1,-1),bg.reshape(1,-1)
+
+    if premultiplied is None: premultiplied=PREMULTIPLIED
+
+    # no output array is ever one of the inputs, numpy is much slower when they overlap.
+    # The work arrays for each case are one scratch array, unpacked, to save looking up each one
+    pool=getScratch()
+    shape=fg.shape
+
+    if premultiplied:
+        # out=fg + bg*(255-fa)/255 for all four channels, whatever the background
+        bgw,out=pool.get("blendPremultiplied",(2,)+shape,np.uint16)
+        w=_alphaWeights(fg,None,pool)
+        w=np.subtract(255,w,out=w)
+        np.multiply(bg,w,out=bgw,dtype=np.uint16)
+        np.add(fg,_div255(bgw,pool),out=out)
+        np.copyto(bg,np.minimum(out,255,out=out),casting="unsafe")
+        return result
+
+    if bg[..., ALPHA].min()==255:
+        # opaque background: out=(fg*fa + bg*(255-fa))/255
+        # the weights are 0 in the alpha channel so the alpha stays at 255
+        fgw,bgw,out=pool.get("blendOpaque",(3,)+shape,np.uint16)
+        w=_alphaWeights(fg,0,pool)
+        np.multiply(fg,w,out=fgw,dtype=np.uint16)
+        w=np.subtract(255,w,out=w)
+        np.multiply(bg,w,out=bgw,dtype=np.uint16)
+        np.add(fgw,bgw,out=out)
+        np.copyto(bg,_div255(out,pool),casting="unsafe")
+        return result
+
+    # general case, out_a*255 = fa*255 + ba*(255-fa)
+    fa,ia,den,half,div,v1,v2,v3=pool.get("blendOver",(8,)+shape[:-1],np.uint32)
+    # the uint8 channels are copied into the uint32 work arrays before the arithmetic, mixing the
+    # types makes numpy allocate buffers to cast them in
+    np.copyto(fa,fg[..., ALPHA])
+    np.subtract(255,fa,out=v1)
+    np.copyto(v2,bg[..., ALPHA])
+    np.multiply(v2,v1,out=ia)
+    fa*=255
+    np.add(fa,ia,out=den)
+    np.right_shift(den,1,out=half)
+    np.maximum(den,1,out=div)
+
+    for c in range(4):
+        if c==ALPHA: continue
+        # round to nearest. den is only zero where the sum is also zero
+        np.copyto(v3,fg[..., c])
+        np.multiply(v3,fa,out=v1)
+        np.copyto(v3,bg[..., c])
+        np.multiply(v3,ia,out=v2)
+        np.add(v1,v2,out=v3)
+        np.add(v3,half,out=v1)
+        bg[..., c]=np.floor_divide(v1,div,out=v2)
+
+    den+=127
+    den//=255
+    bg[..., ALPHA]=den
+    return result
+
 def alphaBlendPixels(fg, bg):
     """
     Used internally by pasteWithAlphaAt() and alphaBlendPixel() but could be used externally
@@ -79,6 +306,11 @@ def alphaBlendPixels(fg, bg):
     :param tuple bg: background rgba
     :return tuple: rgba blended pixel
     """
+    if PREMULTIPLIED:
+        # out=fg+bg*(1-fa)
+        ia=255-int(fg[ALPHA])
+        return tuple(int(f)+(int(b)*ia+127)//255 for f,b in zip(fg,bg))
+
     fg=[i/255.0 for i in fg]
     bg=[i/255.0 for i in bg]
 
@@ -110,9 +342,9 @@ def alphaBlendPixel(fg, bg):
     if type(fg) is tuple:
         return alphaBlendPixels(fg, bg)
     else:
-        return alphaBlend(fg,bg)
+        return alphaBlendInto(np.asarray(fg,dtype=np.uint8),np.array(bg,dtype=np.uint8))
 
-def pasteWithAlphaAt(bg, bx, by, fg):
+def pasteWithAlphaAt(bg, bx, by, fg, premultiplied=None, coverage=None):
     """
     Pastes fg into bg using alpha channel.
 
@@ -121,10 +353,16 @@ def pasteWithAlphaAt(bg, bx, by, fg):
     If fg is pasted into bg, returns the next Z position - useful
     for butting images together like when drawing text glyphs
 
+    The part of fg which overlaps bg is copied if it is opaque and skipped if it is transparent,
+    only a mix of the two is blended. Pass the coverage of the whole of fg, if it is known
+    (see NumpyImage.getCoverage()), to save looking at the alpha channel again.
+
     :param numpy ndarray bg: background image
     :param float bx: coordinate of top left corner for fg on bg
     :param float by: coordinate of top left corner for fg on bg
     :param numpy ndarray fg: image to paste into bg
+    :param bool premultiplied: True if the images are premultiplied, default PREMULTIPLIED (see Constants.py)
+    :param int coverage: alphaCoverage() of fg, default work it out for the overlap
     :return int : next x position (used for character strings)
     """
 
@@ -145,23 +383,92 @@ def pasteWithAlphaAt(bg, bx, by, fg):
         #print "UtilLib.pasteWithAlpha() ROI is None,bx,by=",bx,by,"fg shape=",fg.shape
         return bx
 
-    blend=alphaBlend(fgROI,bgROI)
-
-    if blend is None:
-        #print "UtilLib.pasteWithAlpha() Blend is None"
-        return bx
-
-    # copy blend output to background
-    bgROI[:,:,:]=blend[:,:,:]
+    # a mixed image can still be all one or the other where it overlaps
+    if coverage is None or (coverage==MIXED_COVERAGE and fgROI.shape!=fg.shape):
+        coverage=alphaCoverage(fgROI)
 
-    #cv2.imshow("blend",blend)
+    if coverage==OPAQUE_COVERAGE:
+        # covers the background completely, whatever the alpha format
+        np.copyto(bgROI,fgROI)
+    elif coverage==MIXED_COVERAGE:
+        # blends straight into the background
+        blend=alphaBlendInto(fgROI,bgROI,premultiplied)
 
-    h,w=fg.shape[:2]
+        if blend is None:
+            #print "UtilLib.pasteWithAlpha() Blend is None"
+            return bx
 
     # value used fior font rendering, ignored at other times
     return bx+w
 
 
+# for each sixth of the hue circle which of v,p,q,t (see hsvToRgbInto()) the red, green and blue
+# channels take. The same sums as matplotlib's hsv_to_rgb() so the results are identical
+_HSV_CHOICES=np.array([[0,2,1,1,3,0],     # red
+                       [3,0,0,2,1,1],     # green
+                       [1,1,3,0,0,2]],    # blue
+                      dtype=np.intp)
+
+def hsvToRgbInto(hsv,rgb):
+    """
+    converts HSV colours to RGB writing them into rgb without allocating any arrays, the work
+    arrays come from the ScratchPool. Gives exactly the same values as matplotlib's hsv_to_rgb()
+    which makes a dozen temporary arrays each call.
+
+    rgb may be hsv, the conversion is then done in place.
+
+    :param numpy ndarray hsv: (n,3) float array h,s,v each 0->1.0
+    :param numpy ndarray rgb: (n,3) float array for the result, 0->1.0
+    :return numpy ndarray: rgb
+    """
+    pool=getScratch()
+    n=hsv.shape[0]
+    h,s,v=hsv[:,0],hsv[:,1],hsv[:,2]
+
+    # sector is the sixth of the hue circle, f how far through it
+    h6=np.multiply(h,6.0,out=pool.get("hsvH6",(n,),hsv.dtype))
+    whole=np.trunc(h6,out=pool.get("hsvWhole",(n,),hsv.dtype))
+    sector=pool.get("hsvSector",(n,),np.intp)
+    np.copyto(sector,whole,casting="unsafe")
+    f=np.subtract(h6,whole,out=pool.get("hsvFraction",(n,),hsv.dtype))
+
+    # the four values a channel can take: v, p=v*(1-s), q=v*(1-s*f), t=v*(1-s*(1-f))
+    vpqt=pool.get("hsvVPQT",(4,n),hsv.dtype)
+    work=pool.get("hsvWork",(n,),hsv.dtype)
+    np.copyto(vpqt[0],v)
+    np.subtract(1.0,s,out=work)
+    np.multiply(v,work,out=vpqt[1])
+    np.multiply(s,f,out=work)
+    np.subtract(1.0,work,out=work)
+    np.multiply(v,work,out=vpqt[2])
+    np.subtract(1.0,f,out=work)
+    np.multiply(s,work,out=work)
+    np.subtract(1.0,work,out=work)
+    np.multiply(v,work,out=vpqt[3])
+
+    # pick each channel's value by its index in the flattened vpqt. np.choose() would be neater
+    # but it allocates. take() wants a contiguous out so the channels are copied to rgb afterwards
+    index=pool.get("hsvIndex",(n,),np.intp)
+    channels=pool.get("hsvChannels",(3,n),hsv.dtype)
+    for c in range(3):
+        np.take(_HSV_CHOICES[c],sector,out=index,mode="wrap")
+        index*=n
+        index+=_columns(n)
+        np.take(vpqt.reshape(-1),index,out=channels[c],mode="clip")
+
+    np.copyto(rgb,channels.T)
+    return rgb
+
+_columnIndex=np.arange(0,dtype=np.intp)
+
+def _columns(n):
+    """
+    :return numpy ndarray: np.arange(n), kept from one call to the next
+    """
+    global _columnIndex
+    if len(_columnIndex)<n: _columnIndex=np.arange(n,dtype=np.intp)
+    return _columnIndex[:n]
+
 def getActualBrightness(wanted):
     """
     Human preceived brightness follows, roughly, a square law. So, to get 50% brightness
@@ -357,23 +664,4 @@ def adjustTupleBrightnessAndAlpha(color=None,brightness=1.0,alpha=1.0):
     h,s,v=colorsys.rgb_to_hsv(color[RGB_R]/255.0,color[RGB_G]/255.0,color[RGB_B]/255.0)
     v=v*brightness
     r, g, b = colorsys.hsv_to_rgb(h, s, v)
-    color = (uint8(r), uint8(g), uint8(b), uint8(alpha))
-
-    return (color[RGB_R], color[RGB_G], color[RGB_B], color[ALPHA])
-
-def channelSwap(color):
-    """
-    swaps the red and blue channels for simulator use
-    since openCV uses BGR images and PIL uses RGB
-
-    See Constants.py for RGB_R and RGB_B values
-
-    :param tuple color: (R,G,B,A)
-    :return: (r,g,b,a) r&b swapped if required
-    """
-
-    if RGB_R==0: return color
-
-    # R & B are swapped
-    R, G, B,A = color[RGB_R], color[RGB_G], color[RGB_B], color[ALPHA]
-    return (R, G, B,A)
+    return (uint8(r), uint8(g), uint8(b), uint8(alpha))
@@ -0,0 +1,352 @@
+"""
+bench.py
+
+Headless benchmark of every animation class across panel sizes.
+
+Each animation class in ChainAnimations, ImageAnimations, PanelAnimations and TextAnimations is
+run on its own, without a matrix or simulator, on each of the requested panel geometries. The
+frames are rendered by the OfflineRenderer so the animations are stepped as fast as possible and
+nothing waits for the display.
+
+For each class and geometry the results are:-
+
+    fps             frames rendered per second of wall clock time
+    cpuPerFrame     CPU seconds (user+system) per frame
+    wallPerFrame    wall clock seconds per frame
+    peakMemoryKB    peak resident memory of the process which ran the case (None on Windows)
+    p99FrameTime    99th percentile of the frame.busy time (see Telemetry.py)
+
+Each case is run in its own forked process (where fork() is available) so the peak memory
+belongs to that case alone and a crashing animation doesn't stop the benchmark.
+
+Usage, from the LEDAnimator folder so that Constants.py can find the Fonts folder next door:-
+
+    python bench.py
+    python bench.py --geometries 64x64,256x128 --modules chain,image --output bench.json
+    python bench.py --classes Sparkle,Dissolve --frames 500
+
+or as a module, which needs the folder above on the python path:-
+
+    PYTHONPATH=.. python -m LEDAnimator.bench --output bench.json
+
+The JSON written is:-
+
+    {"settings":{...},
+     "results":[{"module":"ChainAnimations","class":"Sparkle","geometry":"64x64","fps":..., ...},...]}
+
+Cases which failed have an "error" entry instead of the timings.
+
+Geometries are WIDTHxHEIGHT. Both must be multiples of the same panel row count (32 by default).
+
+"""
+
+import os
+import sys
+import json
+import time
+import inspect
+import argparse
+import traceback
+import multiprocessing
+
+try:
+    import resource     # not available on Windows
+except ImportError:
+    resource=None
+
+GEOMETRIES=["32x32","64x64","128x64","256x128"]
+MODULES=["chain","image","panel","text"]
+
+MODULE_NAMES={"chain":"ChainAnimations",
+              "image":"ImageAnimations",
+              "panel":"PanelAnimations",
+              "text":"TextAnimations"}
+
+# classes which cannot be benchmarked headless
+SKIPPED={"SmoothScroller":"draws from its own real-time thread"}
+
+ROOT=os.path.abspath(os.path.join(os.path.dirname(__file__),os.pardir))
+BENCH_IMAGE=os.path.join(ROOT,"Images","tulips.jpg")
+BENCH_TEXT="Benchmark text 12345"
+
+
+def parseGeometry(geometry,rows=32):
+    """
+    converts WIDTHxHEIGHT to Panel.init() options
+
+    :param str geometry: e.g. "128x64"
+    :param int rows: rows in each panel
+    :return dict: rows, chain_length and parallel
+    :raises ValueError: if the size is not made of whole panels
+    """
+    w,h=[int(v) for v in geometry.lower().split("x")]
+    if w%rows or h%rows:
+        raise ValueError("geometry "+geometry+" is not a multiple of "+str(rows)+" rows")
+    return {"rows":rows,"chain_length":w//rows,"parallel":h//rows}
+
+
+def cpuTime():
+    """
+    :return float: CPU seconds (user+system) used by this process
+    """
+    if resource is None: return time.clock()
+    r=resource.getrusage(resource.RUSAGE_SELF)
+    return r.ru_utime+r.ru_stime
+
+
+def peakMemory():
+    """
+    :return int: peak resident memory of this process in KB, None if unknown
+    """
+    if resource is None: return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def getAnimationClasses(moduleKey):
+    """
+    finds the animation classes defined in a module
+
+    :param str moduleKey: "chain","image","panel" or "text"
+    :return list: (name,class) pairs in source order
+    """
+    module=__import__("LEDAnimator."+MODULE_NAMES[moduleKey],fromlist=["*"])
+    from LEDAnimator.AnimBase import AnimBase
+
+    classes=[(name,cls) for name,cls in inspect.getmembers(module,inspect.isclass)
+             if issubclass(cls,AnimBase) and cls.__module__==module.__name__]
+
+    classes.sort(key=lambda c:inspect.getsourcelines(c[1])[1])
+    return classes
+
+
+def makeLayer(moduleKey,cls,fps,duration):
+    """
+    creates an animation with the parameters its module needs
+
+    :param str moduleKey: "chain","image","panel" or "text"
+    :param class cls: the animation class
+    :param int fps: animation fps
+    :param float duration: animation duration, longer than the benchmark so it doesn't restart
+    :return dict: addAnimation() parameters
+    """
+    import LEDAnimator.Panel as Panel
+    from LEDAnimator import Palette
+    from LEDAnimator.AnimSequence import AnimSequence
+    from LEDAnimator.Chain import Chain
+    from LEDAnimator.Image import Image
+    from LEDAnimator.Text import Text
+    from LEDAnimator.Helpers.Chains import makeRect
+
+    params={"duration":duration,"fps":fps,"palette":Palette.XMAS}
+    layer={}
+
+    if moduleKey=="chain":
+        # every LED on the panel
+        layer["chain"]=Chain(makeRect(0,0,Panel.width,Panel.height,"H"))
+
+    elif moduleKey=="image":
+        params["fgImage"]=Image(imagePath=BENCH_IMAGE,scaleMode="F",alignMode=("C","C"))
+
+    elif moduleKey=="panel":
+        # Line and PolyLines need something to draw, the rest ignore these
+        w,h=Panel.width-1,Panel.height-1
+        params["fromXY"]=(0,0)
+        params["toXY"]=(w,h)
+        params["points"]=[(0,0),(w,0),(w,h),(0,h)]
+
+    elif moduleKey=="text":
+        params["text"]=Text(text=BENCH_TEXT,fontSize=12,fontFace="BDF",fgColor=Palette.XMAS)
+        params["startPos"]=(Panel.width,Panel.height//2)
+        params["endPos"]=(-Panel.width,Panel.height//2)
+
+    layer["seq"]=AnimSequence([cls(**params)])
+    return layer
+
+
+def runCase(moduleKey,name,geometry,options):
+    """
+    benchmarks one animation class on one panel geometry in the current process
+
+    :param str moduleKey: "chain","image","panel" or "text"
+    :param str name: animation class name
+    :param str geometry: WIDTHxHEIGHT
+    :param dict options: frames, fps, maxSeconds, seed, rows
+    :return dict: the result
+    """
+    import LEDAnimator.Panel as Panel
+    from LEDAnimator.Animator import Animator
+    from LEDAnimator.OfflineRenderer import OfflineRenderer
+
+    result={"module":MODULE_NAMES[moduleKey],"class":name,"geometry":geometry}
+
+    try:
+        Panel.init(headless=True,**parseGeometry(geometry,options["rows"]))
+
+        cls=dict(getAnimationClasses(moduleKey))[name]
+        fps=options["fps"]
+
+        A=Animator(fps=fps,seed=options["seed"])
+        A.addAnimation(**makeLayer(moduleKey,cls,fps,duration=10.0*options["frames"]/fps+1))
+
+        R=OfflineRenderer(animator=A)
+
+        # first frames load images, fonts etc
+        R.render(frames=2)
+        A.resetStats()
+
+        # render in batches until the frame count or the time limit is reached
+        frames=0
+        batch=max(1,options["frames"]//10)
+        c0=cpuTime()
+        t0=time.time()
+
+        R.reset=False
+        while frames<options["frames"] and (time.time()-t0)<options["maxSeconds"]:
+            R.render(frames=min(batch,options["frames"]-frames))
+            frames+=R.framesRendered
+
+        wall=time.time()-t0
+        cpu=cpuTime()-c0
+
+        busy=A.stats().get("frame.busy",{})
+
+        result.update({"frames":frames,
+                       "fps":frames/wall if wall>0 else None,
+                       "wallPerFrame":wall/frames,
+                       "cpuPerFrame":cpu/frames,
+                       "p99FrameTime":busy.get("p99"),
+                       "peakMemoryKB":peakMemory()})
+
+    except Exception:
+        result["error"]=traceback.format_exc()
+
+    return result
+
+
+def _caseWorker(conn,args):
+    """
+    runs a case in a forked process and sends the result back
+
+    :param Connection conn: pipe to the parent
+    :param tuple args: runCase() arguments
+    :return None:
+    """
+    try:
+        conn.send(runCase(*args))
+    finally:
+        conn.close()
+
+
+def runIsolated(moduleKey,name,geometry,options):
+    """
+    runs a case in its own process so that its peak memory and any crash are its own
+
+    :return dict: the result
+    """
+    if not hasattr(os,"fork"):
+        return runCase(moduleKey,name,geometry,options)
+
+    conn,child=multiprocessing.Pipe(duplex=False)
+    proc=multiprocessing.Process(target=_caseWorker,args=(child,(moduleKey,name,geometry,options)))
+    proc.start()
+    child.close()
+
+    try:
+        result=conn.recv()
+    except EOFError:
+        result={"module":MODULE_NAMES[moduleKey],"class":name,"geometry":geometry,
+                "error":"benchmark process exited with code "+str(proc.exitcode)}
+    proc.join()
+    return result
+
+
+def runBenchmark(geometries=GEOMETRIES,modules=MODULES,classes=None,frames=200,fps=100,maxSeconds=10.0,
+                 seed=1,rows=32,isolate=True,verbose=True):
+    """
+    benchmarks every animation class in the modules on every geometry
+
+    :param list geometries: WIDTHxHEIGHT strings
+    :param list modules: any of "chain","image","panel","text"
+    :param list classes: class names to run, None for all
+    :param int frames: frames rendered per case
+    :param int fps: animation fps. Animations are stepped at 1/fps intervals of animation time
+    :param float maxSeconds: a case stops early if it takes longer than this
+    :param int seed: random number seed so runs can be compared
+    :param int rows: rows in each panel, geometries must be multiples of this
+    :param bool isolate: run each case in its own process
+    :param bool verbose: print progress to stderr
+    :return dict: settings and results, see above
+    """
+    options={"frames":frames,"fps":fps,"maxSeconds":maxSeconds,"seed":seed,"rows":rows}
+    results=[]
+
+    for moduleKey in modules:
+        for name,cls in getAnimationClasses(moduleKey):
+            if classes is not None and name not in classes: continue
+
+            for geometry in geometries:
+                if name in SKIPPED:
+                    result={"module":MODULE_NAMES[moduleKey],"class":name,"geometry":geometry,
+                            "skipped":SKIPPED[name]}
+                elif isolate:
+                    result=runIsolated(moduleKey,name,geometry,options)
+                else:
+                    result=runCase(moduleKey,name,geometry,options)
+
+                results.append(result)
+
+                if verbose:
+                    if "fps" in result:
+                        status="%.1f fps" % result["fps"]
+                    else:
+                        status=result.get("skipped") or "error"
+                    print >>sys.stderr,"bench: %s.%s %s %s" % (result["module"],name,geometry,status)
+
+    settings=dict(options)
+    settings["geometries"]=list(geometries)
+    settings["modules"]=list(modules)
+
+    return {"settings":settings,"results":results}
+
+
+def main(argv=None):
+    parser=argparse.ArgumentParser(description="Headless benchmark of the LEDAnimator animation classes.")
+    parser.add_argument("--geometries",default=",".join(GEOMETRIES),help="comma separated WIDTHxHEIGHT list")
+    parser.add_argument("--modules",default=",".join(MODULES),help="comma separated list of "+",".join(MODULES))
+    parser.add_argument("--classes",default=None,help="comma separated class names, default all")
+    parser.add_argument("--frames",type=int,default=200,help="frames per case")
+    parser.add_argument("--fps",type=int,default=100,help="animation fps")
+    parser.add_argument("--max-seconds",type=float,default=10.0,help="time limit per case")
+    parser.add_argument("--seed",type=int,default=1,help="random number seed")
+    parser.add_argument("--rows",type=int,default=32,help="rows in each panel")
+    parser.add_argument("--no-isolate",action="store_true",help="run all cases in this process")
+    parser.add_argument("--output",default=None,help="JSON file, default stdout")
+    args=parser.parse_args(argv)
+
+    # keep stdout for the JSON
+    realStdout=sys.stdout
+    sys.stdout=sys.stderr
+
+    try:
+        report=runBenchmark(geometries=args.geometries.split(","),
+                            modules=args.modules.split(","),
+                            classes=args.classes.split(",") if args.classes else None,
+                            frames=args.frames,fps=args.fps,maxSeconds=args.max_seconds,
+                            seed=args.seed,rows=args.rows,isolate=not args.no_isolate)
+    finally:
+        sys.stdout=realStdout
+
+    if args.output is None:
+        json.dump(report,sys.stdout,indent=2,sort_keys=True)
+        sys.stdout.write("\n")
+    else:
+        with open(args.output,"w") as f:
+            json.dump(report,f,indent=2,sort_keys=True)
+
+    return 0
+
+
+if __name__=="__main__":
+    # run as a script the LEDAnimator package is found in the folder above this one
+    sys.path.insert(0,os.path.abspath(os.path.join(os.path.dirname(__file__),os.pardir)))
+    sys.exit(main())
@@ -0,0 +1,404 @@
+"""
+microbench.py
+
+Micro-benchmarks for the compositing kernels, with a saved baseline and regression check.
+
+The kernels which every frame depends on are timed on their own, on representative shapes:-
+
+    pixel       a single pixel
+    chain500    a chain (or pixel list) of 500 LEDs
+    64x64       a full 64x64 layer
+    256x256     a full 256x256 layer
+
+Kernels:-
+
+    alphaBlend          UtilLib.alphaBlend() - the floating point reference
+    alphaBlendInto      UtilLib.alphaBlendInto() - fixed point, onto an opaque background
+    pasteWithAlphaAt    UtilLib.pasteWithAlphaAt() - fg the size of the shape pasted onto a layer
+    pasteOpaque         UtilLib.pasteWithAlphaAt() - an opaque fg, like a loaded photo, which is copied
+    getOverlapSlices    UtilLib.getOverlapSlices() - fg hanging over the top left corner
+    getAllPixels        Chain.getAllPixels()
+    setPixel            NumpyImage.setPixel() - a colour tuple for one pixel otherwise arrays
+    numpyEnlarge        Simulator RGBMatrix.numpyEnlarge() - skipped if the Simulator can't be imported
+
+Each kernel is called enough times to take at least minTime seconds, repeated several times and
+the median repeat is reported as seconds per call. The inputs are made with a fixed seed.
+
+The kernels take their work arrays from Scratch.py. The number of scratch buffers allocated
+whilst a kernel is being timed, after its first call, is reported as well. It should be 0, a
+kernel which keeps allocating is reported by --compare whatever the baseline says.
+
+Usage, from the LEDAnimator folder so that Constants.py can find the Fonts folder next door:-
+
+    python microbench.py --save microbench_baseline.json       # record a baseline
+    python microbench.py --compare microbench_baseline.json    # check for regressions
+
+or as a module, which needs the folder above on the python path:-
+
+    PYTHONPATH=.. python -m LEDAnimator.microbench --compare microbench_baseline.json
+
+--compare exits with status 1 if any kernel is slower than the baseline by more than the
+threshold (default 0.25 i.e. 25%) and by more than min-delta seconds (default 2us), so the
+noise on kernels which take a few microseconds isn't reported. A kernel which looks slower is
+timed again, retries times, and only reported if it is still slower every time. Baselines only
+make sense on the machine they were recorded on so they are not kept in the repository.
+
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import numpy as np
+
+SHAPES=["pixel","chain500","64x64","256x256"]
+
+DEFAULT_THRESHOLD=0.25     # fractional slow down allowed by --compare
+DEFAULT_MIN_DELTA=2e-6      # seconds per call, smaller slow downs are noise
+DEFAULT_REPEATS=9           # repeats timed, the median is used
+DEFAULT_RETRIES=2           # times a suspected regression is timed again
+
+
+def _rgba(rng,shape):
+    """
+    :return numpy ndarray: random uint8 pixels, of the given shape, with a random alpha
+    """
+    return rng.randint(0,256,shape).astype(np.uint8)
+
+
+def _layerSize(shape):
+    """
+    :return tuple: (height,width) of the layer used for a shape
+    """
+    if shape=="256x256": return 256,256
+    return 64,64
+
+
+def setupAlphaBlend(shape,rng):
+    from LEDAnimator.UtilLib import alphaBlend
+
+    size={"pixel":(4,),"chain500":(500,4),"64x64":(64,64,4),"256x256":(256,256,4)}[shape]
+    fg=_rgba(rng,size)
+    bg=_rgba(rng,size)
+    return lambda:alphaBlend(fg,bg)
+
+
+def setupAlphaBlendInto(shape,rng):
+    from LEDAnimator.UtilLib import alphaBlendInto
+
+    size={"pixel":(4,),"chain500":(500,4),"64x64":(64,64,4),"256x256":(256,256,4)}[shape]
+    fg=_rgba(rng,size)
+    bg=_rgba(rng,size)
+    bg[...,3]=255   # like the Panel frameBuffer
+    return lambda:alphaBlendInto(fg,bg)
+
+
+def setupPasteWithAlphaAt(shape,rng):
+    from LEDAnimator.UtilLib import pasteWithAlphaAt
+
+    h,w=_layerSize(shape)
+    bg=_rgba(rng,(h,w,4))
+    size={"pixel":(1,1,4),"chain500":(1,500,4),"64x64":(64,64,4),"256x256":(256,256,4)}[shape]
+    fg=_rgba(rng,size)
+
+    if shape=="chain500":
+        # a 500 LED strip wrapped onto the layer, one row at a time like text glyphs
+        rows=[fg[:,x:x+w] for x in range(0,500,w)]
+        def paste():
+            for n,row in enumerate(rows):
+                pasteWithAlphaAt(bg,0,n,row)
+        return paste
+
+    return lambda:pasteWithAlphaAt(bg,0,0,fg)
+
+
+def setupPasteOpaque(shape,rng):
+    from LEDAnimator.UtilLib import pasteWithAlphaAt
+
+    h,w=_layerSize(shape)
+    bg=_rgba(rng,(h,w,4))
+    size={"pixel":(1,1,4),"chain500":(1,500,4),"64x64":(64,64,4),"256x256":(256,256,4)}[shape]
+    fg=_rgba(rng,size)
+    fg[...,3]=255
+    return lambda:pasteWithAlphaAt(bg,0,0,fg)
+
+
+def setupGetOverlapSlices(shape,rng):
+    from LEDAnimator.UtilLib import getOverlapSlices
+
+    h,w=_layerSize(shape)
+    bg=_rgba(rng,(h,w,4))
+    size={"pixel":(1,1,4),"chain500":(1,500,4),"64x64":(64,64,4),"256x256":(256,256,4)}[shape]
+    fg=_rgba(rng,size)
+    return lambda:getOverlapSlices(bg,-1 if shape!="pixel" else 0,-1 if shape!="pixel" else 0,fg)
+
+
+def setupGetAllPixels(shape,rng):
+    from LEDAnimator.Chain import Chain
+    from LEDAnimator.Helpers.Chains import makeRect
+
+    if shape=="pixel":
+        xy=[(0,0)]
+    elif shape=="chain500":
+        xy=[(x%64,x//64) for x in range(500)]
+    else:
+        h,w=_layerSize(shape)
+        xy=makeRect(0,0,w,h,"H")
+
+    chain=Chain(xy)
+    chain.setAllPixelsRandom(rng)
+    return lambda:chain.getAllPixels()
+
+
+def setupSetPixel(shape,rng):
+    from LEDAnimator.NumpyImage import NumpyImage
+
+    h,w=_layerSize(shape)
+    img=NumpyImage(width=w,height=h)
+
+    if shape=="pixel":
+        color=tuple(int(c) for c in _rgba(rng,(4,)))
+        return lambda:img.setPixel(1,1,color)
+
+    n=500 if shape=="chain500" else w*h
+    x=np.arange(n)%w
+    y=np.arange(n)//w
+    colors=_rgba(rng,(n,4))
+    return lambda:img.setPixel(x,y,colors)
+
+
+def setupNumpyEnlarge(shape,rng):
+    from Simulator.RGBMatrix import RGBMatrix
+
+    if shape=="pixel":
+        img=_rgba(rng,(1,1,4))
+    elif shape=="chain500":
+        return None
+    else:
+        img=_rgba(rng,_layerSize(shape)+(4,))
+
+    scale=4 if shape!="256x256" else 2
+    h,w=img.shape[:2]
+
+    # don't run __init__, it opens the simulator window
+    matrix=RGBMatrix.__new__(RGBMatrix)
+    matrix.frameBuffer=np.zeros((h*scale,w*scale,3),dtype=np.uint8)
+    return lambda:matrix.numpyEnlarge(img,scale)
+
+
+KERNELS=[("alphaBlend",setupAlphaBlend),
+         ("alphaBlendInto",setupAlphaBlendInto),
+         ("pasteWithAlphaAt",setupPasteWithAlphaAt),
+         ("pasteOpaque",setupPasteOpaque),
+         ("getOverlapSlices",setupGetOverlapSlices),
+         ("getAllPixels",setupGetAllPixels),
+         ("setPixel",setupSetPixel),
+         ("numpyEnlarge",setupNumpyEnlarge)]
+
+
+def median(values):
+    """
+    :param list values: numbers
+    :return float: the middle value, or the mean of the middle two
+    """
+    values=sorted(values)
+    n=len(values)
+    if n%2: return values[n//2]
+    return (values[n//2-1]+values[n//2])/2.0
+
+
+def timeCall(func,minTime=0.05,repeats=DEFAULT_REPEATS):
+    """
+    times a function like timeit but chooses the number of calls itself. The median repeat is used,
+    the fastest is too easily a lucky one and the mean is pulled about by the odd slow one.
+
+    :param function func: called with no arguments
+    :param float minTime: each repeat runs for at least this many seconds
+    :param int repeats: number of repeats, the median is used
+    :return float: seconds per call
+    """
+    # how many calls take minTime?
+    number=1
+    while True:
+        t0=time.time()
+        for n in xrange(number): func()
+        elapsed=time.time()-t0
+        if elapsed>=minTime: break
+        number*=10 if elapsed<minTime/10 else 2
+
+    times=[elapsed/number]
+    for r in range(repeats-1):
+        t0=time.time()
+        for n in xrange(number): func()
+        times.append((time.time()-t0)/number)
+
+    return median(times)
+
+
+def runKernels(kernels=None,shapes=SHAPES,minTime=0.05,repeats=DEFAULT_REPEATS,seed=1,verbose=True,allocations=None):
+    """
+    times the kernels
+
+    :param list kernels: kernel names, None for all
+    :param list shapes: shape names
+    :param float minTime: see timeCall()
+    :param int repeats: see timeCall()
+    :param int seed: seed for the input data
+    :param bool verbose: print each result to stderr
+    :param dict allocations: if given "kernel/shape" -> scratch buffers allocated after the first call
+    :return dict: "kernel/shape" -> seconds per call
+    """
+    from LEDAnimator.Scratch import getScratchStats
+
+    results={}
+
+    for name,setup in KERNELS:
+        if kernels is not None and name not in kernels: continue
+
+        for shape in shapes:
+            try:
+                func=setup(shape,np.random.RandomState(seed))
+            except ImportError as e:
+                if verbose: print >>sys.stderr,"microbench: %s skipped (%s)" % (name,e)
+                break
+
+            if func is None: continue   # shape doesn't apply to this kernel
+
+            func()  # first call may allocate/cache
+            before=getScratchStats()["allocations"]
+            seconds=timeCall(func,minTime,repeats)
+            allocated=getScratchStats()["allocations"]-before
+            results[name+"/"+shape]=seconds
+            if allocations is not None: allocations[name+"/"+shape]=allocated
+
+            if verbose: print >>sys.stderr,"microbench: %-30s %12.3f us %4d allocations" % \
+                                           (name+"/"+shape,seconds*1e6,allocated)
+
+    return results
+
+
+def compare(results,baseline,threshold=DEFAULT_THRESHOLD,minDelta=DEFAULT_MIN_DELTA):
+    """
+    compares results with a baseline
+
+    :param dict results: from runKernels()
+    :param dict baseline: a saved report (see main()) or runKernels() results
+    :param float threshold: fractional slow down allowed e.g. 0.25 is 25%
+    :param float minDelta: seconds per call a kernel must also be slower by to count
+    :return list: (key,baseline seconds,seconds,ratio) for each regression
+    """
+    base=baseline.get("results",baseline)
+    regressions=[]
+
+    for key,seconds in sorted(results.iteritems()):
+        if key not in base: continue
+        ratio=seconds/base[key] if base[key]>0 else 1.0
+        if ratio>1.0+threshold and seconds-base[key]>minDelta:
+            regressions.append((key,base[key],seconds,ratio))
+
+    return regressions
+
+
+def retime(keys,retries=DEFAULT_RETRIES,minTime=0.05,repeats=DEFAULT_REPEATS,seed=1):
+    """
+    times kernels again. A kernel which looked slower may have been sharing the CPU with something
+    else at the time.
+
+    :param list keys: "kernel/shape" names from runKernels()
+    :param int retries: times each one is timed
+    :param float minTime: see timeCall()
+    :param int repeats: see timeCall()
+    :param int seed: seed for the input data, as used by runKernels()
+    :return dict: "kernel/shape" -> the fastest of the retries
+    """
+    results={}
+
+    for key in keys:
+        kernel,shape=key.split("/")
+        for n in range(retries):
+            seconds=runKernels(kernels=[kernel],shapes=[shape],minTime=minTime,repeats=repeats,
+                               seed=seed,verbose=False).get(key)
+            if seconds is not None:
+                results[key]=min(results.get(key,seconds),seconds)
+
+    return results
+
+
+def main(argv=None):
+    parser=argparse.ArgumentParser(description="Micro-benchmarks for the LEDAnimator compositing kernels.")
+    parser.add_argument("--kernels",default=None,help="comma separated kernel names, default all")
+    parser.add_argument("--shapes",default=",".join(SHAPES),help="comma separated list of "+",".join(SHAPES))
+    parser.add_argument("--min-time",type=float,default=0.05,help="minimum seconds per repeat")
+    parser.add_argument("--repeats",type=int,default=DEFAULT_REPEATS,help="repeats, the median is used")
+    parser.add_argument("--save",default=None,help="write the results to this baseline file")
+    parser.add_argument("--compare",default=None,help="baseline file to check the results against")
+    parser.add_argument("--threshold",type=float,default=DEFAULT_THRESHOLD,help="allowed slow down, 0.25=25%%")
+    parser.add_argument("--min-delta",type=float,default=DEFAULT_MIN_DELTA,
+                        help="seconds per call a kernel must also be slower by to be reported")
+    parser.add_argument("--retries",type=int,default=DEFAULT_RETRIES,
+                        help="times a kernel which looks slower is timed again before it is reported")
+    args=parser.parse_args(argv)
+
+    # keep stdout for the JSON
+    realStdout=sys.stdout
+    sys.stdout=sys.stderr
+
+    allocations={}
+    try:
+        results=runKernels(kernels=args.kernels.split(",") if args.kernels else None,
+                           shapes=args.shapes.split(","),minTime=args.min_time,repeats=args.repeats,
+                           allocations=allocations)
+    finally:
+        sys.stdout=realStdout
+
+    report={"machine":platform.platform(),"python":platform.python_version(),"numpy":np.__version__,
+            "results":results,"allocations":allocations}
+
+    if args.save is not None:
+        with open(args.save,"w") as f:
+            json.dump(report,f,indent=2,sort_keys=True)
+    elif args.compare is None:
+        json.dump(report,sys.stdout,indent=2,sort_keys=True)
+        sys.stdout.write("\n")
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline=json.load(f)
+
+        regressions=compare(results,baseline,args.threshold,args.min_delta)
+
+        if regressions and args.retries>0:
+            # a regression must still be there when the kernel is timed again
+            print >>sys.stderr,"microbench: timing %d slower kernels again" % len(regressions)
+            sys.stdout=sys.stderr
+            try:
+                retimed=retime([key for key,before,after,ratio in regressions],args.retries,
+                               args.min_time,args.repeats)
+            finally:
+                sys.stdout=realStdout
+            for key,seconds in retimed.iteritems():
+                results[key]=min(results[key],seconds)
+            regressions=compare(results,baseline,args.threshold,args.min_delta)
+
+        for key,before,after,ratio in regressions:
+            print >>sys.stderr,"microbench: REGRESSION %s %.3f us -> %.3f us (%.0f%% slower)" % \
+                               (key,before*1e6,after*1e6,(ratio-1.0)*100)
+
+        allocating=sorted(key for key,n in allocations.iteritems() if n)
+        for key in allocating:
+            print >>sys.stderr,"microbench: ALLOCATING %s allocated %d scratch buffers after its first call" % \
+                               (key,allocations[key])
+
+        if regressions or allocating: return 1
+
+        print >>sys.stderr,"microbench: no regressions beyond %.0f%%" % (args.threshold*100)
+
+    return 0
+
+
+if __name__=="__main__":
+    # run as a script the LEDAnimator package is found in the folder above this one
+    sys.path.insert(0,os.path.abspath(os.path.join(os.path.dirname(__file__),os.pardir)))
+    sys.exit(main())
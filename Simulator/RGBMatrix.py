@@ -7,6 +7,16 @@ useage:-
 
 mat=RGBMatrix(videoCapture=True,videoName="./HUB75 %dx%d.avi",)
 
+Frames are handed to the display thread through a slot. SetImage() enlarges the
+image into frameBuffer, which only it writes to, then swaps frameBuffer with the
+slot and bumps the slot version. The display thread sleeps until the version
+changes, swaps the slot with displayBuffer and shows that. Neither thread ever
+writes to a buffer the other is using so a half written frame can't be shown,
+and the window is only redrawn when there is a new frame.
+
+A frame still in the slot when the next one arrives was never shown, it is
+counted as dropped. getStats() returns the counts.
+
 
 """
 import threading
@@ -15,6 +25,7 @@ from Simulator.Exceptions import *
 from LEDAnimator.NumpyImage import *
 from LEDAnimator.Constants import *
 from Simulator.RGBMatrixOptions import RGBMatrixOptions
+from Simulator.VideoRecorder import VideoRecorder
 import cv2
 
 class RGBMatrix(object):
@@ -24,7 +35,7 @@ class RGBMatrix(object):
 
     # internal variables
 
-    video=None              # video stream, set if creating a video
+    video=None              # VideoRecorder, set if creating a video
     swapping=False
     readyForSync=False      # ties the display to the panel refresh rate
     running=False
@@ -35,6 +46,18 @@ class RGBMatrix(object):
     screenWidth=0           # width & height of on-screen simulator window in pixels
     screenHeight=0          # same for height, calculated using scale
 
+    ledBuffer=None          # (pixelHeight,pixelWidth,3) BGR copy of the image being displayed
+    slotBuffer=None         # the latest frame, waiting for the display thread
+    displayBuffer=None      # the frame on screen, only used by the display thread
+    slotVersion=0           # incremented by SetImage() each time a frame is put in the slot
+    shownVersion=0          # slotVersion of the frame in displayBuffer
+
+    # frame counters, see getStats()
+    submitted=0             # frames passed to SetImage()
+    presented=0             # frames drawn in the window
+    dropped=0               # frames replaced in the slot before the display thread took them
+    dotMask=None            # screen sized 0-255 weights which draw the LEDs as dots, see makeDotMask()
+
     windowTitle = "RGB Matrix Simulator"
 
     def __init__(self,**kwargs):
@@ -58,6 +81,13 @@ class RGBMatrix(object):
         # window immediately.
         tmp=np.zeros((self.screenHeight,self.screenWidth,3),dtype=np.uint8)
         self.frameBuffer=tmp
+        self.slotBuffer=tmp.copy()
+        self.displayBuffer=tmp.copy()
+
+        self.condition=threading.Condition()
+
+        if self.options.ledDots:
+            self.makeDotMask(self.options.scale,self.options.ledDotSize)
 
         if self.options.videoCapture:
             fname = self.options.videoName.format(screenWidth=self.screenWidth, screenHeight=self.screenHeight,
@@ -98,37 +128,62 @@ class RGBMatrix(object):
 
     def numpyEnlarge(self,img,scale):
         """
-        6x faster than scipy zoom
-
         Simple Enlargement by duplicating pixels. Since LEDs are integer sizes
-        this gives a more realistuic effect and doesn;t require anti-aliasing
+        this gives a more realistic effect and doesn't require anti-aliasing
+
+        The alpha channel is dropped and the RGBA colours put in the BGR order
+        opencv displays, into ledBuffer, then cv2.resize() with INTER_NEAREST copies each
+        LED to a scale x scale block of the frameBuffer. If dotMask is set the LEDs
+        are then drawn as round dots with dark gaps between them.
 
-        :param numpy ndarray img: the image to enlarge
+        :param numpy ndarray img: the (h,w,4) image to enlarge
         :param int scale:
-        :return None: frameBuffer is resized
+        :return None: frameBuffer is overwritten
         """
-        if scale==1:
-            # don't need alpha on output
-            self.frameBuffer=img[:ALPHA]
-            return
         if scale<1:
             raise InvalidScale("numpyEnlarge can only be used to enlarge. Got scale factor "+str(scale))
 
         h,w=img.shape[:2]
-        for x in xrange(w):
-            for y in xrange(h):
-                pixel = img[y, x]
-                y1=y*scale
-                y2=y1+scale
-                x1=x*scale
-                x2=x1+scale
-                self.frameBuffer[y1:y2, x1:x2] = pixel[:ALPHA]
 
+        if self.ledBuffer is None or self.ledBuffer.shape[:2]!=(h,w):
+            self.ledBuffer=np.empty((h,w,3),dtype=np.uint8)
+
+        # don't need alpha on output
+        cv2.cvtColor(img,cv2.COLOR_RGBA2BGR,dst=self.ledBuffer)
+
+        if scale==1:
+            np.copyto(self.frameBuffer,self.ledBuffer)
+        else:
+            cv2.resize(self.ledBuffer,(w*scale,h*scale),dst=self.frameBuffer,interpolation=cv2.INTER_NEAREST)
+
+        if self.dotMask is not None:
+            cv2.multiply(self.frameBuffer,self.dotMask,dst=self.frameBuffer,scale=1/255.0)
+
+    def makeDotMask(self,scale,dotSize):
+        """
+        makes the dotMask which numpyEnlarge() multiplies the frameBuffer by to draw
+        round LEDs. One LED's worth is worked out, with anti-aliased edges, and tiled
+        over the whole screen.
+
+        :param int scale: screen pixels per LED
+        :param float dotSize: LED diameter as a fraction of the LED spacing
+        :return None: dotMask is set
+        """
+        # 4x4 samples per screen pixel smooth the edge of the dot
+        samples=4
+        c=(np.arange(scale*samples)+0.5)/samples-scale/2.0
+        inside=(c[:,None]**2+c[None,:]**2)<=(dotSize*scale/2.0)**2
+        tile=inside.reshape(scale,samples,scale,samples).mean(axis=(1,3))
+
+        tile=np.rint(tile*255).astype(np.uint8)
+        mask=np.tile(tile,(self.screenHeight//scale,self.screenWidth//scale))
 
+        # cv2.multiply() wants the same number of channels as the frameBuffer
+        self.dotMask=np.dstack((mask,mask,mask))
 
     def SetImage(self,img):
         """
-        copies img to the frameBuffer for display
+        copies img to the frameBuffer and hands it to the display thread
         does not need the simulator running to do this
 
         simulator picks up this image in it's run loop
@@ -136,48 +191,63 @@ class RGBMatrix(object):
         :param img: numpy image (NOT NumpyImage)
         :return: nothing
         """
-
-        # opencv reads images in BGR order
-        # If we are in RGB order change it now
-        # see Constants.py for RGB_R
-
-        if RGB_R==0:
-            im=cv2.cvtColor(img,cv2.COLOR_RGB2BGR)
-        else:
-            im=img
-
         # the on screen display will be a different size
         # it is expected to be bigger than the actual panel
+        # opencv wants BGR, numpyEnlarge() reorders the channels
         self.numpyEnlarge(img,self.options.scale)
 
-        if self.video:
-            self.video.write(self.frameBuffer)
+        # the display thread closes the video if the window is closed
+        video=self.video
+        if video:
+            # recorded at one pixel per LED, the recorder enlarges it
+            video.write(self.ledBuffer)
+
+        with self.condition:
+            self.submitted+=1
+
+            # the display thread never took the last frame
+            if self.slotVersion!=self.shownVersion: self.dropped+=1
+
+            self.frameBuffer,self.slotBuffer=self.slotBuffer,self.frameBuffer
+            self.slotVersion+=1
+            self.condition.notify()
+
+    def getStats(self):
+        """
+        :return dict: submitted (frames passed to SetImage()), presented (frames drawn) and dropped (frames
+                      never drawn because a newer one arrived first) plus VideoRecorder.getStats()
+                      when recording
+        """
+        with self.condition:
+            stats={"submitted":self.submitted,"presented":self.presented,"dropped":self.dropped}
+
+        # videoFrames, videoEncoded and videoOverflows
+        video=self.video
+        if video is not None: stats.update(video.getStats())
+        return stats
 
     def startVideo(self,fname):
         """
-        attempt to create a video stream.
+        attempt to create a video stream. Frames are encoded on another thread, see VideoRecorder.py
         :param string fname: the output filename like video.avi
         :return None: self.video is set up as a stream (or not)
         """
+        scale=self.options.videoScale or self.options.scale
 
-
-        try:
-            fourcc = cv2.cv.CV_FOURCC(*'DIVX')
-
-        except Exception as e:
-            #print "Exception ",e.args
-            fourcc = cv2.VideoWriter_fourcc(*'DIVX')
-
-        self.video = cv2.VideoWriter(fname, fourcc, 10, (self.screenWidth, self.screenHeight))
-        if self.video is None:
+        self.video=VideoRecorder((self.screenHeight//self.options.scale,self.screenWidth//self.options.scale,3),
+                                 filename=fname,fps=self.options.fps,scale=scale,queueSize=self.options.videoQueue,
+                                 dotMask=self.dotMask if scale==self.options.scale else None)
+        if not self.video.isOpened():
             print "VideoWriter failed to start."
+            self.video.close()
+            self.video=None
         else:
             print "VideoWriter started ok"
 
 
     def run(self):
         """
-        background task to refresh the display using the frameBuffer image.
+        background task to refresh the display with the frames from the slot.
         Terminates when any key is pressed.
         :return: Nothing
         """
@@ -186,30 +256,42 @@ class RGBMatrix(object):
 
         # open a window and size if as required
         cv2.namedWindow(self.windowTitle)
-        cv2.imshow(self.windowTitle, self.frameBuffer)
+        cv2.imshow(self.windowTitle, self.displayBuffer)
 
         r=0xFF & cv2.waitKey(1)
         if r<>255:
             print "RGBMatrix.run() setting up window failed (keyboard key stuck?)."
             return
 
-        # frameDuration controls the refresh rate
-        # so far I have not found any advantage in slowing it down
-        #
+        # the longest wait for a new frame before checking the keyboard and
+        # letting the window handle its events
         frameDuration=int(1000.0/self.options.fps)  # millisec
-        #frameDuration=1
         print "RGBMatrix.run() entering the run loop frameDuration=%.2fms"%(frameDuration)
 
         while self.running:
-            # refresh the displayed image
-            cv2.imshow(self.windowTitle, self.frameBuffer)
-            r=0xFF & cv2.waitKey(frameDuration)
+            with self.condition:
+                if self.slotVersion==self.shownVersion:
+                    self.condition.wait(frameDuration/1000.0)
+
+                newFrame=self.slotVersion!=self.shownVersion
+                if newFrame:
+                    self.displayBuffer,self.slotBuffer=self.slotBuffer,self.displayBuffer
+                    self.shownVersion=self.slotVersion
+
+            # refresh the displayed image, only if it changed
+            if newFrame:
+                cv2.imshow(self.windowTitle, self.displayBuffer)
+                self.presented+=1
+
+            r=0xFF & cv2.waitKey(1)
             if r<>255:
                 print "RGBMatrix.run() key pressed."
                 self.running = False # window closes
 
         print "RGBMatrix.run() closed the simulator window."
-        if self.video: self.video.release()
+        if self.video:
+            self.video.close()
+            self.video=None
         cv2.destroyAllWindows()
         raise SimulatorWindowClosed
 
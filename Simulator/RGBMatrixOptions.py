@@ -17,9 +17,15 @@ class RGBMatrixOptions(object):
     # a 64x64pixel display on screen is very small so we scale it up
     scale = 10
 
+    # draw each LED as a round dot with dark gaps between, like the real panel
+    ledDots=False
+    ledDotSize=0.8          # dot diameter as a fraction of the LED spacing
+
     # video capture
     videoCapture=False
     videoName="./HUB75 {width}x{height}.avi"
+    videoScale=None         # video pixels per LED, default scale. 1 records one pixel per LED
+    videoQueue=32           # frames which can wait to be encoded before frames are lost
 
     # misc
     debug=False
@@ -33,7 +39,11 @@ class RGBMatrixOptions(object):
         assert type(self.gpio_slowdown) is int, "gpio_slowdown parameter should be an int."
         assert type(self.drop_privileges) is bool, "drop_privileges parameter should be a boolean."
         assert type(self.scale) is int, "scale parameter should be an int."
+        assert type(self.ledDots) is bool, "ledDots parameter should be a boolean."
+        assert 0.0<self.ledDotSize<=1.0, "ledDotSize parameter should be greater than 0.0 and at most 1.0"
         assert type(self.videoCapture) is bool, "videoCapture parameter should be a boolean."
         assert type(self.videoName) is str, "videoName parameter should be a string."
+        assert self.videoScale is None or type(self.videoScale) is int, "videoScale parameter should be an int."
+        assert type(self.videoQueue) is int, "videoQueue parameter should be an int."
         assert type(self.fps) is int, "fps parameter should be an int."
         assert type(self.debug) is bool, "debug parameter should be a boolean"
\ No newline at end of file
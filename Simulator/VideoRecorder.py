@@ -0,0 +1,157 @@
+"""
+VideoRecorder.py
+
+Records the simulator's frames to a video file on its own thread.
+
+Encoding a frame takes longer than drawing one so it isn't done on the render thread.
+write() copies the frame, at one pixel per LED, into one of a fixed number of buffers and
+queues it. The writer thread enlarges it to the video size and encodes it. If every buffer
+is waiting to be encoded the frame is not recorded and counted as an overflow, the animation
+never waits for the video.
+
+The video is made at the animation fps. Each frame is stamped when it is written and the
+writer repeats the previous frame to fill any gap, so frames which weren't sent (because they
+hadn't changed, see Panel.init(skipUnchanged)) or which overflowed don't make the video run fast.
+
+useage:-
+
+    video=VideoRecorder((64,64,3),filename="show.avi",fps=100,scale=10)
+    video.write(img)
+    video.close()
+
+"""
+
+import threading
+import time
+import Queue
+import numpy as np
+import cv2
+
+
+class VideoRecorder(object):
+
+    filename=None       # passed in
+    fps=100             # frame rate of the video, the animation fps
+    scale=1             # video pixels per LED
+    dotMask=None        # optional weights the enlarged frame is multiplied by, see RGBMatrix.makeDotMask()
+    queueSize=32        # frames which can wait to be encoded
+    fourcc="DIVX"
+
+    def __init__(self,shape,**kwargs):
+        """
+        opens the video file and starts the writer thread
+
+        :param tuple shape: (height,width,3) of the BGR frames which will be written
+        :param kwargs: filename=str, fps=int, scale=int, dotMask=ndarray, queueSize=int, fourcc=str
+        """
+        for key,value in kwargs.iteritems():
+            setattr(self,key,value)
+
+        assert self.filename is not None,"VideoRecorder() filename not set."
+        assert self.queueSize>0,"VideoRecorder() queueSize must be at least 1."
+
+        h,w=shape[:2]
+        self.size=(w*self.scale,h*self.scale)
+
+        try:
+            fourcc = cv2.cv.CV_FOURCC(*self.fourcc)
+        except Exception as e:
+            fourcc = cv2.VideoWriter_fourcc(*self.fourcc)
+
+        self.writer=cv2.VideoWriter(self.filename,fourcc,self.fps,self.size)
+
+        self.free=Queue.Queue()     # buffers available to write()
+        self.ready=Queue.Queue()    # (time,buffer) waiting to be encoded, None stops the thread
+
+        for n in range(self.queueSize):
+            self.free.put(np.zeros(shape,dtype=np.uint8))
+
+        # counters
+        self.written=0      # frames passed to write() and queued
+        self.encoded=0      # frames in the video, including repeats
+        self.overflows=0    # frames not recorded because the queue was full
+
+        self.startTime=None
+        self.thread=threading.Thread(target=self.run,name="VideoRecorder")
+        self.thread.daemon=True
+        self.thread.start()
+
+    def isOpened(self):
+        """
+        :return bool: True if opencv could open the video file
+        """
+        return self.writer.isOpened()
+
+    def write(self,img):
+        """
+        queues a frame. Never waits.
+
+        :param numpy ndarray img: (height,width,3) BGR image, it is copied
+        :return None:
+        """
+        now=time.time()
+        if self.startTime is None: self.startTime=now
+
+        try:
+            buf=self.free.get_nowait()
+        except Queue.Empty:
+            self.overflows+=1
+            return
+
+        np.copyto(buf,img)
+        self.ready.put((now,buf))
+        self.written+=1
+
+    def run(self):
+        """
+        the writer thread, encodes frames until close() is called
+        :return None:
+        """
+        enlarged=None if self.scale==1 else np.zeros((self.size[1],self.size[0],3),dtype=np.uint8)
+        previous=None
+
+        while True:
+            item=self.ready.get()
+            if item is None: break
+
+            stamp,buf=item
+
+            # repeat the previous frame until this one is due
+            due=int(round((stamp-self.startTime)*self.fps))
+            while previous is not None and self.encoded<due:
+                self.writer.write(previous)
+                self.encoded+=1
+
+            if enlarged is None:
+                frame=buf
+            else:
+                frame=cv2.resize(buf,self.size,dst=enlarged,interpolation=cv2.INTER_NEAREST)
+                if self.dotMask is not None:
+                    cv2.multiply(frame,self.dotMask,dst=frame,scale=1/255.0)
+
+            self.writer.write(frame)
+            self.encoded+=1
+
+            # keep a copy to repeat, the buffer goes back to write()
+            if previous is None: previous=np.empty_like(frame)
+            np.copyto(previous,frame)
+            self.free.put(buf)
+
+        self.writer.release()
+
+    def close(self):
+        """
+        encodes the frames still queued and closes the video file
+        :return None:
+        """
+        if self.thread is None: return
+        self.ready.put(None)
+        self.thread.join()
+        self.thread=None
+
+    def getStats(self):
+        """
+        :return dict: videoFrames (frames recorded), videoEncoded (frames in the video, including repeats)
+                      and videoOverflows (frames not recorded because the encoder was behind)
+        """
+        return {"videoFrames":self.written,"videoEncoded":self.encoded,"videoOverflows":self.overflows}
@@ -0,0 +1,181 @@
+"""
+
+AllocationTest.py
+
+Counts the numpy arrays allocated by the compositing path and by whole frames once the first few
+frames have sized the scratch buffers (see LEDAnimator/Scratch.py). The steady state should
+allocate nothing.
+
+numpy calls an event hook, if one is set, for every array data allocation. The hook is set with
+ctypes through numpy's C API table. numpy keeps freed arrays under 1KB in a cache so those are
+handed out without an allocation, they aren't counted either way. A layer or chain sized array
+is always bigger.
+
+numpy 1.23 removed the hook, the tests are skipped there.
+
+Run from the Tests folder:-
+
+    python AllocationTest.py
+
+"""
+
+import PathSetter
+import ctypes
+import traceback
+import unittest
+import numpy as np
+from numpy.core import multiarray
+import LEDAnimator.Panel as Panel
+
+Panel.init(headless=True,rows=32,chain_length=2,parallel=1)
+
+from LEDAnimator import Palette
+from LEDAnimator.Animator import Animator
+from LEDAnimator.AnimSequence import AnimSequence
+from LEDAnimator.Clock import VirtualClock
+from LEDAnimator.Chain import Chain
+from LEDAnimator.NumpyImage import NumpyImage
+from LEDAnimator.Text import Text
+from LEDAnimator.UtilLib import pasteWithAlphaAt
+from LEDAnimator.Helpers.Chains import makeRect
+import LEDAnimator.TextAnimations as TextAnimations
+import LEDAnimator.ChainAnimations as ChainAnimations
+
+FPS=100
+
+PYDATAMEM_SETEVENTHOOK=291  # index in numpy's C API table, see numpy/core/code_generators/numpy_api.py
+HOOK_AVAILABLE=tuple(int(n) for n in np.__version__.split(".")[:2])<(1,23)
+
+
+class NumpyAllocations(object):
+    """
+    counts array data allocations of 1KB or more between start() and stop()
+    """
+
+    HookFunc=ctypes.CFUNCTYPE(None,ctypes.c_void_p,ctypes.c_void_p,ctypes.c_size_t,ctypes.c_void_p)
+    SetHookFunc=ctypes.CFUNCTYPE(ctypes.c_void_p,HookFunc,ctypes.c_void_p,ctypes.POINTER(ctypes.c_void_p))
+
+    minSize=1024
+
+    def __init__(self):
+        api=multiarray._ARRAY_API
+        if type(api).__name__=="PyCapsule":
+            getPointer=ctypes.pythonapi.PyCapsule_GetPointer
+            getPointer.argtypes=[ctypes.py_object,ctypes.c_char_p]
+            args=(api,None)
+        else:
+            getPointer=ctypes.pythonapi.PyCObject_AsVoidPtr
+            getPointer.argtypes=[ctypes.py_object]
+            args=(api,)
+        getPointer.restype=ctypes.c_void_p
+
+        table=ctypes.cast(getPointer(*args),ctypes.POINTER(ctypes.c_void_p))
+        self.setHook=self.SetHookFunc(table[PYDATAMEM_SETEVENTHOOK])
+        self.hook=self.HookFunc(self._allocated)    # kept so it isn't garbage collected
+        self.count=0
+        self.sites={}       # "file:line code" -> count
+
+    def _allocated(self,old,new,size,userData):
+        # old is NULL for a new allocation, frees and reallocs are ignored
+        if old or size<self.minSize: return
+        self.count+=1
+        frame=[f for f in traceback.extract_stack()[:-1] if "numpy" not in f[0]][-1]
+        site="%s:%d %s" % (frame[0].split("/")[-1],frame[1],frame[3])
+        self.sites[site]=self.sites.get(site,0)+1
+
+    def start(self):
+        self.count=0
+        self.sites={}
+        self.setHook(self.hook,None,ctypes.byref(ctypes.c_void_p()))
+
+    def stop(self):
+        self.setHook(ctypes.cast(None,self.HookFunc),None,ctypes.byref(ctypes.c_void_p()))
+        return self.count
+
+
+def makeAnimator():
+    """
+    :return Animator: a moving text layer over a chain layer which sparkles then has a comet
+    """
+    text=Text(text="Hello",fontSize=12,fontFace="BDF",fgColor=Palette.XMAS,multiColored=True)
+
+    A=Animator(fps=FPS,seed=42)
+    A.addAnimation(seq=AnimSequence([ChainAnimations.Sparkle(duration=1.0,fps=FPS,palette=Palette.RGB),
+                                     ChainAnimations.Comet(duration=1.0,fps=FPS,palette=Palette.XMAS,multiColored=True)]),
+                   chain=Chain(makeRect(0,0,Panel.width,Panel.height,"H")))
+    A.addAnimation(seq=AnimSequence([TextAnimations.Move(duration=2.0,fps=FPS,text=text,speed=0.5,
+                                                         startPos=(0,0),endPos=(Panel.width,0))]))
+    return A
+
+
+@unittest.skipUnless(HOOK_AVAILABLE,"numpy "+np.__version__+" has no data allocation hook")
+class AllocationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.allocations=NumpyAllocations()
+
+    def assertNoAllocations(self,func,repeats=10):
+        """
+        calls func once to size the scratch buffers then checks repeats more calls allocate nothing
+        """
+        func()
+        self.allocations.start()
+        try:
+            for n in range(repeats): func()
+        finally:
+            count=self.allocations.stop()
+        self.assertEqual(count,0,"%d allocations %s" % (count,self.allocations.sites))
+
+    def testCounter(self):
+        # the counter itself must see a new array
+        self.allocations.start()
+        a=np.empty(self.allocations.minSize)
+        self.assertEqual(self.allocations.stop(),1)
+
+    def testChainDrawing(self):
+        rng=np.random.RandomState(1)
+        chain=Chain(makeRect(0,0,Panel.width,Panel.height,"H"))
+        chain.hsv[:]=rng.random_sample(chain.hsv.shape)
+        layer=NumpyImage(width=Panel.width,height=Panel.height)
+
+        def draw():
+            chain.roll(1)
+            x,y,colors=chain.getAllPixels()
+            layer.setPixel(x,y,colors)
+
+        self.assertNoAllocations(draw)
+
+    def testPaste(self):
+        rng=np.random.RandomState(2)
+        fg=rng.randint(0,256,(20,40,4)).astype(np.uint8)
+        bg=rng.randint(0,256,(Panel.height,Panel.width,4)).astype(np.uint8)
+        self.assertNoAllocations(lambda: pasteWithAlphaAt(bg,10,5,fg))
+        self.assertNoAllocations(lambda: Panel.DrawImage(3,4,fg))
+
+    def testFrames(self):
+        A=makeAnimator()
+        clock=VirtualClock()
+        A.setClock(clock)
+        A.reset()
+        A.openRenderer(1.0/FPS)
+
+        def renderFrame(n):
+            clock.setTime(n/float(FPS))
+            clock.setFrameTime()
+            A.renderFrame()
+
+        try:
+            # Sparkle then Comet, with the text moving over them. The first pass sizes the scratch
+            # buffers for every animation, the second after reset() should reuse them
+            for n in range(2*FPS): renderFrame(n)
+            A.reset()
+            frames=iter(range(2*FPS))
+            renderFrame(next(frames))
+            self.assertNoAllocations(lambda: renderFrame(next(frames)),repeats=2*FPS-2)
+        finally:
+            A.closeRenderer()
+            clock.clearFrameTime()
+
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+
+BlurTest.py
+
+Renders NumpyImage.blur() on an opaque square over a transparent background and checks the blur
+spreads each channel across the image without mixing the channels. A red square must not turn
+green or blue and no colour may end up brighter than its alpha, which a premultiplied image
+(see PREMULTIPLIED in Constants.py) depends on.
+
+Run from the Tests folder:-
+
+    python BlurTest.py
+
+"""
+
+import PathSetter
+import unittest
+import numpy as np
+from scipy import ndimage
+from LEDAnimator.NumpyImage import NumpyImage
+
+SIGMA=2
+RED,GREEN,BLUE,ALPHA=0,1,2,3
+
+
+def square(color):
+    """
+    :param tuple color: (r,g,b) of the square, it is opaque so is the same premultiplied or not
+    :return NumpyImage: 32x32, transparent with a 12x12 square in the middle
+    """
+    image=NumpyImage(width=32,height=32,alpha=0)
+    image.rgba_cached[10:22,10:22]=color+(255,)
+    image.resetImage()
+    return image
+
+
+class BlurTest(unittest.TestCase):
+
+    def testChannelsKeptApart(self):
+        image=square((255,0,0))
+        image.blur(SIGMA)
+        out=image.getImageData()
+
+        self.assertEqual(out[...,GREEN].max(),0,"red bled into green")
+        self.assertEqual(out[...,BLUE].max(),0,"red bled into blue")
+        self.assertTrue(np.array_equal(out[...,RED],out[...,ALPHA]),"red and alpha were blurred differently")
+
+    def testSpatialBlur(self):
+        image=square((255,160,0))
+        image.blur(SIGMA)
+
+        # each channel on its own, blurred across the image
+        src=image.rgba_cached
+        for c in (RED,GREEN,BLUE,ALPHA):
+            expected=ndimage.gaussian_filter(src[...,c],sigma=SIGMA)
+            self.assertTrue(np.array_equal(image.getImageData()[...,c],expected),"channel %d" % c)
+
+    def testColoursWithinAlpha(self):
+        image=square((255,255,0))
+        image.blur(SIGMA)
+        out=image.getImageData().astype(np.int32)
+        self.assertTrue((out[...,:3]<=out[...,ALPHA:]).all(),"a colour is brighter than its alpha")
+
+    def testNoBlur(self):
+        image=square((255,0,0))
+        image.blur(0)
+        self.assertTrue(np.array_equal(image.getImageData(),image.rgba_cached))
+
+
+if __name__=="__main__":
+    unittest.main()
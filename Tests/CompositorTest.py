@@ -0,0 +1,158 @@
+"""
+
+CompositorTest.py
+
+Checks the Compositor's ImageLayer path (see LEDAnimator/Compositor.py) against layers drawn the
+old way, pasted into a transparent panel sized image. A random stack of layers which move, change,
+resize, go off the panel and swap between images, whole layer images and nothing at all must
+
+    - report dirty rectangles which cover every pixel of the layer that changed
+    - compose, using those dirty rectangles, exactly the frames a full recompose of the pasted
+      layers gives
+
+Run from the Tests folder:-
+
+    python CompositorTest.py
+
+"""
+
+import PathSetter
+import random
+import unittest
+import numpy as np
+import LEDAnimator.Panel as Panel
+
+Panel.init(headless=True,rows=32,chain_length=2,parallel=1)
+
+from LEDAnimator.Compositor import Compositor,ImageLayer,LayerDamage
+from LEDAnimator.Constants import PREMULTIPLIED
+from LEDAnimator.UtilLib import pasteWithAlphaAt,premultiply
+
+FRAMES=300
+SEED=19
+
+
+def randomImage(rnd,h,w):
+    """
+    :param random.Random rnd:
+    :param int h:
+    :param int w:
+    :return numpy ndarray: (h,w,4) uint8, a mix of opaque, transparent and part transparent pixels
+    """
+    state=np.random.RandomState(rnd.randint(0,1<<30))
+    img=state.randint(0,256,(h,w,4)).astype(np.uint8)
+    alpha=img[...,3]
+    alpha[state.rand(h,w)<0.4]=255
+    alpha[state.rand(h,w)<0.3]=0
+    if PREMULTIPLIED: premultiply(img)
+    return img
+
+
+def flatten(layer):
+    """
+    :param layer: ndarray, ImageLayer or None
+    :return numpy ndarray: the layer as a panel sized image, as a layerBuffer would hold it
+    """
+    if layer is None or isinstance(layer,np.ndarray): return layer
+    buf=np.zeros((Panel.height,Panel.width,4),dtype=np.uint8)
+    pasteWithAlphaAt(buf,layer.x,layer.y,layer.img)
+    return buf
+
+
+def nextLayer(rnd,layer):
+    """
+    :param random.Random rnd:
+    :param layer: the layer on the previous frame
+    :return: the layer on this frame, often much the same as the previous one
+    """
+    r=rnd.random()
+
+    if r<0.25:
+        return layer
+
+    if isinstance(layer,ImageLayer) and r<0.75:
+        img=layer.img
+        if r<0.45:
+            # moved
+            return ImageLayer(img,layer.x+rnd.randint(-3,3),layer.y+rnd.randint(-3,3))
+        # a few pixels redrawn in place
+        img=img.copy()
+        y,x=rnd.randrange(img.shape[0]),rnd.randrange(img.shape[1])
+        img[y:y+2,x:x+3]=randomImage(rnd,2,3)[:img.shape[0]-y,:img.shape[1]-x]
+        return ImageLayer(img,layer.x,layer.y)
+
+    if r<0.85:
+        # a new image, which may hang off any edge of the panel or miss it altogether
+        h,w=rnd.randint(1,Panel.height+8),rnd.randint(1,Panel.width//2)
+        return ImageLayer(randomImage(rnd,h,w),rnd.randint(-w-2,Panel.width+2),rnd.randint(-h-2,Panel.height+2))
+
+    if r<0.95:
+        return randomImage(rnd,Panel.height,Panel.width)
+
+    return None
+
+
+def makeFrames(rnd,layerCount):
+    """
+    :return list: FRAMES lists of layers, bottom to top
+    """
+    layers=[None]*layerCount
+    frames=[]
+    for n in range(FRAMES):
+        layers=[nextLayer(rnd,layer) for layer in layers]
+        frames.append(layers)
+    return frames
+
+
+def render(frames,dirtyRects):
+    """
+    composes the frames, each layer's dirty rectangle found with a LayerDamage as the Animator does
+
+    :return list: copies of the frameBuffer after each frame
+    """
+    compositor=Compositor(dirtyRects=dirtyRects)
+    damage=[LayerDamage() for layer in frames[0]]
+    out=[]
+    for layers in frames:
+        rects=[d.update(layer) for d,layer in zip(damage,layers)]
+        compositor.compose(layers,rects)
+        out.append(Panel.frameBuffer.out.copy())
+    return out
+
+
+class CompositorTest(unittest.TestCase):
+
+    def testDirtyRectsCoverChanges(self):
+        rnd=random.Random(SEED)
+        damage=LayerDamage()
+        blank=np.zeros((Panel.height,Panel.width,4),dtype=np.uint8)
+        before=blank
+        layer=None
+
+        for n in range(FRAMES*4):
+            layer=nextLayer(rnd,layer)
+            rect=damage.update(layer)
+            after=flatten(layer)
+            if after is None: after=blank
+
+            changed=np.any(before!=after,axis=2)
+            if rect is not None:
+                x0,y0,x1,y1=rect
+                changed[y0:y1,x0:x1]=False
+            self.assertFalse(changed.any(),"frame %d, changes outside %s" % (n,rect))
+            before=after
+
+    def testSameFrames(self):
+        frames=makeFrames(random.Random(SEED),3)
+        pasted=[[flatten(layer) for layer in layers] for layers in frames]
+
+        expected=render(pasted,dirtyRects=False)
+        for name,layers,dirtyRects in (("images",frames,False),("images",frames,True),("pasted",pasted,True)):
+            out=render(layers,dirtyRects)
+            different=[n for n in range(FRAMES) if not np.array_equal(expected[n],out[n])]
+            self.assertEqual(different,[],"%s dirtyRects=%s, %d frames differ, first %s" %
+                             (name,dirtyRects,len(different),different[:5]))
+
+
+if __name__=="__main__":
+    unittest.main()
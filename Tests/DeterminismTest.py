@@ -0,0 +1,100 @@
+"""
+
+DeterminismTest.py
+
+Checks that a seeded Animator replays exactly the same frames, byte for byte, after reset()
+and when it is rebuilt in the same process. Includes multiColored palette text, the palette
+objects are shared so their colour cursors must not carry over from one run to the next.
+
+Run from the Tests folder:-
+
+    python DeterminismTest.py
+
+"""
+
+import PathSetter
+import unittest
+import numpy as np
+import LEDAnimator.Panel as Panel
+
+Panel.init(headless=True,rows=32,chain_length=2,parallel=1)
+
+from LEDAnimator import Palette
+from LEDAnimator.Animator import Animator
+from LEDAnimator.AnimSequence import AnimSequence
+from LEDAnimator.OfflineRenderer import OfflineRenderer
+from LEDAnimator.Chain import Chain
+from LEDAnimator.Text import Text
+from LEDAnimator.Helpers.Chains import makeRect
+import LEDAnimator.TextAnimations as TextAnimations
+import LEDAnimator.ChainAnimations as ChainAnimations
+
+FPS=100
+FRAMES=200
+
+
+def makeAnimator(seed=42):
+    """
+    :return Animator: a text layer with multiColored palette text over a sparkling chain
+    """
+    text=Text(text="Hello",fontSize=12,fontFace="BDF",fgColor=Palette.XMAS,multiColored=True)
+
+    A=Animator(fps=FPS,seed=seed)
+    A.addAnimation(seq=AnimSequence([ChainAnimations.Sparkle(duration=1.0,fps=FPS,palette=Palette.RGB),
+                                     ChainAnimations.Comet(duration=1.0,fps=FPS,palette=Palette.XMAS,multiColored=True)]),
+                   chain=Chain(makeRect(0,0,Panel.width,Panel.height,"H")))
+    A.addAnimation(seq=AnimSequence([TextAnimations.On(duration=0.5,fps=FPS,text=text),
+                                     TextAnimations.Move(duration=1.5,fps=FPS,text=text,speed=0.5,
+                                                         startPos=(0,0),endPos=(Panel.width,0))]))
+    return A
+
+
+def makeOffsetAnimator(seed=None):
+    """
+    :return Animator: text faded in away from the top left corner, nothing random is drawn
+    """
+    text=Text(text="Hi",fontSize=12,fontFace="BDF",fgColor=(255,0,0,255))
+
+    A=Animator(fps=FPS,seed=seed)
+    A.addAnimation(seq=AnimSequence([TextAnimations.FadeIn(duration=1.0,fps=FPS,text=text,Xpos=20,Ypos=15)]))
+    return A
+
+
+class DeterminismTest(unittest.TestCase):
+
+    def assertSameFrames(self,a,b):
+        different=[n for n in range(len(a)) if not np.array_equal(a[n],b[n])]
+        self.assertEqual(different,[],"%d of %d frames differ, first %s" % (len(different),len(a),different[:5]))
+
+    def testReset(self):
+        A=makeAnimator()
+        R=OfflineRenderer(animator=A)
+        first=R.render(frames=FRAMES)
+        second=R.render(frames=FRAMES)     # render() resets the animator first
+        self.assertSameFrames(first,second)
+
+    def testRebuild(self):
+        first=OfflineRenderer(animator=makeAnimator()).render(frames=FRAMES)
+
+        # leave the shared palettes part way through their colours
+        Palette.XMAS.getNextEntry()
+        Palette.RGB.getNextEntry()
+
+        second=OfflineRenderer(animator=makeAnimator()).render(frames=FRAMES)
+        self.assertSameFrames(first,second)
+
+    def testSeedsDiffer(self):
+        first=OfflineRenderer(animator=makeAnimator(seed=1)).render(frames=FRAMES)
+        second=OfflineRenderer(animator=makeAnimator(seed=2)).render(frames=FRAMES)
+        self.assertFalse(np.array_equal(first,second),"different seeds gave the same frames")
+
+    def testSeedKeepsPosition(self):
+        # seeding only makes the random numbers repeatable, the text stays where it was put
+        unseeded=OfflineRenderer(animator=makeOffsetAnimator()).render(frames=FPS)
+        seeded=OfflineRenderer(animator=makeOffsetAnimator(seed=1)).render(frames=FPS)
+        self.assertTrue(unseeded[-1].any(),"the text was not drawn")
+        self.assertSameFrames(unseeded,seeded)
+
+
+if __name__=="__main__":
+    unittest.main()
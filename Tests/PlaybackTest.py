@@ -0,0 +1,99 @@
+"""
+
+PlaybackTest.py
+
+Bakes a seeded sequence to a frame file with FrameFile.bakeSequence() and checks that
+PlaybackAnimation plays back exactly the frames the sequence renders live, and that FrameReader
+gives the same frames whether they are read in order or seeked to.
+
+Run from the Tests folder:-
+
+    python PlaybackTest.py
+
+"""
+
+import PathSetter
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import LEDAnimator.Panel as Panel
+
+Panel.init(headless=True,rows=32,chain_length=2,parallel=1)
+
+from LEDAnimator import Palette
+from LEDAnimator.Animator import Animator
+from LEDAnimator.AnimSequence import AnimSequence
+from LEDAnimator.OfflineRenderer import OfflineRenderer
+from LEDAnimator.Chain import Chain
+from LEDAnimator.FrameFile import bakeSequence,FrameReader
+from LEDAnimator.PlaybackAnimation import PlaybackAnimation
+import LEDAnimator.ChainAnimations as ChainAnimations
+
+FPS=100
+FRAMES=400
+SEED=7
+KEYFRAME_INTERVAL=100
+
+# an L shaped chain of LEDs
+CHAIN=[(x,10) for x in range(5,60)]+[(60,y) for y in range(10,30)]
+
+
+def makeSequence():
+    """
+    :return AnimSequence: random sparkles then a wipe which holds still once it has finished
+    """
+    return AnimSequence([ChainAnimations.Sparkle(duration=2.0,speed=0.1,fps=FPS,palette=Palette.RGB),
+                         ChainAnimations.WipeRight(duration=2.0,speed=0.1,fps=FPS,palette=Palette.RGB)])
+
+
+class PlaybackTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder=tempfile.mkdtemp()
+        self.filename=os.path.join(self.folder,"test.frames")
+        self.stats=bakeSequence(makeSequence(),self.filename,fps=FPS,chain=Chain(CHAIN),seed=SEED,
+                                keyframeInterval=KEYFRAME_INTERVAL)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def testStats(self):
+        stats=self.stats
+        self.assertEqual(stats["frames"],FRAMES)
+        self.assertEqual(stats["keys"],FRAMES//KEYFRAME_INTERVAL)
+        self.assertEqual(stats["keys"]+stats["deltas"]+stats["repeats"],FRAMES)
+
+        # the sequence must exercise every kind of record
+        self.assertGreater(stats["deltas"],0)
+        self.assertGreater(stats["repeats"],0)
+
+    def testRoundTrip(self):
+        live=Animator(fps=FPS,seed=SEED)
+        live.addAnimation(seq=makeSequence(),chain=Chain(CHAIN))
+        expected=OfflineRenderer(animator=live).render(frames=FRAMES)
+
+        played=Animator(fps=FPS)
+        played.addAnimation(seq=AnimSequence([PlaybackAnimation(frameFile=self.filename,fps=FPS)]))
+        frames=OfflineRenderer(animator=played).render(frames=FRAMES)
+
+        self.assertTrue(expected.any(),"the sequence drew nothing")
+        different=[n for n in range(FRAMES) if not np.array_equal(expected[n],frames[n])]
+        self.assertEqual(different,[],"%d of %d frames differ, first %s" % (len(different),FRAMES,different[:5]))
+
+    def testSeek(self):
+        reader=FrameReader(self.filename)
+        inOrder=[reader.getFrame(n).copy() for n in range(FRAMES)]
+        reader.close()
+
+        reader=FrameReader(self.filename)
+        try:
+            for n in (FRAMES-1,3,250,251,0,KEYFRAME_INTERVAL,KEYFRAME_INTERVAL-1):
+                self.assertTrue(np.array_equal(reader.getFrame(n),inOrder[n]),"frame %d" % n)
+        finally:
+            reader.close()
+
+
+if __name__=="__main__":
+    unittest.main()
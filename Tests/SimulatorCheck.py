@@ -6,9 +6,7 @@ Requested by user.
 
 Uses Panel.py to display an image to ensure the simulator is working.
 
-Should also run on the Pi and output to the real panel - don't forget to
-set RGB_R and RGB_B in Constants.py when running on a Pi if color
-matters. (You will probably have done that anyway.
+Should also run on the Pi and output to the real panel.
 
 """
 